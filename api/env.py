@@ -10,4 +10,6 @@ INFLUXDB_V2_ORG = environ.get("WEATHERFLOW_COLLECTOR_INFLUXDB_ORG")
 
 
 PUSHOVER_USER = environ.get("PUSHOVER_USER")
-PUSHOVER_SPRINKLER_TOKEN = environ.get("PUSHOVER_SPRINKLER_TOKEN")
\ No newline at end of file
+PUSHOVER_SPRINKLER_TOKEN = environ.get("PUSHOVER_SPRINKLER_TOKEN")
+
+SNAPSHOT_DIR = environ.get("SNAPSHOT_DIR", "/var/lib/unifi_snapshots")
\ No newline at end of file
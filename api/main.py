@@ -1,9 +1,11 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file
 from influxdb import InfluxDBClient as InfluxDBV1Client
 from influxdb_client import InfluxDBClient as InfluxDBV2Client, Point
 from influxdb_client.client.write_api import SYNCHRONOUS
 from datetime import datetime
+import os
 import pytz
+import re
 import requests
 import logging
 
@@ -16,6 +18,7 @@ from env import (
     INFLUXDB_V2_ORG,
     PUSHOVER_USER,
     PUSHOVER_SPRINKLER_TOKEN,
+    SNAPSHOT_DIR,
 )
 
 
@@ -118,6 +121,20 @@ def get_current_data():
         )
     )
 
+@app.route("/unifi/snapshots/<digest>", methods=["GET"])
+def get_unifi_snapshot(digest):
+    """Serve a snapshot blob written by mqtt_client's SnapshotStore"""
+    if not re.fullmatch(r"[0-9a-f]{64}", digest):
+        return jsonify(dict(success=False, message="Invalid snapshot id")), 400
+
+    path = os.path.join(SNAPSHOT_DIR, digest[:2], digest)
+    if not os.path.isfile(path):
+        return jsonify(dict(success=False, message="Snapshot not found")), 404
+
+    # Blobs are content-addressed, so they never change and can be cached forever.
+    # Under gunicorn (compose.yml) the file goes out through its wsgi.file_wrapper, with sendfile().
+    return send_file(path, mimetype="image/jpeg", etag=digest, max_age=365 * 24 * 3600)
+
 @app.route("/pushover/sprinkler/message", methods=["POST"])
 def send_pushover_message():
     data = request.get_json()
@@ -1,23 +1,18 @@
-import time
+import asyncio
+from os import environ
+
+from watermarks import epoch_millis
 
 LIMIT = 50
+# Stop paging back after this many pages even if the watermark wasn't reached
+MAX_PAGES = int(environ.get("AUGUST_ACTIVITY_MAX_PAGES", "20"))
 
 
 class GrafanaActivity:
-    def __init__(self, house_activity, houses, lock_details):
+    def __init__(self, house_activity, registry):
         self.house_activity = house_activity
-        self.houses = houses
-        self.lock_details = lock_details
-
-    @property
-    def activity_house_id(self):
-        return self.lock_details.get_house_id_by_device_id(self.house_activity.device_id)
-
-    @property
-    def house_name(self):
-        if self.activity_house_id is None:
-            return 'Unknown'
-        return self.houses.get_house_name_by_id(self.activity_house_id)
+        self.activity_house_id = registry.house_id_for_device(house_activity.device_id)
+        self.house_name = registry.house_name_for_device(house_activity.device_id)
 
     def create_measurement(self):
         return dict(
@@ -47,13 +42,51 @@ class GrafanaActivity:
         )
 
 
-def create_activities(client, houses, lock_details):
+async def fetch_new_activities(client, house_id, watermarks):
+    """
+    Activities of the house after its watermark, paging back LIMIT at a time
+    until a page reaches the watermark. Without a watermark only the latest
+    page is fetched rather than the whole history.
+    """
+    new_activities = {}
+    before = None
+    for _ in range(MAX_PAGES):
+        page = await client.async_get_house_activities_before(
+            client.access_token, house_id, LIMIT, before)
+        for activity in page:
+            if watermarks.is_new_activity(house_id, activity):
+                new_activities.setdefault(activity.activity_id, activity)
+
+        if watermarks.activity_mark(house_id) is None or len(page) < LIMIT:
+            break
+        oldest = min(epoch_millis(activity.activity_start_time) for activity in page)
+        if not watermarks.is_newer(house_id, oldest):
+            break
+        if before is not None and oldest >= before:
+            # The cursor didn't move, another page would be the same one
+            break
+        before = oldest
+    else:
+        print("House", house_id, "has more than", MAX_PAGES * LIMIT, "new activities, older ones are skipped")
+    return list(new_activities.values())
+
+
+async def create_activities(client, registry, watermarks, recent=None):
+    """
+    Measurements of the activities not written yet, and the new activities
+    by house to advance the watermarks with once they're written. Activities
+    `recent` says were already pushed only move the watermarks.
+    """
+    house_ids = registry.house_ids
+    # All houses are fetched at once, the client limits how many run concurrently
+    all_activities = await asyncio.gather(*[
+        fetch_new_activities(client, house_id, watermarks) for house_id in house_ids
+    ])
     json_data = []
-    for house in houses:
-        house_activities = client.get_house_activities(
-            client.access_token, house.house_id, LIMIT)
+    for house_activities in all_activities:
         grafana_activities = [GrafanaActivity(
-            ha, houses, lock_details) for ha in house_activities]
+            ha, registry) for ha in house_activities
+            if recent is None or not recent.seen("poll", ha)]
         for ga in grafana_activities:
             json_data.append(ga.create_measurement())
-    return json_data
+    return json_data, dict(zip(house_ids, all_activities))
@@ -1,13 +1,18 @@
+import asyncio
 from yalexs.api import Api
+from yalexs.api_async import ApiAsync
 from yalexs.keypad import KeypadDetail as AugustKeypadDetail
 from yalexs.lock import LockDetail as AugustLockDetail
 from yalexs.pin import Pin as AugustPin
 from yalexs.authenticator import Authenticator
-from yalexs.api_common import API_GET_HOUSES_URL
+from yalexs.authenticator_async import AuthenticatorAsync
+from yalexs.api_common import API_GET_HOUSES_URL, _process_activity_json
 from os import environ
 
 AUGUST_USERNAME = environ.get("AUGUST_USERNAME")
 AUGUST_PASSWORD = environ.get("AUGUST_PASSWORD")
+# Requests in flight at once against the August API
+MAX_CONCURRENT_REQUESTS = int(environ.get("AUGUST_MAX_CONCURRENT_REQUESTS", "5"))
 
 
 class KeypadDetail(AugustKeypadDetail):
@@ -60,15 +65,6 @@ class House:
         return "House<%r>" % (self.house_name)
 
 
-class Houses(list):
-    def get_house_name_by_id(self, id):
-        house_name = "Unknown"
-        for house in self:
-            if house.house_id == id:
-                house_name = house.house_name.strip()
-        return house_name
-
-
 class AugustAPI(Api):
     def set_access_token(self, access_token):
         self.access_token = access_token
@@ -102,6 +98,77 @@ class AugustAPI(Api):
 
         return [Pin(pin_json) for pin_json in json_dict.get("loaded", [])]
 
+class AsyncAugustAPI(ApiAsync):
+    """
+    The async yalexs API returning the same House, LockDetail and Pin objects
+    as AugustAPI. Every request waits for a slot of `semaphore`, so callers
+    can gather as many as they like.
+    """
+
+    def __init__(self, aiohttp_session, semaphore, timeout=20):
+        super().__init__(aiohttp_session, timeout=timeout)
+        self.semaphore = semaphore
+
+    def set_access_token(self, access_token):
+        self.access_token = access_token
+
+    async def _async_dict_to_api(self, api_dict):
+        async with self.semaphore:
+            return await super()._async_dict_to_api(api_dict)
+
+    def _build_get_houses_request(self, access_token):
+        return {
+            "method": "get",
+            "access_token": access_token,
+            "url": API_GET_HOUSES_URL,
+        }
+
+    async def async_get_houses(self, access_token):
+        response = await self._async_dict_to_api(self._build_get_houses_request(access_token))
+        return [House(data) for data in await response.json()]
+
+    async def async_get_house_activities_before(self, access_token, house_id, limit, before=None):
+        """
+        Up to `limit` activities of the house, newest first. With `before`
+        (epoch milliseconds) only activities older than it, the same
+        `dateTime` cursor the August app pages its activity feed with.
+        """
+        request = self._build_get_house_activities_request(access_token, house_id, limit=limit)
+        if before is not None:
+            request["params"]["dateTime"] = before
+        response = await self._async_dict_to_api(request)
+        return _process_activity_json(await response.json())
+
+    async def async_get_lock_detail(self, access_token, lock_id):
+        response = await self._async_dict_to_api(
+            self._build_get_lock_detail_request(access_token, lock_id)
+        )
+        return LockDetail(await response.json())
+
+    async def async_get_pins(self, access_token, lock_id):
+        response = await self._async_dict_to_api(
+            self._build_get_pins_request(access_token, lock_id)
+        )
+        json_dict = await response.json()
+
+        return [Pin(pin_json) for pin_json in json_dict.get("loaded", [])]
+
+
+async def create_async_client(aiohttp_session, max_concurrent=MAX_CONCURRENT_REQUESTS):
+    api = AsyncAugustAPI(aiohttp_session, asyncio.Semaphore(max_concurrent))
+    authenticator = AuthenticatorAsync(
+        api,
+        "email",
+        AUGUST_USERNAME,
+        AUGUST_PASSWORD,
+        access_token_cache_file="auth_cache",
+    )
+    await authenticator.async_setup_authentication()
+    authentication = await authenticator.async_authenticate()
+    api.set_access_token(authentication.access_token)
+    return api
+
+
 def create_client():
     api = AugustAPI(timeout=20)
     authenticator = Authenticator(
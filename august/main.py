@@ -1,27 +1,29 @@
 from os import environ
 from activities import create_activities
 from pins import create_pins
+import aiohttp
+import argparse
+import asyncio
 import requests
+import traceback
 
-from august_api import create_client, Houses
+from august_api import create_async_client
+from push import RECONCILE_INTERVAL, PubNubTransport, PushListener, RecentActivities
+from registry import Registry
+from watermarks import Watermarks
 
 INFLUXDB_URL = environ.get("WEATHERFLOW_COLLECTOR_INFLUXDB_URL")
 INFLUXDB_USERNAME = environ.get("WEATHERFLOW_COLLECTOR_INFLUXDB_USERNAME")
 INFLUXDB_PASSWORD = environ.get("WEATHERFLOW_COLLECTOR_INFLUXDB_PASSWORD")
+WRITE_URL = 'http://api:5000/influx/august_data/write'
 
 
-api = create_client()
-
-
-json_body = []
-
-
-def create_measurement(lock_detail, houses, type="lock"):
+def create_measurement(lock_detail, registry, type="lock"):
     return dict(
         measurement="augustLockBattery",
         tags=dict(
             name=lock_detail.device_name,
-            house=houses.get_house_name_by_id(lock_detail.house_id),
+            house=registry.house_name(lock_detail.house_id),
             lock_id=lock_detail.device_id,
             type=type,
         ),
@@ -29,37 +31,166 @@ def create_measurement(lock_detail, houses, type="lock"):
     )
 
 
-class LockDetails(list):
-    def get_house_id_by_device_id(self, device_id):
-        for ld in self:
-            if ld.device_id == device_id:
-                return ld.house_id
-        return None
-
-def get_lock_details():
-    locks = api.get_locks(api.access_token)
-    return LockDetails([api.get_lock_detail(api.access_token, lock.device_id) for lock in locks])
-
-
-lock_details = get_lock_details()
-houses = Houses(api.get_houses(api.access_token))
-
-for lock_detail in lock_details:
-    measurement = create_measurement(lock_detail, houses)
-    print("Creating data", measurement)
-    json_body.append(create_measurement(lock_detail, houses))
-
-    if lock_detail.keypad:
-        keypad_measurement = create_measurement(lock_detail.keypad, houses, "keypad")
-        print("Creating keypad data", keypad_measurement)
-        json_body.append(keypad_measurement)
-
-house_activity_measurements = create_activities(api, houses, lock_details)
-pins_measurements = create_pins(api, houses)
-
-json_body.extend(house_activity_measurements)
-json_body.extend(pins_measurements)
-
-resp = requests.post('http://api:5000/influx/august_data/write', json=dict(data_points=json_body))
+async def get_lock_details(api, locks):
+    return await asyncio.gather(*[
+        api.async_get_lock_detail(api.access_token, lock.device_id) for lock in locks
+    ])
+
+
+async def collect(api, registry, watermarks, recent=None):
+    """
+    Battery levels plus the new activities and changed pins. Returns the
+    measurements, the new activities by house, the changed pins and the lock
+    details. Activities in `recent` were pushed already and aren't written
+    again.
+    """
+    json_body = []
+
+    # Locks are listed once per cycle and reused for the details and the pins
+    locks = await api.async_get_locks(api.access_token)
+    # Battery levels change, so lock details are fetched every run
+    if registry.houses_stale(house_ids=[lock.house_id for lock in locks]):
+        houses, lock_details = await asyncio.gather(
+            api.async_get_houses(api.access_token),
+            get_lock_details(api, locks),
+        )
+        registry.update_houses(houses)
+    else:
+        lock_details = await get_lock_details(api, locks)
+    registry.update_locks(lock_details)
+    registry.save()
+
+    for lock_detail in lock_details:
+        measurement = create_measurement(lock_detail, registry)
+        print("Creating data", measurement)
+        json_body.append(measurement)
+
+        if lock_detail.keypad:
+            keypad_measurement = create_measurement(lock_detail.keypad, registry, "keypad")
+            print("Creating keypad data", keypad_measurement)
+            json_body.append(keypad_measurement)
+
+    (house_activity_measurements, new_activities), (pins_measurements, changed_pins) = await asyncio.gather(
+        create_activities(api, registry, watermarks, recent),
+        create_pins(api, registry, locks, watermarks),
+    )
 
-print(resp.json())
\ No newline at end of file
+    json_body.extend(house_activity_measurements)
+    json_body.extend(pins_measurements)
+    return json_body, new_activities, changed_pins, lock_details
+
+
+def write_points(json_body):
+    resp = requests.post(WRITE_URL, json=dict(data_points=json_body))
+    resp.raise_for_status()
+    print(resp.json())
+
+
+def write_and_advance(write, watermarks, json_body, new_activities, changed_pins):
+    if json_body:
+        write(json_body)
+
+    # Only move the watermarks once the points are stored
+    for house_id, activities in new_activities.items():
+        watermarks.update_activities(house_id, activities)
+    watermarks.update_pins(changed_pins)
+    watermarks.save()
+
+
+async def write_forever(queue, write, watermarks):
+    """
+    Write everything queued by the push listener and the reconciling polls,
+    one batch at a time so the watermarks only move in order. A failed batch
+    is logged and leaves its watermarks, the next poll picks its activities
+    up again.
+    """
+    loop = asyncio.get_event_loop()
+    while True:
+        batch = await queue.get()
+        try:
+            await loop.run_in_executor(None, write_and_advance, write, watermarks, *batch)
+        except requests.RequestException as e:
+            print("Failed to write", len(batch[0]), "points:", e)
+        except Exception:
+            print("Failed to write", len(batch[0]), "points:")
+            traceback.print_exc()
+        finally:
+            queue.task_done()
+
+
+async def run_push(api, transport, registry, watermarks, write=write_points,
+                   reconcile_interval=RECONCILE_INTERVAL):
+    """
+    Write activities as the transport pushes them. Everything is polled once
+    at the start, again whenever the transport reconnects after a gap, and
+    at least every `reconcile_interval` seconds. Only the polls move the
+    watermarks, so activities missed during a gap are written even when a
+    later one was pushed since. A failed poll is logged and retried after
+    `reconcile_interval`, batches already queued are written before
+    returning.
+    """
+    queue = asyncio.Queue()
+    gap = asyncio.Event()
+    recent = RecentActivities(memory=2 * reconcile_interval)
+    listener = PushListener(registry, queue, gap, recent)
+    unsubscribe = transport.subscribe(listener.on_message)
+    writer = asyncio.ensure_future(write_forever(queue, write, watermarks))
+    registered = set()
+    stop = None
+    try:
+        while True:
+            gap.clear()
+            try:
+                *batch, lock_details = await collect(api, registry, watermarks, recent)
+            except Exception:
+                print("Failed to poll, retrying in", reconcile_interval, "seconds:")
+                traceback.print_exc()
+            else:
+                listener.update_devices(lock_details)
+                queue.put_nowait(batch)
+
+                new_locks = [lock_detail for lock_detail in lock_details
+                             if lock_detail.device_id not in registered]
+                if new_locks:
+                    for lock_detail in new_locks:
+                        transport.register_device(lock_detail)
+                        registered.add(lock_detail.device_id)
+                    # Channels are subscribed when the transport starts, so it restarts for locks added since
+                    if stop is not None:
+                        stop()
+                    stop = transport.start()
+
+            try:
+                await asyncio.wait_for(gap.wait(), reconcile_interval)
+                print("Push channel reconnected, polling for missed activities")
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        if stop is not None:
+            stop()
+        unsubscribe()
+        await queue.join()
+        writer.cancel()
+
+
+async def main(push=False):
+    async with aiohttp.ClientSession() as session:
+        api = await create_async_client(session)
+        registry = Registry()
+        watermarks = Watermarks()
+        if push:
+            user = await api.async_get_user(api.access_token)
+            transport = PubNubTransport(user["UserID"])
+            await run_push(api, transport, registry, watermarks)
+            return
+        json_body, new_activities, changed_pins, _ = await collect(api, registry, watermarks)
+
+    write_and_advance(write_points, watermarks, json_body, new_activities, changed_pins)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Collect August lock data")
+    parser.add_argument("--push", action="store_true",
+                        help="keep running and write activities as they're pushed")
+    args = parser.parse_args()
+    asyncio.run(main(push=args.push))
@@ -1,12 +1,12 @@
-import time
+import asyncio
 
 LIMIT = 50
 
 
 class GrafanaActivity:
-    def __init__(self, pin, lock, houses):
+    def __init__(self, pin, lock, registry):
         self.pin = pin
-        self.houses = houses
+        self.registry = registry
         self.lock = lock
 
     def create_measurement(self):
@@ -15,8 +15,7 @@ class GrafanaActivity:
             measurement="augustPins",
             time=self.pin.created_at.isoformat(),
             tags=dict(
-                house=self.houses.get_house_name_by_id(
-                    self.lock.house_id),
+                house=self.registry.house_name(self.lock.house_id),
                 house_id=self.lock.house_id,
                 lock_id=self.lock.device_id,
                 access_type=self.pin.access_type
@@ -34,12 +33,17 @@ class GrafanaActivity:
         )
 
 
-def create_pins(client, houses):
+async def create_pins(client, registry, locks, watermarks):
+    """Measurements of the pins whose updated_at changed, and those pins"""
+    all_pins = await asyncio.gather(*[
+        client.async_get_pins(client.access_token, lock.device_id) for lock in locks
+    ])
     json_data = []
-    locks = client.get_locks(client.access_token)
-    for lock in locks:
-        pins = client.get_pins(client.access_token, lock.device_id)
-        grafana_activities = [GrafanaActivity(pin, lock, houses) for pin in pins]
+    changed_pins = []
+    for lock, pins in zip(locks, all_pins):
+        pins = [pin for pin in pins if watermarks.pin_changed(pin)]
+        grafana_activities = [GrafanaActivity(pin, lock, registry) for pin in pins]
         for ga in grafana_activities:
             json_data.append(ga.create_measurement())
-    return json_data
+        changed_pins.extend(pins)
+    return json_data, changed_pins
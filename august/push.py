@@ -0,0 +1,148 @@
+import datetime
+import time
+from os import environ
+
+from yalexs.activity import ACTIVITY_ACTION_STATES
+from yalexs.pubnub_activity import activities_from_pubnub_message
+
+from activities import GrafanaActivity
+from watermarks import epoch_millis
+
+# Poll everything (battery levels, pins, missed activities) at least this often
+RECONCILE_INTERVAL = int(environ.get("AUGUST_RECONCILE_INTERVAL", "1800"))
+# A pushed and a polled activity of the same device and state this many seconds apart are the same one
+MATCH_TOLERANCE = int(environ.get("AUGUST_PUSH_MATCH_TOLERANCE", "120"))
+
+
+class PubNubTransport:
+    """The August/Yale real-time activity channel, through yalexs' PubNub client"""
+
+    def __init__(self, user_uuid):
+        # Imported here so the local transport works without pubnub installed
+        from yalexs.pubnub_async import AugustPubNub
+
+        self.user_uuid = user_uuid
+        self.subscriptions = AugustPubNub()
+
+    def register_device(self, device_detail):
+        self.subscriptions.register_device(device_detail)
+
+    def subscribe(self, callback):
+        return self.subscriptions.subscribe(callback)
+
+    def start(self):
+        from yalexs.pubnub_async import async_create_pubnub
+
+        return async_create_pubnub(self.user_uuid, self.subscriptions)
+
+
+class LocalTransport:
+    """
+    Stand-in for the push channel. Messages passed to publish() reach the
+    subscribers like PubNub messages, and reconnect() sends the empty
+    messages yalexs sends after a dropped connection.
+    """
+
+    def __init__(self):
+        self.device_ids = set()
+        self.started = False
+        self._subscriptions = []
+
+    def register_device(self, device_detail):
+        self.device_ids.add(device_detail.device_id)
+
+    def subscribe(self, callback):
+        self._subscriptions.append(callback)
+
+        def _unsubscribe():
+            self._subscriptions.remove(callback)
+
+        return _unsubscribe
+
+    def start(self):
+        self.started = True
+
+        def _stop():
+            self.started = False
+
+        return _stop
+
+    def publish(self, device_id, message, date_time=None):
+        date_time = date_time or datetime.datetime.now(datetime.timezone.utc)
+        for callback in self._subscriptions:
+            callback(device_id, date_time, message)
+
+    def reconnect(self):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for callback in self._subscriptions:
+            for device_id in self.device_ids:
+                callback(device_id, now, {})
+
+
+class RecentActivities:
+    """
+    Activities written from the push channel or a poll that the other one
+    may still send. Pushed activities have no activity_id and the PubNub
+    time rather than the server's, so they're matched on device, resulting
+    state and a time within `tolerance` seconds. Entries are forgotten
+    `memory` seconds after they're added.
+    """
+
+    def __init__(self, tolerance=MATCH_TOLERANCE, memory=2 * RECONCILE_INTERVAL, clock=time.monotonic):
+        self.tolerance = tolerance
+        self.memory = memory
+        self.clock = clock
+        self._entries = {"push": [], "poll": []}
+
+    def seen(self, source, activity):
+        """Whether the other source already wrote `activity`, otherwise it's remembered for it"""
+        now = self.clock()
+        for entries in self._entries.values():
+            entries[:] = [entry for entry in entries if now - entry[0] < self.memory]
+
+        key = (activity.device_id, ACTIVITY_ACTION_STATES.get(activity.action, activity.action))
+        activity_time = epoch_millis(activity.activity_start_time)
+        other = self._entries["poll" if source == "push" else "push"]
+        for index, (_, entry_key, entry_time) in enumerate(other):
+            if entry_key == key and abs(entry_time - activity_time) <= self.tolerance * 1000:
+                del other[index]
+                return True
+        self._entries[source].append((now, key, activity_time))
+        return False
+
+
+class PushListener:
+    """
+    Turns pushed messages into augustActivities measurements and queues them
+    for the writer. Pushed activities don't move the watermarks, the
+    reconciling polls do, skipping what `recent` says was pushed already. An
+    empty message means the transport reconnected and may have missed
+    events, which sets `gap`.
+    """
+
+    def __init__(self, registry, queue, gap, recent):
+        self.registry = registry
+        self.queue = queue
+        self.gap = gap
+        self.recent = recent
+        self.devices = {}
+
+    def update_devices(self, lock_details):
+        self.devices = {lock_detail.device_id: lock_detail for lock_detail in lock_details}
+
+    def on_message(self, device_id, date_time, message):
+        if not message:
+            self.gap.set()
+            return
+        device = self.devices.get(device_id)
+        if device is None:
+            print("Push message for unknown device", device_id)
+            return
+
+        activities = [activity for activity in activities_from_pubnub_message(device, date_time, message)
+                      if not self.recent.seen("push", activity)]
+        if not activities:
+            return
+        json_data = [GrafanaActivity(activity, self.registry).create_measurement() for activity in activities]
+        print("Pushed", len(json_data), "activities for", device.device_name)
+        self.queue.put_nowait((json_data, {}, []))
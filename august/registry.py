@@ -0,0 +1,88 @@
+import json
+import os
+import time
+from os import environ
+
+# State that has to outlive the container lives here, it's mounted as a volume in docker-compose.yml
+STATE_DIR = environ.get("AUGUST_STATE_DIR", "/var/lib/august")
+REGISTRY_PATH = environ.get("AUGUST_REGISTRY_PATH", os.path.join(STATE_DIR, "registry.json"))
+# Houses rarely change, only refetch them this often
+HOUSES_MAX_AGE = int(environ.get("AUGUST_HOUSES_MAX_AGE", str(24 * 3600)))
+
+UNKNOWN_HOUSE = "Unknown"
+
+
+class Registry:
+    """
+    Houses and devices (locks and keypads) of the account indexed by id, with
+    house names resolved once. Built once per run and saved to `path` so the
+    houses aren't refetched while they're fresh.
+    """
+
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = path
+        self.house_names = {}
+        self.device_houses = {}
+        self.device_names = {}
+        self.houses_updated_at = 0
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.house_names = state["house_names"]
+            self.device_houses = state["device_houses"]
+            self.device_names = state["device_names"]
+            self.houses_updated_at = state["houses_updated_at"]
+
+    def houses_stale(self, house_ids=(), now=None):
+        """Whether the houses are due for a refetch, or don't include one of `house_ids` yet"""
+        if any(house_id not in self.house_names for house_id in house_ids):
+            return True
+        return (now or time.time()) - self.houses_updated_at > HOUSES_MAX_AGE
+
+    def update_houses(self, houses, now=None):
+        self.house_names = {house.house_id: house.house_name.strip() for house in houses}
+        self.houses_updated_at = now or time.time()
+
+    def update_locks(self, lock_details):
+        """Index the devices of `lock_details`, every lock of the account, dropping removed ones"""
+        self.device_houses = {}
+        self.device_names = {}
+        for lock_detail in lock_details:
+            self._add_device(lock_detail)
+            if lock_detail.keypad:
+                self._add_device(lock_detail.keypad)
+
+    def _add_device(self, device):
+        self.device_houses[device.device_id] = device.house_id
+        self.device_names[device.device_id] = device.device_name
+
+    @property
+    def house_ids(self):
+        return list(self.house_names)
+
+    def house_name(self, house_id):
+        return self.house_names.get(house_id, UNKNOWN_HOUSE)
+
+    def house_id_for_device(self, device_id):
+        return self.device_houses.get(device_id)
+
+    def house_name_for_device(self, device_id):
+        house_id = self.device_houses.get(device_id)
+        if house_id is None:
+            return UNKNOWN_HOUSE
+        return self.house_name(house_id)
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(dict(
+                house_names=self.house_names,
+                device_houses=self.device_houses,
+                device_names=self.device_names,
+                houses_updated_at=self.houses_updated_at,
+            ), f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -2,6 +2,11 @@
 
 DELAY=1800 # 30 minutes
 
+if [ "$AUGUST_PUSH" = "1" ]; then
+    echo "$(date) Listening for August activities"
+    exec python3 main.py --push
+fi
+
 while (true); do
     echo "$(date) Fetching August lock data"
     python3 main.py
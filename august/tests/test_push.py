@@ -0,0 +1,196 @@
+import asyncio
+import datetime
+import os
+import tempfile
+import time
+import unittest
+
+import aiohttp
+from yalexs.activity import ACTION_LOCK_UNLOCK, SOURCE_LOG, LockOperationActivity
+from yalexs.lock import LockDetail
+
+from main import run_push
+from push import LocalTransport
+from registry import Registry
+from watermarks import Watermarks
+
+LOCK_ID = "L0"
+HOUSE_ID = "H0"
+
+
+def lock_json(lock_id=LOCK_ID):
+    return {"LockName": "Front Door", "LockID": lock_id, "HouseID": HOUSE_ID, "Calibrated": False,
+            "Type": 2, "SerialNumber": "S", "battery": 0.8, "LockStatus": {"status": "locked"},
+            "currentFirmwareVersion": "1", "pubsubChannel": f"channel-{lock_id}", "skuNumber": "x",
+            "macAddress": "00"}
+
+
+def lock_activity(activity_id, action, date_time):
+    return LockOperationActivity(SOURCE_LOG, {
+        "entities": {"activity": activity_id, "house": HOUSE_ID},
+        "dateTime": date_time.timestamp() * 1000, "action": action,
+        "deviceID": LOCK_ID, "deviceName": "Front Door", "deviceType": "lock",
+    })
+
+
+class FakeApi:
+    """The few AsyncAugustAPI calls collect() makes, with no pins"""
+
+    access_token = "token"
+
+    def __init__(self):
+        self.polls = 0
+        self.lock_ids = [LOCK_ID]
+        self.activities = []
+        self.failures = 0
+
+    async def async_get_locks(self, access_token):
+        self.polls += 1
+        if self.failures:
+            self.failures -= 1
+            raise aiohttp.ClientError("connection reset")
+        return [LockDetail(lock_json(lock_id)) for lock_id in self.lock_ids]
+
+    async def async_get_houses(self, access_token):
+        return []
+
+    async def async_get_lock_detail(self, access_token, lock_id):
+        return LockDetail(lock_json(lock_id))
+
+    async def async_get_house_activities_before(self, access_token, house_id, limit, before=None):
+        return list(self.activities)
+
+    async def async_get_pins(self, access_token, lock_id):
+        return []
+
+
+class TestPush(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.registry = Registry(os.path.join(directory.name, "registry.json"))
+        self.registry.house_names = {HOUSE_ID: "Home"}
+        self.registry.houses_updated_at = time.time()
+        self.watermarks = Watermarks(os.path.join(directory.name, "watermarks.json"))
+        self.api = FakeApi()
+        self.transport = LocalTransport()
+        self.written = []
+        self.write = self.written.extend
+
+    def run_until(self, condition, actions, reconcile_interval=60):
+        async def scenario():
+            task = asyncio.ensure_future(run_push(
+                self.api, self.transport, self.registry, self.watermarks,
+                write=self.write, reconcile_interval=reconcile_interval))
+            for action in actions:
+                while not self.transport.started:
+                    await asyncio.sleep(0.01)
+                action()
+            for _ in range(200):
+                if condition():
+                    break
+                await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(scenario())
+
+    def written_activities(self):
+        return [point for point in self.written if point and point["measurement"] == "augustActivities"]
+
+    def test_pushed_activity_written(self):
+        """Test that a pushed unlock becomes an augustActivities point, leaving the watermark to the polls"""
+        self.run_until(
+            lambda: any(point["measurement"] == "augustActivities" for point in self.written),
+            [lambda: self.transport.publish(LOCK_ID, {"status": "kAugLockState_Unlocked"})],
+        )
+
+        activities = self.written_activities()
+        self.assertEqual(len(activities), 1)
+        self.assertEqual(activities[0]["tags"]["house"], "Home")
+        self.assertEqual(activities[0]["tags"]["activity_type"], "LOCK_OPERATION_WITHOUT_OPERATOR")
+        self.assertEqual(activities[0]["fields"]["action"], ACTION_LOCK_UNLOCK)
+        self.assertIsNone(self.watermarks.activity_mark(HOUSE_ID))
+
+    def test_reconnect_polls_again(self):
+        """Test that a reconnect after a gap triggers a reconciling poll"""
+        self.run_until(lambda: self.api.polls == 2, [self.transport.reconnect])
+        self.assertEqual(self.api.polls, 2)
+
+    def test_activity_missed_during_gap(self):
+        """
+        Test that an activity missed during a gap is written by the reconciling
+        poll although a later one was pushed first, and that the pushed one
+        isn't written again when the poll returns it
+        """
+        now = datetime.datetime.now(datetime.timezone.utc)
+        missed = lock_activity("A1", "manual_unlock", now - datetime.timedelta(minutes=10))
+        # The server's time of the pushed lock differs a little from the PubNub time
+        pushed_time = now - datetime.timedelta(minutes=1)
+        polled = lock_activity("A2", "remote_lock", pushed_time + datetime.timedelta(seconds=2))
+
+        def gap():
+            self.api.activities = [polled, missed]
+            self.transport.publish(LOCK_ID, {"status": "kAugLockState_Locked"}, pushed_time)
+            self.transport.reconnect()
+
+        self.run_until(lambda: self.watermarks.activity_mark(HOUSE_ID) is not None, [gap])
+
+        activities = self.written_activities()
+        self.assertEqual(sorted((point["fields"]["activity_id"] or "") for point in activities), ["", "A1"])
+        self.assertEqual(self.watermarks.activity_mark(HOUSE_ID)[1], "A2")
+
+    def test_lock_added_later_is_registered(self):
+        """Test that a lock first seen by a later poll gets a push channel"""
+        def add_lock():
+            self.api.lock_ids.append("L1")
+            self.transport.reconnect()
+
+        subscribed = []
+
+        def restarted():
+            # The transport is stopped again once run_push is cancelled
+            if "L1" in self.transport.device_ids and self.transport.started:
+                subscribed.append("L1")
+            return subscribed
+
+        self.run_until(restarted, [add_lock])
+
+        self.assertEqual(subscribed, ["L1"])
+        self.assertEqual(self.transport.device_ids, {LOCK_ID, "L1"})
+
+    def test_failed_poll_is_retried(self):
+        """Test that a failed reconciling poll is logged and retried instead of stopping the push loop"""
+        self.api.failures = 1
+        self.run_until(lambda: self.transport.started, [], reconcile_interval=0.01)
+
+        self.assertEqual(self.api.polls, 2)
+
+    def test_failed_write_keeps_the_writer(self):
+        """Test that a batch failing with something other than a request error doesn't stop later writes"""
+        def write(points):
+            if not self.written:
+                self.written.append(None)
+                raise ValueError("not JSON")
+            self.written.extend(points)
+
+        self.write = write
+        self.run_until(
+            self.written_activities,
+            [lambda: self.transport.publish(LOCK_ID, {"status": "kAugLockState_Unlocked"})],
+        )
+
+        self.assertEqual(self.written[0], None)
+        self.assertEqual(len(self.written_activities()), 1)
+
+    def test_queued_batches_written_on_exit(self):
+        """Test that batches already queued are written when the push loop is stopped"""
+        self.run_until(lambda: True, [lambda: self.transport.publish(LOCK_ID, {"status": "kAugLockState_Locked"})])
+
+        self.assertEqual(len(self.written_activities()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
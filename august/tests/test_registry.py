@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+
+from yalexs.lock import LockDetail
+
+from registry import HOUSES_MAX_AGE, Registry
+
+
+def lock_detail(lock_id, house_id):
+    return LockDetail({"LockName": f"Lock {lock_id}", "LockID": lock_id, "HouseID": house_id, "Calibrated": False,
+                       "Type": 2, "SerialNumber": "S", "battery": 0.8, "LockStatus": {"status": "locked"},
+                       "currentFirmwareVersion": "1", "skuNumber": "x", "macAddress": "00"})
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "state", "registry.json")
+
+    def test_unknown_house_is_stale(self):
+        """Test that a lock in a house the registry doesn't know triggers a refetch of fresh houses"""
+        registry = Registry(self.path)
+        registry.house_names = {"H1": "Home"}
+        registry.houses_updated_at = 1000
+
+        self.assertFalse(registry.houses_stale(house_ids=["H1"], now=1001))
+        self.assertTrue(registry.houses_stale(house_ids=["H1", "H2"], now=1001))
+        self.assertTrue(registry.houses_stale(house_ids=["H1"], now=1001 + HOUSES_MAX_AGE))
+
+    def test_removed_devices_are_pruned(self):
+        """Test that locks no longer on the account are dropped, and the registry is saved under a new directory"""
+        registry = Registry(self.path)
+        registry.update_locks([lock_detail("L1", "H1"), lock_detail("L2", "H1")])
+        registry.update_locks([lock_detail("L2", "H2")])
+        registry.save()
+
+        reloaded = Registry(self.path)
+        self.assertEqual(reloaded.device_houses, {"L2": "H2"})
+        self.assertEqual(reloaded.device_names, {"L2": "Lock L2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
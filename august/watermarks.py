@@ -0,0 +1,81 @@
+import json
+import os
+from os import environ
+
+from registry import STATE_DIR
+
+WATERMARKS_PATH = environ.get("AUGUST_WATERMARKS_PATH", os.path.join(STATE_DIR, "watermarks.json"))
+
+
+def epoch_millis(dt):
+    """Activity times as the API sends them, yalexs turns them into naive local datetimes"""
+    return int(round(dt.timestamp() * 1000))
+
+
+class Watermarks:
+    """
+    What was already written to influx: the newest activity (time and id) per
+    house and the last seen updated_at per pin. Only advanced by the caller
+    once the write went through, and saved to `path` between runs.
+    """
+
+    def __init__(self, path=WATERMARKS_PATH):
+        self.path = path
+        self.activities = {}
+        self.pins = {}
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.activities = state["activities"]
+            self.pins = state["pins"]
+
+    def activity_mark(self, house_id):
+        """(time, activity_id) of the newest written activity of the house, or None"""
+        mark = self.activities.get(house_id)
+        if mark is None:
+            return None
+        return mark["time"], mark["activity_id"]
+
+    def is_newer(self, house_id, time):
+        """Whether epoch milliseconds `time` is after the house's watermark"""
+        mark = self.activity_mark(house_id)
+        return mark is None or time > mark[0]
+
+    def is_new_activity(self, house_id, activity):
+        mark = self.activity_mark(house_id)
+        if mark is None:
+            return True
+        time, activity_id = mark
+        activity_time = epoch_millis(activity.activity_start_time)
+        if activity_time == time:
+            return activity.activity_id != activity_id
+        return activity_time > time
+
+    def pin_changed(self, pin):
+        return self.pins.get(pin.pin_id) != pin.updated_at.isoformat()
+
+    def update_activities(self, house_id, activities):
+        if not activities:
+            return
+        newest = max(activities, key=lambda activity: activity.activity_start_time)
+        self.activities[house_id] = dict(
+            time=epoch_millis(newest.activity_start_time),
+            activity_id=newest.activity_id,
+        )
+
+    def update_pins(self, pins):
+        for pin in pins:
+            self.pins[pin.pin_id] = pin.updated_at.isoformat()
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(dict(
+                activities=self.activities,
+                pins=self.pins,
+            ), f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import requests
+
+import synthetic
+from dashboards import load_queries, prepare, schema, variables
+from synthetic import DAY
+
+# The bench profile of compose.yml
+INFLUX_URL = "http://localhost:8097"
+INFLUX_TOKEN = "bench-token"
+INFLUX_ORG = "bench"
+API_URL = "http://localhost:8098"
+
+RANGES = {"1d": DAY, "7d": 7 * DAY, "30d": 30 * DAY, "1y": 365 * DAY}
+# Buckets the collectors write to -> generator(begin, end, rng)
+COLLECTOR_BUCKETS = {
+    "solar_edge": synthetic.solar_edge,
+    "purpleair": synthetic.purpleair,
+    "august_data": synthetic.august_data,
+    "unifi_protect": synthetic.unifi_protect,
+}
+# A query this much slower than the baseline is a regression...
+REGRESSION_RATIO = 1.25
+# ...unless it's only this many milliseconds slower
+REGRESSION_MIN_MS = 20
+
+
+def batches(points, size):
+    points = iter(points)
+    while True:
+        batch = list(islice(points, size))
+        if not batch:
+            return
+        yield batch
+
+
+def wait_until_up(session, timeout=120):
+    deadline = time.time() + timeout
+    for url in (f"{INFLUX_URL}/health", f"{API_URL}/health"):
+        while True:
+            try:
+                if session.get(url, timeout=5).ok:
+                    break
+            except requests.ConnectionError:
+                pass
+            if time.time() > deadline:
+                sys.exit(f"{url} isn't up, start it with bench/run.sh")
+            time.sleep(1)
+
+
+def ingest(session, bucket, points, batch_size, workers):
+    """Write `points` through the API's influx endpoint, returns (points, seconds)"""
+    url = f"{API_URL}/influx/{bucket}/write"
+
+    def post(batch):
+        resp = session.post(url, json=dict(data_points=batch))
+        resp.raise_for_status()
+        return len(batch)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        written = sum(executor.map(post, batches(points, batch_size)))
+    return written, time.perf_counter() - start
+
+
+def map_database(session, database):
+    """Map the InfluxQL database onto the bucket of the same name, the v1 /query endpoint needs it"""
+    headers = {"Authorization": f"Token {INFLUX_TOKEN}"}
+    resp = session.get(f"{INFLUX_URL}/api/v2/buckets", params={"name": database}, headers=headers)
+    resp.raise_for_status()
+    bucket = resp.json()["buckets"][0]
+    resp = session.get(f"{INFLUX_URL}/api/v2/dbrps", params={"orgID": bucket["orgID"], "db": database},
+                       headers=headers)
+    resp.raise_for_status()
+    if resp.json().get("content"):
+        return
+    resp = session.post(f"{INFLUX_URL}/api/v2/dbrps", headers=headers, json={
+        "bucketID": bucket["id"], "orgID": bucket["orgID"], "database": database,
+        "retention_policy": "autogen", "default": True,
+    })
+    resp.raise_for_status()
+
+
+def run_query(session, query, text):
+    """Run one panel query, returns (milliseconds, rows)"""
+    headers = {"Authorization": f"Token {INFLUX_TOKEN}"}
+    start = time.perf_counter()
+    if query.language == "flux":
+        resp = session.post(f"{INFLUX_URL}/api/v2/query", params={"org": INFLUX_ORG}, data=text.encode(),
+                            headers=dict(headers, **{"Content-Type": "application/vnd.flux",
+                                                     "Accept": "application/csv"}))
+        elapsed = time.perf_counter() - start
+        resp.raise_for_status()
+        lines = [line for line in resp.text.splitlines() if line.strip()]
+        rows = sum(1 for line in lines if not line.startswith(",result,table"))
+    else:
+        resp = session.get(f"{INFLUX_URL}/query", params={"db": query.database, "q": text}, headers=headers)
+        elapsed = time.perf_counter() - start
+        resp.raise_for_status()
+        results = resp.json().get("results", [])
+        errors = [result["error"] for result in results if "error" in result]
+        if errors:
+            raise ValueError(errors[0])
+        rows = sum(len(series.get("values", [])) for result in results for series in result.get("series", []))
+    return elapsed * 1000, rows
+
+
+def benchmark_queries(session, queries, ranges, repeat, template_variables):
+    """query key -> range -> {ms, rows} (or {error}), the median of `repeat` runs"""
+    results = {}
+    for name, seconds in ranges.items():
+        for query in queries:
+            text = prepare(query, seconds, template_variables)
+            try:
+                runs = [run_query(session, query, text) for _ in range(repeat)]
+            except (requests.RequestException, ValueError) as e:
+                results.setdefault(query.key, {})[name] = dict(error=str(e)[:200])
+                continue
+            results.setdefault(query.key, {})[name] = dict(
+                ms=round(statistics.median(ms for ms, _ in runs), 1), rows=runs[0][1])
+        print(f"Ran {len(queries)} queries over {name}", file=sys.stderr)
+    return results
+
+
+def regressions(results, baseline):
+    """(query key, range, baseline ms, ms) of every query that got slower than the baseline"""
+    slower = []
+    for key, by_range in results.items():
+        for name, result in by_range.items():
+            before = baseline.get(key, {}).get(name, {}).get("ms")
+            now = result.get("ms")
+            if before is None or now is None:
+                continue
+            if now > before * REGRESSION_RATIO and now - before > REGRESSION_MIN_MS:
+                slower.append((key, name, before, now))
+    return slower
+
+
+def print_report(ingested, results, ranges, top):
+    print("Ingest through the API")
+    print(f"  {'bucket':<16}{'points':>10}{'seconds':>10}{'points/s':>10}")
+    for bucket, (points, seconds) in ingested.items():
+        print(f"  {bucket:<16}{points:>10}{seconds:>10.1f}{points / seconds:>10.0f}")
+
+    longest = list(ranges)[-1]
+    print(f"\nPanel query latency in ms, slowest over {longest} first")
+    print("  " + "".join(f"{name:>9}" for name in ranges) + f"{'rows':>9}  query")
+    ordered = sorted(results.items(), key=lambda item: -item[1].get(longest, {}).get("ms", float("inf")))
+    for key, by_range in ordered[:top]:
+        cells = "".join(f"{by_range[name]['ms']:>9.1f}" if "ms" in by_range.get(name, {}) else f"{'error':>9}"
+                        for name in ranges)
+        rows = by_range.get(longest, {}).get("rows", "")
+        print(f"  {cells}{rows:>9}  {key}")
+
+    failed = {key: by_range for key, by_range in results.items()
+              if any("error" in result for result in by_range.values())}
+    for key, by_range in failed.items():
+        error = next(result["error"] for result in by_range.values() if "error" in result)
+        print(f"  failed: {key}: {error}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark ingest through the API and dashboard query latency on a local InfluxDB")
+    parser.add_argument("--days", type=int, default=365, help="days of synthetic data to write (default: 365)")
+    parser.add_argument("--ranges", default=",".join(RANGES),
+                        help="dashboard time ranges to query, of " + ", ".join(RANGES))
+    parser.add_argument("--batch-size", type=int, default=5000, help="points per API request")
+    parser.add_argument("--workers", type=int, default=4, help="API requests in flight at once")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per query, the median is reported")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-ingest", action="store_true", help="query the data of an earlier run")
+    parser.add_argument("--top", type=int, default=None, help="only list the N slowest queries")
+    parser.add_argument("--output", help="save the results as JSON, to compare a later run with")
+    parser.add_argument("--baseline", help="results of an earlier run, exit 1 when queries got slower")
+    args = parser.parse_args()
+
+    ranges = {name: RANGES[name] for name in args.ranges.split(",")}
+    queries = load_queries()
+    buckets = schema(queries)
+    session = requests.Session()
+    wait_until_up(session)
+
+    ingested = {}
+    if not args.skip_ingest:
+        end = int(time.time()) // 60 * 60
+        begin = end - args.days * DAY
+        generators = {bucket: generator(begin, end, random.Random(args.seed))
+                      for bucket, generator in COLLECTOR_BUCKETS.items()}
+        for bucket, measurements in sorted(buckets.items()):
+            generators[bucket] = synthetic.from_schema(begin, end, random.Random(args.seed), measurements,
+                                                       synthetic.SCHEMA_CADENCE)
+        for bucket, points in generators.items():
+            ingested[bucket] = ingest(session, bucket, points, args.batch_size, args.workers)
+            print(f"Wrote {ingested[bucket][0]} points to {bucket}", file=sys.stderr)
+
+    for database in {query.database for query in queries if query.database}:
+        map_database(session, database)
+    results = benchmark_queries(session, queries, ranges, args.repeat, variables(buckets))
+    print_report(ingested, results, ranges, args.top)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(dict(ingest={bucket: dict(points=points, seconds=round(seconds, 2))
+                                   for bucket, (points, seconds) in ingested.items()},
+                           queries=results), f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(results, json.load(f)["queries"])
+        for key, name, before, now in slower:
+            print(f"REGRESSION {key} over {name}: {before:.1f}ms -> {now:.1f}ms")
+        if slower:
+            sys.exit(1)
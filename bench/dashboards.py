@@ -0,0 +1,219 @@
+import glob
+import json
+import os
+import re
+
+from synthetic import DAY
+
+DASHBOARDS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "grafana", "dashboards")
+# Database of the InfluxQL targets, mapped onto the bucket of the same name
+INFLUXQL_DATABASES = {"Rivian": "rivian"}
+INFLUXQL_DATABASE = "weatherflow"
+# Grafana asks for about one point per pixel of a wall display panel
+MAX_DATA_POINTS = 1000
+# Grafana rounds $__interval/v.windowPeriod up to one of these, in seconds
+NICE_INTERVALS = [1, 5, 10, 15, 30, 60, 5 * 60, 10 * 60, 15 * 60, 30 * 60, 3600, 3 * 3600,
+                  6 * 3600, 12 * 3600, DAY, 7 * DAY]
+DEFAULT_TIMEZONE = "America/Chicago"
+
+VARIABLE = re.compile(r"\$\{(\w+)(?::\w+)?\}|\[\[(\w+)\]\]|\$(\w+)")
+FLUX_FIELD = re.compile(r'r\._field\s*==\s*"([^"]+)"|r\["_field"\]\s*==\s*"([^"]+)"')
+FLUX_BUCKET = re.compile(r'from\(\s*bucket:\s*"([^"]+)"')
+FLUX_MEASUREMENT = re.compile(r'r\._measurement\s*==\s*"([^"]+)"|r\["_measurement"\]\s*==\s*"([^"]+)"')
+INFLUXQL_FROM = re.compile(r'FROM\s+"([^"]+)"', re.IGNORECASE)
+INFLUXQL_FIELD = re.compile(r'\b\w+\(\s*"([^"]+)"\s*\)')
+INFLUXQL_TAG = re.compile(r'"(\w+)"\s*(=~|!~|=|!=)\s*(/[^/]*/|\'[^\']*\')')
+
+
+class PanelQuery:
+    """One panel target, Flux or InfluxQL (raw, or rendered from the query builder)"""
+
+    def __init__(self, dashboard, panel, ref_id, language, text):
+        self.dashboard = dashboard
+        self.panel = panel
+        self.ref_id = ref_id
+        self.language = language
+        self.text = text
+
+    @property
+    def database(self):
+        """The bucket an InfluxQL query reads, or None for Flux"""
+        if self.language != "influxql":
+            return None
+        return INFLUXQL_DATABASES.get(self.dashboard, INFLUXQL_DATABASE)
+
+    @property
+    def key(self):
+        return f"{self.dashboard}/{self.panel}/{self.ref_id}"
+
+
+def _iter_panels(node):
+    if isinstance(node, dict):
+        if isinstance(node.get("targets"), list):
+            yield node
+        for value in node.values():
+            yield from _iter_panels(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _iter_panels(value)
+
+
+def load_queries(directory=DASHBOARDS_DIR):
+    """Every visible Influx target of the dashboards under `directory`"""
+    queries = []
+    for path in sorted(glob.glob(os.path.join(directory, "**", "*.json"), recursive=True)):
+        with open(path) as f:
+            dashboard = json.load(f)
+        name = os.path.splitext(os.path.basename(path))[0]
+        for panel in _iter_panels(dashboard):
+            title = panel.get("title") or f"panel {panel.get('id', '?')}"
+            for target in panel["targets"]:
+                if target.get("hide"):
+                    continue
+                query = target.get("query")
+                if isinstance(query, str) and "from(bucket" in query:
+                    language, text = "flux", query
+                elif isinstance(query, str) and target.get("rawQuery"):
+                    language, text = "influxql", query
+                elif "select" in target and "measurement" in target:
+                    language, text = "influxql", render_builder(target)
+                else:
+                    continue
+                queries.append(PanelQuery(name, title, target.get("refId", "?"), language, text))
+    return queries
+
+
+def _tag_condition(tag):
+    value = tag["value"]
+    operator = tag.get("operator", "=")
+    if operator in ("=~", "!~") or re.fullmatch(r"-?\d+(\.\d+)?", value) and operator in ("<", ">"):
+        literal = value
+    else:
+        literal = "'{}'".format(value.replace("'", "\\'"))
+    return f'"{tag["key"]}" {operator} {literal}'
+
+
+def render_builder(target):
+    """The InfluxQL Grafana's query builder sends for a target"""
+    columns = []
+    for parts in target.get("select", []):
+        expression = ""
+        alias = ""
+        for part in parts:
+            kind, params = part["type"], part.get("params", [])
+            if kind == "field":
+                expression = f'"{params[0]}"'
+            elif kind == "math":
+                expression += f" {params[0]}"
+            elif kind == "alias":
+                alias = f' AS "{params[0]}"'
+            else:
+                expression = "{}({})".format(kind, ", ".join([expression] + [str(p) for p in params]))
+        columns.append(expression + alias)
+
+    measurement = f'"{target["measurement"]}"'
+    if target.get("policy") not in (None, "default"):
+        measurement = f'"{target["policy"]}".{measurement}'
+
+    where = ""
+    for tag in target.get("tags", []):
+        condition = tag.get("condition", "AND")
+        where += f" {condition} " + _tag_condition(tag) if where else _tag_condition(tag)
+    where = f"({where}) AND $timeFilter" if where else "$timeFilter"
+
+    groups = []
+    fill = ""
+    for group in target.get("groupBy", []):
+        params = group.get("params", [])
+        if group["type"] == "time":
+            groups.append(f"time({params[0]})")
+        elif group["type"] == "tag":
+            groups.append(f'"{params[0]}"')
+        elif group["type"] == "fill":
+            fill = f" fill({params[0]})"
+
+    query = "SELECT {} FROM {} WHERE {}".format(", ".join(columns), measurement, where)
+    if groups:
+        query += " GROUP BY " + ", ".join(groups)
+    query += fill
+    if target.get("orderByTime") == "DESC":
+        query += " ORDER BY time DESC"
+    if target.get("tz"):
+        query += f" tz('{target['tz']}')"
+    return query
+
+
+def schema(queries):
+    """
+    bucket -> measurement -> (fields, {tag: values}) read by the queries. Tag
+    values are the literals the queries compare with, "bench" where they
+    only match template variables.
+    """
+    buckets = {}
+    for query in queries:
+        if query.language == "flux":
+            fields = {a or b for a, b in FLUX_FIELD.findall(query.text)}
+            measurements = {a or b for a, b in FLUX_MEASUREMENT.findall(query.text)}
+            for bucket in FLUX_BUCKET.findall(query.text):
+                for measurement in measurements:
+                    entry = buckets.setdefault(bucket, {}).setdefault(measurement, (set(), {}))
+                    entry[0].update(fields)
+            continue
+
+        measurements = INFLUXQL_FROM.findall(query.text)
+        if len(measurements) != 1:
+            continue
+        fields, tags = buckets.setdefault(query.database, {}).setdefault(measurements[0], (set(), {}))
+        fields.update(INFLUXQL_FIELD.findall(query.text))
+        for key, _, value in INFLUXQL_TAG.findall(query.text):
+            values = tags.setdefault(key, [])
+            if value.startswith("'") and value[1:-1] not in values:
+                values.append(value[1:-1])
+        for key in re.findall(r'GROUP BY[^;]*?"(\w+)"', query.text):
+            tags.setdefault(key, [])
+
+    for measurements in buckets.values():
+        for fields, tags in measurements.values():
+            for values in tags.values():
+                if not values:
+                    values.append("bench")
+    return {
+        bucket: {measurement: entry for measurement, entry in measurements.items() if entry[0]}
+        for bucket, measurements in buckets.items()
+    }
+
+
+def window_seconds(range_seconds, max_data_points=MAX_DATA_POINTS):
+    """$__interval / v.windowPeriod Grafana picks for a time range"""
+    raw = range_seconds / max_data_points
+    return next((nice for nice in NICE_INTERVALS if nice >= raw), NICE_INTERVALS[-1])
+
+
+def variables(buckets):
+    """Template variable -> value, the first tag value written for the tag of the same name"""
+    values = {"tz": DEFAULT_TIMEZONE}
+    for measurements in buckets.values():
+        for _, tags in measurements.values():
+            for key, tag_values in tags.items():
+                values.setdefault(key, tag_values[0])
+    return values
+
+
+def prepare(query, range_seconds, template_variables):
+    """The query text as Grafana would send it for the last `range_seconds`"""
+    window = window_seconds(range_seconds)
+    if query.language == "flux":
+        return (f"v = {{timeRangeStart: -{range_seconds}s, timeRangeStop: now(), windowPeriod: {window}s}}\n"
+                + query.text)
+
+    text = query.text.replace("$timeFilter", f"time >= now() - {range_seconds}s")
+
+    def substitute(match):
+        name = match.group(1) or match.group(2) or match.group(3)
+        if name in ("__interval", "interval"):
+            return f"{window}s"
+        if name == "__interval_ms":
+            return str(window * 1000)
+        return template_variables.get(name[4:] if name.startswith("tag_") else name, "bench")
+
+    return VARIABLE.sub(substitute, text)
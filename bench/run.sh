@@ -0,0 +1,14 @@
+#!/bin/bash
+
+##
+## Start a throwaway InfluxDB and API from compose.yml, benchmark them and remove them again.
+## Arguments go to benchmark.py, e.g. bench/run.sh --days 30 --output results.json
+##
+
+set -e
+cd "$(dirname "$0")/.."
+
+docker compose --profile bench up -d --build --wait influxdb-bench api-bench
+trap 'docker compose --profile bench rm -sfv influxdb-bench api-bench' EXIT
+
+python3 bench/benchmark.py "$@"
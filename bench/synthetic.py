@@ -0,0 +1,213 @@
+import math
+
+# Synthetic data for the benchmark, one generator per bucket. Measurements,
+# tags and cadences follow what the collectors write, values are random walks
+# on top of daily cycles so aggregates and downsampling see realistic shapes.
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+
+SOLAR_METERS = ["production", "consumption", "self_consumption", "feedin", "import"]
+SOLAR_SITE_ID = "1234567"
+PURPLEAIR_SENSOR = "Backyard"
+AUGUST_LOCKS = [("L1", "Front Door"), ("L2", "Back Door"), ("L3", "Garage")]
+AUGUST_HOUSE = ("H1", "Home")
+UNIFI_CAMERAS = [("aa:bb:cc:00:00:01", "Driveway"), ("aa:bb:cc:00:00:02", "Porch"),
+                 ("aa:bb:cc:00:00:03", "Backyard")]
+UNIFI_METRICS = ["uptime", "wifi.signal"]
+# Cadence of the measurements the dashboards read, anything else is written every 5 minutes
+SCHEMA_CADENCE = {
+    "weatherflow_obs": MINUTE,
+    "weatherflow_rapid_wind": MINUTE,
+    "weatherflow_forecast_hourly": HOUR,
+    "weatherflow_forecast_daily": DAY,
+    "weatherflow_forecast_current": 10 * MINUTE,
+    "weatherflow_system_events": HOUR,
+    "weatherflow_evt_strike": 3 * HOUR,
+}
+SCHEMA_SERIES = 2
+
+
+def ns(epoch):
+    return int(epoch) * 1000000000
+
+
+def daylight(epoch):
+    """0 at night, rising to 1 at solar noon (UTC based, the shape is what matters)"""
+    hour = (epoch % DAY) / HOUR
+    return max(0.0, math.sin((hour - 6) / 12 * math.pi))
+
+
+def daily(epoch, low, high):
+    """A value cycling between low (early morning) and high (afternoon) every day"""
+    hour = (epoch % DAY) / HOUR
+    return low + (high - low) * (1 + math.sin((hour - 9) / 24 * 2 * math.pi)) / 2
+
+
+class Walk:
+    """Random walk kept within low..high"""
+
+    def __init__(self, rng, low, high, step):
+        self.rng = rng
+        self.low = low
+        self.high = high
+        self.step = step
+        self.value = rng.uniform(low, high)
+
+    def next(self):
+        self.value = min(self.high, max(self.low, self.value + self.rng.uniform(-self.step, self.step)))
+        return self.value
+
+
+def solar_edge(begin, end, rng):
+    """Power and energy details every 15 minutes per meter, inverter telemetry every 5"""
+    for epoch in range(begin, end, 15 * MINUTE):
+        sun = daylight(epoch)
+        load = daily(epoch, 300.0, 1500.0) * rng.uniform(0.8, 1.2)
+        production = 7000.0 * sun * rng.uniform(0.6, 1.0)
+        values = {
+            "production": production,
+            "consumption": load,
+            "self_consumption": min(production, load),
+            "feedin": max(0.0, production - load),
+            "import": max(0.0, load - production),
+        }
+        for meter in SOLAR_METERS:
+            power = round(values[meter], 2)
+            for kind, value in (("power", power), ("energy", round(power / 4, 2))):
+                measurement = f"{kind}_{meter}"
+                yield {
+                    "measurement": f"sensor__{measurement}",
+                    "tags": {"entity_id": f"solaredge_{measurement}", "domain": "sensor",
+                             "site_id": SOLAR_SITE_ID},
+                    "time": ns(epoch),
+                    "fields": {"value": value},
+                }
+
+    temperature = Walk(rng, 25.0, 55.0, 0.5)
+    energy = 0.0
+    for epoch in range(begin, end, 5 * MINUTE):
+        power = round(7000.0 * daylight(epoch) * rng.uniform(0.6, 1.0), 1)
+        energy += power / 12
+        yield {
+            "measurement": "solaredge_inverter",
+            "tags": {"site_id": SOLAR_SITE_ID, "serial": "7E1234AB-12"},
+            "time": ns(epoch),
+            "fields": {
+                "power": power,
+                "energy": round(energy, 1),
+                "dc_voltage": round(rng.uniform(370.0, 390.0) if power else 0.0, 1),
+                "temperature": round(temperature.next(), 1),
+                "l1_ac_voltage": round(rng.uniform(238.0, 244.0), 1),
+                "l1_ac_current": round(power / 240, 2),
+                "l1_ac_frequency": round(rng.uniform(59.98, 60.02), 3),
+            },
+        }
+
+
+def purpleair(begin, end, rng):
+    """One outdoor sensor reporting every 2 minutes"""
+    pm25 = Walk(rng, 0.5, 60.0, 1.5)
+    for epoch in range(begin, end, 2 * MINUTE):
+        value = pm25.next()
+        yield {
+            "measurement": "airquality",
+            "tags": {"location": "Outside", "host": PURPLEAIR_SENSOR, "sensor": "PurpleAir"},
+            "time": ns(epoch),
+            "fields": {
+                "pm10": round(value * 0.7, 2),
+                "pm25": round(value, 2),
+                "pm100": round(value * 1.2, 2),
+                "pm25_epa": round(value * 0.52 + 2.0, 2),
+                "pm25_nowcast": round(value * 0.9, 2),
+                "aqi_nowcast": int(min(500, value * 3)),
+            },
+        }
+
+
+def august_data(begin, end, rng):
+    """Battery levels of every lock every 30 minutes, ~20 lock operations a day"""
+    batteries = {lock_id: 100.0 for lock_id, _ in AUGUST_LOCKS}
+    house_id, house_name = AUGUST_HOUSE
+    for epoch in range(begin, end, 30 * MINUTE):
+        for lock_id, name in AUGUST_LOCKS:
+            batteries[lock_id] = batteries[lock_id] - 0.005 if batteries[lock_id] > 5 else 100.0
+            yield {
+                "measurement": "augustLockBattery",
+                "tags": {"name": name, "house": house_name, "lock_id": lock_id, "type": "lock"},
+                "time": ns(epoch),
+                "fields": {"battery_level": round(batteries[lock_id], 1)},
+            }
+
+    epoch = begin
+    activity = 0
+    while True:
+        epoch += int(rng.expovariate(20 / DAY))
+        if epoch >= end:
+            break
+        activity += 1
+        lock_id, name = rng.choice(AUGUST_LOCKS)
+        action = rng.choice(["lock", "unlock"])
+        yield {
+            "measurement": "augustActivities",
+            "tags": {"house": house_name, "house_id": house_id, "activity_type": "LOCK_OPERATION",
+                     "device_name": name, "device_type": "lock"},
+            "time": ns(epoch),
+            "fields": {"activity_id": f"A{activity}", "action": action, "device_id": lock_id,
+                       "operated_by": rng.choice(["Owner", "Auto Relock", "Keypad"])},
+        }
+
+
+def unifi_protect(begin, end, rng):
+    """5 minute telemetry windows per camera and metric, motion events a few times an hour"""
+    for epoch in range(begin, end, 5 * MINUTE):
+        for mac, name in UNIFI_CAMERAS:
+            for metric in UNIFI_METRICS:
+                value = float(epoch - begin) if metric == "uptime" else rng.uniform(-70.0, -40.0)
+                yield {
+                    "measurement": "telemetry",
+                    "tags": {"device_mac": mac, "device_name": name, "metric": metric, "source": "mqtt"},
+                    "time": ns(epoch),
+                    "fields": {"count": 5, "min": value, "max": value, "mean": value, "last": value},
+                }
+
+    for mac, name in UNIFI_CAMERAS:
+        epoch = begin
+        while True:
+            epoch += int(rng.expovariate(3 / HOUR))
+            if epoch >= end:
+                break
+            yield {
+                "measurement": "motion_events",
+                "tags": {"device_mac": mac, "device_name": name,
+                         "event_type": rng.choice(["motion", "person", "vehicle"]), "source": "mqtt"},
+                "time": ns(epoch),
+                "fields": {"duration": round(rng.uniform(2.0, 60.0), 1), "timed_out": 0},
+            }
+
+
+def from_schema(begin, end, rng, measurements, cadences, default_cadence=5 * MINUTE):
+    """
+    Every measurement, field and tag the dashboards query, from
+    dashboards.schema(). Each measurement has SCHEMA_SERIES series that take
+    turns through the tag values the dashboards filter on.
+    """
+    for measurement, (fields, tags) in sorted(measurements.items()):
+        cadence = cadences.get(measurement, default_cadence)
+        series = []
+        for index in range(SCHEMA_SERIES):
+            series_tags = {key: values[index % len(values)] for key, values in sorted(tags.items())}
+            walks = {field: Walk(rng, 0.0, 100.0, 2.0) for field in sorted(fields)}
+            series.append((series_tags, walks))
+            if not tags:
+                break
+
+        for epoch in range(begin, end, cadence):
+            for series_tags, walks in series:
+                yield {
+                    "measurement": measurement,
+                    "tags": series_tags,
+                    "time": ns(epoch),
+                    "fields": {field: round(walk.next(), 2) for field, walk in walks.items()},
+                }
@@ -0,0 +1,72 @@
+import random
+import re
+import unittest
+
+import synthetic
+from dashboards import load_queries, prepare, render_builder, schema, variables, window_seconds
+from synthetic import DAY
+
+
+class TestDashboards(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.queries = load_queries()
+        cls.buckets = schema(cls.queries)
+
+    def test_render_builder(self):
+        """Test the InfluxQL of a query builder target"""
+        target = {
+            "measurement": "weatherflow_obs", "policy": "default", "tz": "$tz",
+            "select": [[{"type": "field", "params": ["air_temperature"]}, {"type": "mean", "params": []},
+                        {"type": "math", "params": ["* 9/5 + 32"]}, {"type": "alias", "params": ["temp"]}]],
+            "tags": [{"key": "station_name", "operator": "=~", "value": "/^$station_name$/"},
+                     {"condition": "AND", "key": "collector_type", "operator": "=", "value": "remote-rest"}],
+            "groupBy": [{"type": "time", "params": ["$__interval"]}, {"type": "fill", "params": ["null"]}],
+        }
+        self.assertEqual(
+            render_builder(target),
+            'SELECT mean("air_temperature") * 9/5 + 32 AS "temp" FROM "weatherflow_obs" '
+            'WHERE ("station_name" =~ /^$station_name$/ AND "collector_type" = \'remote-rest\') '
+            "AND $timeFilter GROUP BY time($__interval) fill(null) tz('$tz')")
+
+    def test_every_query_prepared(self):
+        """Test that no template variable is left in any prepared query"""
+        template_variables = variables(self.buckets)
+        self.assertEqual({query.language for query in self.queries}, {"flux", "influxql"})
+        for query in self.queries:
+            text = prepare(query, 7 * DAY, template_variables)
+            self.assertIsNone(re.search(r"\$\w|\[\[", text), query.key)
+
+    def test_schema_covers_dashboards(self):
+        """Test that the written data has what the panels filter on"""
+        self.assertEqual(set(self.buckets), {"weatherflow", "rivian"})
+        fields, tags = self.buckets["weatherflow"]["weatherflow_obs"]
+        self.assertIn("air_temperature", fields)
+        self.assertIn("remote-rest", tags["collector_type"])
+        self.assertIn("Battery", self.buckets["rivian"]["rivian"][0])
+
+    def test_window_seconds(self):
+        self.assertEqual(window_seconds(DAY), 300)
+        self.assertEqual(window_seconds(365 * DAY), 12 * 3600)
+
+
+class TestSynthetic(unittest.TestCase):
+
+    def test_field_types_stable(self):
+        """Test that a field always has the same type, InfluxDB rejects points that change it"""
+        generators = [synthetic.solar_edge, synthetic.purpleair, synthetic.august_data, synthetic.unifi_protect]
+        for generator in generators:
+            types = {}
+            for point in generator(0, 2 * DAY, random.Random(1)):
+                for field, value in point["fields"].items():
+                    key = (point["measurement"], field)
+                    self.assertEqual(types.setdefault(key, type(value)), type(value), key)
+
+    def test_cadence(self):
+        """Test one day of purpleair readings every 2 minutes"""
+        self.assertEqual(sum(1 for _ in synthetic.purpleair(0, DAY, random.Random(1))), 720)
+
+
+if __name__ == "__main__":
+    unittest.main()
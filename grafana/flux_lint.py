@@ -0,0 +1,546 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import copy
+import glob
+import json
+import os
+import re
+import sys
+
+DASHBOARDS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboards")
+
+# rule -> weight, queries are ranked by the summed weight of their findings
+RULES = {
+    "missing-range": 100,
+    "late-range": 80,
+    "oversized-range": 60,
+    "missing-window": 50,
+    "late-filter": 40,
+    "early-stage": 30,
+    "fixed-range": 25,
+    "fine-window": 45,
+    "filter-precedence": 20,
+    "fixed-window": 15,
+    "rollup": 10,
+}
+# Windows shorter than this over a dashboard range return far more points than a panel can draw
+MIN_FIXED_WINDOW = 60
+
+# Stages after which filter() is no longer pushed down to the storage engine
+EXPENSIVE_STAGES = {"map", "pivot", "group", "sort", "join", "union", "window", "aggregateWindow",
+                    "reduce", "stateCount", "stateDuration", "difference", "derivative", "fill",
+                    "rename", "duplicate", "timeShift", "elapsed", "cumulativeSum"}
+# Stages that reduce a table to fewer rows
+AGGREGATE_STAGES = {"aggregateWindow", "window", "mean", "median", "sum", "count", "min", "max",
+                    "first", "last", "spread", "stddev", "quantile", "integral", "distinct",
+                    "unique", "top", "bottom", "limit", "tail", "reduce", "histogram", "increase"}
+# Stages a filter on these columns can be moved in front of
+FILTER_MOVABLE_OVER = {"map", "sort", "fill", "drop", "keep", "duplicate", "timeShift"}
+PUSHDOWN_COLUMNS = {"_measurement", "_field"}
+# aggregateWindow() functions whose result doesn't change when a map() runs after them
+SELECTOR_FNS = {"last", "first"}
+# aggregateWindow() functions a downsampled bucket can answer
+ROLLUP_FNS = {"mean", "min", "max", "last", "first"}
+
+INFLUXQL_AGGREGATES = re.compile(
+    r"\b(mean|median|count|sum|min|max|first|last|distinct|integral|spread|stddev|"
+    r"percentile|mode|top|bottom|difference|derivative|cumulative_sum)\s*\(", re.IGNORECASE)
+INFLUXQL_GROUP_TIME = re.compile(r"GROUP\s+BY\s+.*?time\(\s*([^)\s]+)\s*\)", re.IGNORECASE | re.DOTALL)
+
+FILTER_COLUMN = re.compile(r'r\.(\w+)|r\["([^"]+)"\]')
+MEASUREMENT_EQUALS = re.compile(r'(r\._measurement|r\["_measurement"\])\s*==\s*"[^"]*"')
+
+DURATION = re.compile(r"(\d+)(mo|ms|us|ns|y|w|d|h|m|s)")
+DURATION_SECONDS = {"y": 365 * 86400, "mo": 30 * 86400, "w": 7 * 86400, "d": 86400, "h": 3600,
+                    "m": 60, "s": 1, "ms": 1e-3, "us": 1e-6, "ns": 1e-9}
+
+
+def duration_seconds(text):
+    """Seconds of a Flux/InfluxQL duration literal such as -30d or 1h30m, None if it isn't one"""
+    text = text.strip().lstrip("-")
+    if not text or DURATION.sub("", text):
+        return None
+    return sum(int(count) * DURATION_SECONDS[unit] for count, unit in DURATION.findall(text))
+
+
+class Finding:
+
+    def __init__(self, rule, message, fixed=False):
+        self.rule = rule
+        self.message = message
+        self.fixed = fixed
+
+    @property
+    def weight(self):
+        return RULES[self.rule]
+
+    def to_dict(self):
+        return dict(rule=self.rule, weight=self.weight, message=self.message, fixed=self.fixed)
+
+
+# Flux parsing. Just enough to split a query into its pipelines and stages,
+# strings and comments are skipped so their parentheses and pipes don't count.
+
+def _scan(text):
+    """(index, depth) of every character outside strings and comments"""
+    depth = 0
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if c == '"':
+            i += 1
+            while i < len(text) and text[i] != '"':
+                i += 2 if text[i] == "\\" else 1
+            i += 1
+            continue
+        if text.startswith("//", i):
+            end = text.find("\n", i)
+            i = len(text) if end == -1 else end
+            continue
+        if c in "([{":
+            depth += 1
+        elif c in ")]}":
+            depth -= 1
+        yield i, depth
+        i += 1
+
+
+def split_top_level(text, separator):
+    """`text` split at every `separator` that isn't nested in brackets or in a string"""
+    parts = []
+    start = 0
+    for i, depth in _scan(text):
+        if depth == 0 and i >= start and text.startswith(separator, i):
+            parts.append(text[start:i])
+            start = i + len(separator)
+    parts.append(text[start:])
+    return parts
+
+
+def split_keyword(text, keyword):
+    """`text` split at every top level `keyword` surrounded by whitespace, such as and/or"""
+    pattern = re.compile(rf"\s+{keyword}\s+")
+    parts = []
+    start = 0
+    for i, depth in _scan(text):
+        if depth == 0 and i >= start and text[i].isspace():
+            match = pattern.match(text, i)
+            if match:
+                parts.append(text[start:i])
+                start = match.end()
+    parts.append(text[start:])
+    return parts
+
+
+def statement_spans(query):
+    """(start, end) of each top level statement, a pipeline continues on lines starting with |>"""
+    breaks = [i for i, depth in _scan(query) if depth == 0 and query[i] == "\n"]
+    spans = []
+    start = 0
+    for end in breaks + [len(query)]:
+        piece = query[start:end]
+        if piece.strip():
+            if spans and piece.lstrip().startswith("|>"):
+                spans[-1] = (spans[-1][0], end)
+            else:
+                spans.append((start, end))
+        start = end
+    return spans
+
+
+class Stage:
+
+    def __init__(self, text):
+        self.text = text.strip()
+        self.name = None
+        self.args = {}
+        match = re.match(r"([\w.]+)\s*\(", self.text)
+        if match and self.text.endswith(")"):
+            self.name = match.group(1)
+            for argument in split_top_level(self.text[match.end():-1], ","):
+                key, _, value = argument.partition(":")
+                if value:
+                    self.args[key.strip()] = value.strip()
+
+    def with_args(self, **args):
+        merged = dict(self.args, **args)
+        return Stage("{}({})".format(self.name, ", ".join(f"{k}: {v}" for k, v in merged.items())))
+
+
+class Pipeline:
+    """One statement of a query, `name = stage |> stage ...` or a bare expression"""
+
+    def __init__(self, text, span):
+        self.span = span
+        self.changed = False
+        match = re.match(r"\s*(\w+)\s*=(?!=)", text)
+        self.name = match.group(1) if match else None
+        body = text[match.end():] if match else text
+        self.stages = [Stage(part) for part in split_top_level(body, "|>")]
+
+    @property
+    def bucket(self):
+        source = self.stages[0]
+        if source.name == "from":
+            return source.args.get("bucket", "").strip('"') or None
+        return None
+
+    def index(self, name):
+        return next((i for i, stage in enumerate(self.stages) if stage.name == name), None)
+
+    def render(self):
+        head = f"{self.name} = " if self.name else ""
+        return head + "\n  |> ".join(stage.text for stage in self.stages)
+
+
+def parse_flux(query):
+    return [Pipeline(query[start:end], (start, end)) for start, end in statement_spans(query)]
+
+
+def is_flux(query):
+    return "|>" in query or "from(bucket" in query
+
+
+def _filter_columns(stage):
+    """Columns a filter() predicate reads, r.name or r["name"]"""
+    return {a or b for a, b in FILTER_COLUMN.findall(stage.args.get("fn", ""))}
+
+
+def _split_precedence(fn):
+    """
+    The and-terms of `a and b` and the or-terms after it when `fn` is
+    `(r) => a and b or c`, None if it isn't that shape
+    """
+    _, _, body = fn.partition("=>")
+    terms = [term.strip() for term in split_keyword(body, "or")]
+    head = [part.strip() for part in split_keyword(terms[0], "and")]
+    if len(terms) < 2 or len(head) < 2 or any(len(split_keyword(term, "and")) > 1 for term in terms[1:]):
+        return None
+    return head, terms[1:]
+
+
+def _fix_precedence(fn, head, alternatives):
+    """
+    `(r) => a and b or c` -> `(r) => a and (b or c)`, only when `a` picks the
+    measurement and `b`, `c` pick its fields, the one shape where that's
+    clearly what was meant. None otherwise.
+    """
+    alternatives = [head[-1]] + alternatives
+    if not all(MEASUREMENT_EQUALS.fullmatch(part) for part in head[:-1]):
+        return None
+    if not all({a or b for a, b in FILTER_COLUMN.findall(term)} == {"_field"} for term in alternatives):
+        return None
+    params, arrow, _ = fn.partition("=>")
+    return "{}{} {} and ({})".format(params, arrow, " and ".join(head[:-1]), " or ".join(alternatives))
+
+
+def _rollup_source(pipeline, rollups, every):
+    bucket = pipeline.bucket
+    rollup_bucket, rollup_every, _ = rollups[bucket]
+    if every == "v.windowPeriod":
+        return (f'if int(v: v.windowPeriod) >= int(v: {rollup_every}) '
+                f'then "{rollup_bucket}" else "{bucket}"')
+    return f'"{rollup_bucket}"'
+
+
+def check_pipeline(pipeline, rollups, max_range, fix):
+    """Findings of one from() pipeline, fixing what can be fixed in place when `fix`"""
+    findings = []
+    stages = pipeline.stages
+
+    range_index = pipeline.index("range")
+    if range_index is None:
+        finding = Finding("missing-range", "from() without range() reads the whole bucket", fixed=fix)
+        if fix:
+            stages.insert(1, Stage("range(start: v.timeRangeStart, stop: v.timeRangeStop)"))
+            pipeline.changed = True
+            range_index = 1
+        findings.append(finding)
+    else:
+        if range_index != 1:
+            findings.append(Finding("late-range", "range() after {}() isn't pushed down to storage".format(
+                stages[range_index - 1].name)))
+        start = stages[range_index].args.get("start", "")
+        if start != "v.timeRangeStart":
+            seconds = duration_seconds(start)
+            if seconds is not None and seconds > max_range:
+                findings.append(Finding("oversized-range", f"range(start: {start}) reads more than {max_range // 86400}d"))
+            else:
+                findings.append(Finding("fixed-range", f"range(start: {start}) ignores the dashboard time range"))
+
+    # Filters after an expensive stage, moved up in front of it when nothing in between touches their columns
+    first_expensive = next((i for i, stage in enumerate(stages) if stage.name in EXPENSIVE_STAGES), None)
+    if first_expensive is not None:
+        for i in range(first_expensive + 1, len(stages)):
+            stage = stages[i]
+            if stage.name != "filter":
+                continue
+            columns = _filter_columns(stage)
+            between = stages[first_expensive:i]
+            movable = columns and columns <= PUSHDOWN_COLUMNS and all(
+                other.name in FILTER_MOVABLE_OVER and not any(column in other.text for column in columns)
+                for other in between)
+            findings.append(Finding("late-filter", "filter() after {}() isn't pushed down to storage".format(
+                stages[first_expensive].name), fixed=fix and bool(movable)))
+            if fix and movable:
+                stages.insert(first_expensive, stages.pop(i))
+                first_expensive += 1
+                pipeline.changed = True
+
+    for i, stage in enumerate(stages):
+        if stage.name != "filter":
+            continue
+        fn = stage.args.get("fn", "")
+        split = _split_precedence(fn)
+        if split is None:
+            continue
+        fixed_fn = _fix_precedence(fn, *split)
+        if fixed_fn is None:
+            # Rewriting would change what the filter matches, which may be intended
+            findings.append(Finding("filter-precedence", "`and` binds tighter than `or`, check the filter matches "
+                                                         "what it should"))
+            continue
+        findings.append(Finding("filter-precedence",
+                                "`and` binds tighter than `or`, the filter matches more than the measurement",
+                                fixed=fix))
+        if fix:
+            stages[i] = stage.with_args(fn=fixed_fn)
+            pipeline.changed = True
+
+    window_index = pipeline.index("aggregateWindow")
+    if window_index is not None:
+        window = stages[window_index]
+        fn = window.args.get("fn")
+        for i in range(range_index + 1 if range_index is not None else 1, window_index):
+            stage = stages[i]
+            if stage.name not in EXPENSIVE_STAGES:
+                continue
+            swap = fix and stage.name == "map" and fn in SELECTOR_FNS and i == window_index - 1
+            findings.append(Finding("early-stage",
+                                    f"{stage.name}() runs on every raw row before aggregateWindow() reduces them",
+                                    fixed=swap))
+            if swap:
+                stages[i], stages[window_index] = stages[window_index], stages[i]
+                window_index = i
+                pipeline.changed = True
+
+        every = window.args.get("every", "")
+        every_seconds = duration_seconds(every)
+        if every != "v.windowPeriod":
+            findings.append(_fixed_window(f"aggregateWindow(every: {every}) instead of v.windowPeriod", every_seconds))
+
+        simple = all(stage.name in {"range", "filter", "drop", "keep"} for stage in stages[1:window_index])
+        if simple and fn in ROLLUP_FNS and pipeline.bucket is not None:
+            if pipeline.bucket in rollups:
+                rollup_bucket, rollup_every, rollup_fn = rollups[pipeline.bucket]
+                if fn != rollup_fn:
+                    findings.append(Finding("rollup", f"aggregateWindow(fn: {fn}) over raw data, {rollup_bucket} "
+                                                      f"only holds {rollup_fn} rollups"))
+                elif every == "v.windowPeriod" or (every_seconds or 0) >= duration_seconds(rollup_every):
+                    findings.append(Finding("rollup", f"could read {rollup_bucket} for windows of {rollup_every} or more",
+                                            fixed=fix))
+                    if fix:
+                        stages[0] = stages[0].with_args(bucket=_rollup_source(pipeline, rollups, every))
+                        pipeline.changed = True
+            else:
+                findings.append(Finding("rollup", f"aggregateWindow(fn: {fn}) over raw data, a rollup of "
+                                                  f"{pipeline.bucket} could serve long ranges"))
+    return findings
+
+
+def check_flux(query, rollups=None, max_range=30 * 86400, fix=False):
+    """Findings of a Flux query and the query with fixes applied (the same query when nothing was fixed)"""
+    rollups = rollups or {}
+    pipelines = parse_flux(query)
+    findings = []
+    for pipeline in pipelines:
+        if pipeline.stages[0].name == "from":
+            findings.extend(check_pipeline(pipeline, rollups, max_range, fix))
+
+    if not any(stage.name in AGGREGATE_STAGES for pipeline in pipelines for stage in pipeline.stages):
+        findings.append(Finding("missing-window",
+                                "no aggregateWindow(), every raw point in the range goes to the panel"))
+
+    for pipeline in reversed(pipelines):
+        if pipeline.changed:
+            start, end = pipeline.span
+            text = query[start:end]
+            leading = text[:len(text) - len(text.lstrip())]
+            query = query[:start] + leading + pipeline.render() + query[end:]
+    return findings, query
+
+
+def check_influxql(query):
+    findings = []
+    if "$timeFilter" not in query and not re.search(r"\btime\s*[<>]", query):
+        findings.append(Finding("missing-range", "no $timeFilter, the query reads every point of the measurement"))
+    group = INFLUXQL_GROUP_TIME.search(query)
+    if group:
+        findings.extend(_check_group_time(group.group(1)))
+    elif not INFLUXQL_AGGREGATES.search(query):
+        findings.append(Finding("missing-window", "no GROUP BY time(), every raw point in the range goes to the panel"))
+    return findings
+
+
+def check_influxql_builder(target):
+    findings = []
+    times = [group["params"][0] for group in target.get("groupBy", []) if group.get("type") == "time"]
+    if times:
+        findings.extend(_check_group_time(times[0]))
+    else:
+        aggregated = any(part.get("type") not in ("field", "math", "alias")
+                         for select in target.get("select", []) for part in select)
+        if not aggregated:
+            findings.append(Finding("missing-window", "no GROUP BY time(), every raw point in the range goes to the panel"))
+    return findings
+
+
+def _check_group_time(every):
+    if every in ("$__interval", "$interval", "auto"):
+        return []
+    return [_fixed_window(f"GROUP BY time({every}) instead of $__interval", duration_seconds(every))]
+
+
+def _fixed_window(message, seconds):
+    if seconds is not None and seconds < MIN_FIXED_WINDOW:
+        return Finding("fine-window", message + ", too fine for long dashboard ranges")
+    return Finding("fixed-window", message)
+
+
+class Target:
+    """One query of a dashboard panel"""
+
+    def __init__(self, path, panel, target):
+        self.path = path
+        self.panel = panel
+        self.target = target
+        self.findings = []
+
+    @property
+    def ref_id(self):
+        return self.target.get("refId", "?")
+
+    @property
+    def title(self):
+        return self.panel.get("title") or f"panel {self.panel.get('id', '?')}"
+
+    @property
+    def score(self):
+        return sum(finding.weight for finding in self.findings)
+
+    def check(self, rollups, max_range, fix):
+        query = self.target.get("query")
+        if isinstance(query, str) and is_flux(query):
+            self.findings, fixed_query = check_flux(query, rollups, max_range, fix)
+            if fixed_query != query:
+                self.target["query"] = fixed_query
+                return True
+        elif isinstance(query, str) and self.target.get("rawQuery"):
+            self.findings = check_influxql(query)
+        elif "select" in self.target:
+            self.findings = check_influxql_builder(self.target)
+        return False
+
+    def to_dict(self):
+        return dict(dashboard=self.path, panel=self.title, ref_id=self.ref_id, score=self.score,
+                    findings=[finding.to_dict() for finding in self.findings])
+
+
+def iter_panels(node):
+    """Every dict with targets, panels can be nested in rows and collapsed rows"""
+    if isinstance(node, dict):
+        if isinstance(node.get("targets"), list):
+            yield node
+        for value in node.values():
+            yield from iter_panels(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from iter_panels(value)
+
+
+def dashboard_paths(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(glob.glob(os.path.join(path, "**", "*.json"), recursive=True))
+        else:
+            yield path
+
+
+def lint(paths, rollups=None, max_range=30 * 86400, rewrite_dir=None):
+    """Targets of all dashboards under `paths` ranked by score, writing fixed copies to `rewrite_dir`"""
+    targets = []
+    for path in dashboard_paths(paths):
+        with open(path) as f:
+            dashboard = json.load(f)
+        if rewrite_dir:
+            dashboard = copy.deepcopy(dashboard)
+
+        changed = False
+        for panel in iter_panels(dashboard):
+            for query in panel["targets"]:
+                target = Target(path, panel, query)
+                changed |= target.check(rollups or {}, max_range, fix=bool(rewrite_dir))
+                if target.findings:
+                    targets.append(target)
+
+        if rewrite_dir and changed:
+            out_path = os.path.join(rewrite_dir, os.path.basename(path))
+            os.makedirs(rewrite_dir, exist_ok=True)
+            with open(out_path, "w") as f:
+                json.dump(dashboard, f, indent=2)
+                f.write("\n")
+            print(f"Wrote {out_path}", file=sys.stderr)
+
+    return sorted(targets, key=lambda target: (-target.score, target.path, target.title))
+
+
+def parse_rollup(value):
+    """`bucket=rollup_bucket:every:fn`, e.g. rivian=rivian_1h:1h:mean"""
+    try:
+        bucket, rest = value.split("=", 1)
+        rollup_bucket, every, fn = rest.split(":")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected bucket=rollup_bucket:every:fn, got {value}")
+    if duration_seconds(every) is None:
+        raise argparse.ArgumentTypeError(f"{every} isn't a duration")
+    if fn not in ROLLUP_FNS:
+        raise argparse.ArgumentTypeError("fn of a rollup must be one of " + ", ".join(sorted(ROLLUP_FNS)))
+    return bucket, (rollup_bucket, every, fn)
+
+
+def print_report(targets, top=None):
+    for target in targets[:top]:
+        print(f"{target.score:4d}  {os.path.basename(target.path)}  {target.title} [{target.ref_id}]")
+        for finding in sorted(target.findings, key=lambda finding: -finding.weight):
+            fixed = " (fixed)" if finding.fixed else ""
+            print(f"        {finding.rule}: {finding.message}{fixed}")
+    total = sum(len(target.findings) for target in targets)
+    print(f"{total} findings in {len(targets)} queries")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Find Grafana panel queries that scan more data than they need")
+    parser.add_argument("paths", nargs="*", default=[DASHBOARDS_DIR],
+                        help="dashboard JSON files or directories (default: dashboards/)")
+    parser.add_argument("--max-range", default="30d",
+                        help="longest fixed range() before it counts as oversized (default: 30d)")
+    parser.add_argument("--rollup", type=parse_rollup, action="append", default=[],
+                        help="a downsampled bucket and the aggregate it was downsampled with, "
+                             "bucket=rollup_bucket:every:fn, can be repeated")
+    parser.add_argument("--rewrite", metavar="DIR",
+                        help="write the dashboards with the fixable findings fixed to DIR")
+    parser.add_argument("--top", type=int, default=None, help="only report the N worst queries")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    max_range = duration_seconds(args.max_range)
+    if max_range is None:
+        parser.error(f"--max-range {args.max_range} isn't a duration")
+
+    targets = lint(args.paths, dict(args.rollup), max_range, args.rewrite)
+    if args.json:
+        print(json.dumps([target.to_dict() for target in targets[:args.top]], indent=2))
+    else:
+        print_report(targets, args.top)
@@ -0,0 +1,142 @@
+import argparse
+import json
+import os
+import tempfile
+import unittest
+
+from flux_lint import check_flux, check_influxql, duration_seconds, lint, parse_flux, parse_rollup
+
+ROLLUPS = {"rivian": ("rivian_1h", "1h", "mean")}
+
+
+def rules(findings):
+    return sorted(finding.rule for finding in findings)
+
+
+class TestParse(unittest.TestCase):
+
+    def test_pipelines_and_stages(self):
+        """Test that statements split on top level pipes, ignoring pipes and parens in strings"""
+        pipelines = parse_flux('threshold = 20\n\nx = from(bucket: "a|>b")\n  |> range(start: -1h)\n'
+                               '  |> filter(fn: (r) => r._field == "(x)")\nx |> yield()')
+        self.assertEqual([p.name for p in pipelines], ["threshold", "x", None])
+        self.assertEqual([stage.name for stage in pipelines[1].stages], ["from", "range", "filter"])
+        self.assertEqual(pipelines[1].bucket, "a|>b")
+
+    def test_duration_seconds(self):
+        self.assertEqual(duration_seconds("-1h30m"), 5400)
+        self.assertEqual(duration_seconds("1mo"), 30 * 86400)
+        self.assertIsNone(duration_seconds("v.timeRangeStart"))
+
+
+class TestFlux(unittest.TestCase):
+
+    def test_missing_and_oversized_range(self):
+        """Test that a missing range() gets the dashboard range and a long fixed one is flagged"""
+        findings, query = check_flux('from(bucket: "rivian")\n  |> filter(fn: (r) => r._field == "Battery")',
+                                     fix=True)
+        self.assertEqual(rules(findings), ["missing-range", "missing-window"])
+        self.assertIn("|> range(start: v.timeRangeStart, stop: v.timeRangeStop)\n  |> filter", query)
+
+        findings, _ = check_flux('from(bucket: "rivian")\n  |> range(start: -1y)\n'
+                                 '  |> aggregateWindow(every: v.windowPeriod, fn: max)')
+        self.assertEqual(rules(findings), ["oversized-range", "rollup"])
+
+    def test_late_filter_moved_up(self):
+        """Test that a field filter after map() is moved in front of it"""
+        findings, query = check_flux(
+            'from(bucket: "b")\n  |> range(start: v.timeRangeStart)\n'
+            '  |> map(fn: (r) => ({ r with _value: r._value * 2.0 }))\n'
+            '  |> filter(fn: (r) => r._field == "Power")\n  |> aggregateWindow(every: v.windowPeriod, fn: mean)',
+            fix=True)
+        self.assertIn("late-filter", rules(findings))
+        stages = [stage.name for stage in parse_flux(query)[0].stages]
+        self.assertEqual(stages, ["from", "range", "filter", "map", "aggregateWindow"])
+
+    def test_map_after_selector_window(self):
+        """Test that map() is moved after aggregateWindow() only when the window keeps raw values"""
+        query = ('from(bucket: "rivian")\n  |> range(start: v.timeRangeStart, stop: v.timeRangeStop)\n'
+                 '  |> map(fn: (r) => ({ r with _value: r._value / 60.0 }))\n'
+                 '  |> aggregateWindow(every: v.windowPeriod, fn: FN)')
+        _, fixed = check_flux(query.replace("FN", "last"), fix=True)
+        self.assertTrue(fixed.endswith("|> map(fn: (r) => ({ r with _value: r._value / 60.0 }))"))
+
+        findings, unchanged = check_flux(query.replace("FN", "mean"), fix=True)
+        self.assertEqual(unchanged, query.replace("FN", "mean"))
+        self.assertEqual(rules(findings), ["early-stage"])
+
+    def test_precedence_and_rollup(self):
+        """Test the and/or fix and the switch to a rollup bucket for wide windows"""
+        findings, query = check_flux(
+            'from(bucket: "rivian")\n  |> range(start: v.timeRangeStart, stop: v.timeRangeStop)\n'
+            '  |> filter(fn: (r) => r._measurement == "rivian" and\n    r._field == "A" or r._field == "B")\n'
+            '  |> aggregateWindow(every: v.windowPeriod, fn: mean)',
+            rollups=ROLLUPS, fix=True)
+        self.assertEqual(rules(findings), ["filter-precedence", "rollup"])
+        self.assertIn('r._measurement == "rivian" and (r._field == "A" or r._field == "B")', query)
+        self.assertIn('from(bucket: if int(v: v.windowPeriod) >= int(v: 1h) then "rivian_1h" else "rivian")',
+                      query)
+
+    def test_precedence_reported_only(self):
+        """Test that and/or mixes other than a measurement with its fields are reported but left as they are"""
+        for predicate in ('r._field == "A" and r.vin == "1" or r._field == "B"',
+                          'r._measurement == "rivian" and r._field == "A" or r.vin == "1"',
+                          'r._measurement != "rivian" and r._field == "A" or r._field == "B"'):
+            query = ('from(bucket: "b")\n  |> range(start: v.timeRangeStart, stop: v.timeRangeStop)\n'
+                     f'  |> filter(fn: (r) => {predicate})\n  |> aggregateWindow(every: v.windowPeriod, fn: mean)')
+            findings, fixed = check_flux(query, fix=True)
+            precedence = [finding for finding in findings if finding.rule == "filter-precedence"]
+            self.assertEqual(len(precedence), 1, predicate)
+            self.assertFalse(precedence[0].fixed)
+            self.assertEqual(fixed, query)
+
+    def test_rollup_of_another_fn(self):
+        """Test that a window only reads the rollup bucket when it was downsampled with the same function"""
+        query = ('from(bucket: "rivian")\n  |> range(start: v.timeRangeStart, stop: v.timeRangeStop)\n'
+                 '  |> aggregateWindow(every: v.windowPeriod, fn: max)')
+        findings, fixed = check_flux(query, rollups=ROLLUPS, fix=True)
+        self.assertEqual(rules(findings), ["rollup"])
+        self.assertFalse(findings[0].fixed)
+        self.assertEqual(fixed, query)
+
+    def test_parse_rollup(self):
+        self.assertEqual(parse_rollup("rivian=rivian_1h:1h:max"), ("rivian", ("rivian_1h", "1h", "max")))
+        for value in ("rivian=rivian_1h:1h", "rivian=rivian_1h:1h:sum", "rivian=rivian_1h:x:mean"):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                parse_rollup(value)
+
+
+class TestInfluxQL(unittest.TestCase):
+
+    def test_raw_queries(self):
+        self.assertEqual(rules(check_influxql('SELECT "x" FROM "obs"')), ["missing-range", "missing-window"])
+        self.assertEqual(rules(check_influxql('SELECT count("x") FROM "obs" WHERE $timeFilter GROUP BY time(1s)')),
+                         ["fine-window"])
+        self.assertEqual(check_influxql('SELECT mean("x") FROM "obs" WHERE $timeFilter GROUP BY time($__interval)'), [])
+
+
+class TestLint(unittest.TestCase):
+
+    def test_ranked_and_rewritten(self):
+        """Test that targets come back worst first and only the rewrite holds the fixes"""
+        dashboard = {"panels": [{"title": "Battery", "targets": [
+            {"refId": "A", "query": 'from(bucket: "rivian")\n  |> range(start: -6h)\n'
+                                    '  |> aggregateWindow(every: 5m, fn: mean)'},
+            {"refId": "B", "query": 'from(bucket: "rivian")\n  |> filter(fn: (r) => r._field == "Battery")'},
+        ]}]}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "dashboard.json")
+            with open(path, "w") as f:
+                json.dump(dashboard, f)
+            out_dir = os.path.join(directory, "out")
+
+            targets = lint([path], rewrite_dir=out_dir)
+            self.assertEqual([target.ref_id for target in targets], ["B", "A"])
+            with open(path) as f:
+                self.assertEqual(json.load(f), dashboard)
+            with open(os.path.join(out_dir, "dashboard.json")) as f:
+                self.assertIn("range(start: v.timeRangeStart", json.load(f)["panels"][0]["targets"][1]["query"])
+
+
+if __name__ == "__main__":
+    unittest.main()
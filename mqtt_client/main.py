@@ -1,9 +1,14 @@
 from paho.mqtt import client as mqtt_client
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 import logging
-import time
 import os
+import socket
+import sys
+import uuid
 
-from messages import get_all_topics_and_message_fns
+from messages import get_subscriptions
+from supervisor import ReconnectSupervisor
 
 # Configure logging
 logging.basicConfig(
@@ -18,10 +23,21 @@ logging.basicConfig(
 broker = os.getenv('MQTT_BROKER')
 port = 1883
 topic = "opensprinkler/#"
-client_id = f'subscribe-kvothe'
 username = os.getenv('MQTT_USERNAME', 'public')
 password = os.getenv('MQTT_PASSWORD', 'public')
 
+# Scale-out mode: replicas sharing MQTT_SHARE_GROUP split the UniFi traffic
+# between them through MQTT v5 shared subscriptions. Only the replica with
+# MQTT_NOTIFICATIONS enabled handles the OpenSprinkler (Pushover) topics, and
+# the UniFi topics that have to reach a single process (see STATEFUL_TOPICS).
+share_group = os.getenv('MQTT_SHARE_GROUP')
+notifications = os.getenv('MQTT_NOTIFICATIONS', 'true').lower() in ('1', 'true', 'yes')
+
+client_id = os.getenv('MQTT_CLIENT_ID', 'subscribe-kvothe')
+if share_group:
+    # Every replica needs its own id, otherwise the broker kicks the older session
+    client_id = f"{client_id}-{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+
 FIRST_RECONNECT_DELAY = 1
 RECONNECT_RATE = 2
 MAX_RECONNECT_COUNT = 12
@@ -29,52 +45,48 @@ MAX_RECONNECT_DELAY = 60
 
 
 def connect_mqtt() -> mqtt_client:
-    def on_connect(client, userdata, flags, rc, properties=None):
-        if rc == 0:
-            print("Connected to MQTT Broker!")
-        else:
-            print("Failed to connect, return code %d\n", rc)
-
-    # Specify callback_api_version for Paho MQTT 2.0 compatibility
-    client = mqtt_client.Client(client_id=client_id, callback_api_version=mqtt_client.CallbackAPIVersion.VERSION2)
+    # Specify callback_api_version for Paho MQTT 2.0 compatibility.
+    # Reconnects are handled by ReconnectSupervisor, not by paho's network thread.
+    protocol = mqtt_client.MQTTv5 if share_group else mqtt_client.MQTTv311
+    client = mqtt_client.Client(
+        client_id=client_id,
+        callback_api_version=mqtt_client.CallbackAPIVersion.VERSION2,
+        protocol=protocol,
+        reconnect_on_failure=False,
+    )
     logging.info(f"{client_id}")
     client.username_pw_set(username, password)
-    client.on_connect = on_connect
-    client.connect(broker, port)
+    client.connect_async(broker, port)
     return client
 
-def on_disconnect(client, userdata, flags, rc, properties=None):
-    logging.info("Disconnected with result code: %s", rc)
-    reconnect_count, reconnect_delay = 0, FIRST_RECONNECT_DELAY
-    logging.info("Reconnecting in %d seconds...", reconnect_delay)
-    time.sleep(reconnect_delay)
 
-    try:
-        client.reconnect()
-        logging.info("Reconnected successfully!")
-        return
-    except Exception as err:
-        logging.error("%s. Reconnect failed. Retrying...", err)
+def subscribe(client: mqtt_client):
+    subscriptions = get_subscriptions(share_group=share_group, notifications=notifications)
 
-    reconnect_delay *= RECONNECT_RATE
-    reconnect_delay = min(reconnect_delay, MAX_RECONNECT_DELAY)
-    logging.info("Reconnect failed after %s attempts. Exiting...", reconnect_count)
-
-
-def subscribe(client: mqtt_client):    
-    topics_and_message_fns = get_all_topics_and_message_fns()
-    
-    for topic, message_fn in topics_and_message_fns:
-        logging.info(f"Subscribing to topic: {topic}")
+    for subscription, topic, message_fn, subscription_id in subscriptions:
+        logging.info(f"Subscribing to topic: {subscription}")
         client.message_callback_add(topic, message_fn)
-        client.subscribe(topic)
+        if subscription_id is None:
+            client.subscribe(subscription)
+        else:
+            properties = Properties(PacketTypes.SUBSCRIBE)
+            properties.SubscriptionIdentifier = subscription_id
+            client.subscribe(subscription, properties=properties)
 
 
 def run():
     client = connect_mqtt()
-    client.on_disconnect = on_disconnect
-    subscribe(client)
-    client.loop_forever()
+    supervisor = ReconnectSupervisor(
+        client,
+        on_connected=subscribe,
+        first_delay=FIRST_RECONNECT_DELAY,
+        rate=RECONNECT_RATE,
+        max_delay=MAX_RECONNECT_DELAY,
+        max_attempts=MAX_RECONNECT_COUNT,
+    )
+    if not supervisor.run_forever():
+        logging.info("Giving up on the broker. Exiting...")
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -1,9 +1,16 @@
 import json
 import logging
+import os
 import requests
 import datetime
 from urllib.parse import urlparse
 
+from motion import MotionSessionizer, is_active
+from snapshots import SNAPSHOT_DIR, SnapshotStore
+from telemetry import TelemetryAggregator, flatten_numeric
+
+API_URL = os.getenv('API_URL', 'http://api:5000')
+
 station_names = {
     "0": "Back Yard",
     "1": "Soakers", 
@@ -15,6 +22,10 @@ station_names = {
     "7": "S08"
 }
 
+motion_sessionizer = MotionSessionizer()
+telemetry_aggregator = TelemetryAggregator()
+snapshot_store = SnapshotStore(SNAPSHOT_DIR) if SNAPSHOT_DIR else None
+
 def on_station_message(client, userdata, msg):
     try:
         # Parse the JSON payload
@@ -63,7 +74,7 @@ def on_station_message(client, userdata, msg):
         logging.info(message)
         
         # Send notification
-        requests.post('http://api:5000/pushover/sprinkler/message', json=dict(
+        requests.post(f'{API_URL}/pushover/sprinkler/message', json=dict(
             message=message,
             title="OpenSprinkler Notification"
         ))
@@ -86,7 +97,7 @@ def on_system_message(client, userdata, msg):
         
         logging.info(message)
         
-        requests.post('http://api:5000/pushover/sprinkler/message', json=dict(
+        requests.post(f'{API_URL}/pushover/sprinkler/message', json=dict(
             message=message,
             title="OpenSprinkler System"
         ))
@@ -111,7 +122,7 @@ def on_raindelay_message(client, userdata, msg):
         
         logging.info(message)
         
-        requests.post('http://api:5000/pushover/sprinkler/message', json=dict(
+        requests.post(f'{API_URL}/pushover/sprinkler/message', json=dict(
             message=message,
             title="OpenSprinkler Rain Delay"
         ))
@@ -131,7 +142,7 @@ def on_weather_message(client, userdata, msg):
         
         logging.info(message)
         
-        requests.post('http://api:5000/pushover/sprinkler/message', json=dict(
+        requests.post(f'{API_URL}/pushover/sprinkler/message', json=dict(
             message=message,
             title="OpenSprinkler Weather Update"
         ))
@@ -156,7 +167,7 @@ def on_flow_alert_message(client, userdata, msg):
         
         logging.warning(message)
         
-        requests.post('http://api:5000/pushover/sprinkler/message', json=dict(
+        requests.post(f'{API_URL}/pushover/sprinkler/message', json=dict(
             message=message,
             title="⚠️ OpenSprinkler Flow Alert"
         ))
@@ -169,7 +180,6 @@ def on_flow_alert_message(client, userdata, msg):
 def on_unifi_protect_message(client, userdata, msg):
     IGNORED_TOPIC_TYPES = [
         'snapshot',
-        'telemetry',
     ]
 
     MAC_ADDRESS_MAPPING = {
@@ -195,6 +205,12 @@ def on_unifi_protect_message(client, userdata, msg):
         mac_address = topic_parts[2]
         topic_type = '/'.join(topic_parts[3:])  # Everything after MAC address
 
+        # Snapshots are binary blobs, keep them away from JSON decoding and Influx
+        if topic_type == 'snapshot' and snapshot_store is not None:
+            device_name = MAC_ADDRESS_MAPPING.get(mac_address, f"Unknown-{mac_address}")
+            _store_snapshot(msg, mac_address, device_name)
+            return
+
         if topic_type in IGNORED_TOPIC_TYPES:
             logging.debug(f"Ignoring UniFi Protect topic type: {topic_type}")
             return
@@ -202,6 +218,17 @@ def on_unifi_protect_message(client, userdata, msg):
         # Get device friendly name from mapping
         device_name = MAC_ADDRESS_MAPPING.get(mac_address, f"Unknown-{mac_address}")
 
+        now = datetime.datetime.utcnow()
+
+        # Telemetry is too chatty to write raw, fold it into per-window aggregates
+        if topic_parts[3] == "telemetry":
+            data_points = _aggregate_telemetry(msg, mac_address, device_name, topic_parts[4:], now)
+            data_points.extend(telemetry_aggregator.flush(now))
+            data_points.extend(motion_sessionizer.expire(now))
+            if data_points:
+                _write_unifi_protect_points(data_points)
+            return
+
         # Parse topic structure for better organization
         topic_levels = topic_parts[3:]  # e.g., ['motion', 'smart', 'person']
 
@@ -262,20 +289,20 @@ def on_unifi_protect_message(client, userdata, msg):
                 "value": payload_value,
                 "topic": msg.topic
             },
-            "time": datetime.datetime.utcnow().isoformat()
+            "time": now.isoformat()
         }
+        data_points = [data_point]
 
-        # Send to API
-        api_payload = {
-            "data_points": [data_point],
-            "verbose": False
-        }
+        # Pair motion start/stop transitions into one motion_events point per event
+        if measurement == "motion" and "sub_type" not in tags:
+            event_type = tags.get("smart_type", "motion")
+            data_points.extend(motion_sessionizer.observe(
+                mac_address, device_name, event_type, is_active(payload_value), now
+            ))
+        data_points.extend(motion_sessionizer.expire(now))
+        data_points.extend(telemetry_aggregator.flush(now))
 
-        response = requests.post(
-            'http://api:5000/influx/unifi_protect/write',
-            json=api_payload
-        )
-        response.raise_for_status()
+        _write_unifi_protect_points(data_points)
 
         logging.info(f"UniFi Protect: {device_name}/{topic_type} -> {payload_value}")
 
@@ -283,11 +310,60 @@ def on_unifi_protect_message(client, userdata, msg):
         logging.error(f"Error processing UniFi Protect MQTT message from {msg.topic}: {e}")
 
 
+def _aggregate_telemetry(msg, mac_address, device_name, sub_levels, now):
+    """Fold the numeric values of a telemetry message, returns points for closed windows"""
+    try:
+        payload = json.loads(msg.payload.decode())
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        logging.debug(f"Ignoring non-JSON UniFi Protect telemetry from {msg.topic}")
+        return []
+
+    data_points = []
+    for metric, value in flatten_numeric(payload, '.'.join(sub_levels)):
+        data_points.extend(telemetry_aggregator.add(mac_address, device_name, metric, value, now))
+    return data_points
+
+
+def _store_snapshot(msg, mac_address, device_name):
+    """Write the snapshot to the blob store and only its reference to Influx"""
+    digest = snapshot_store.put(msg.payload)
+
+    _write_unifi_protect_points([{
+        "measurement": "snapshot",
+        "tags": {
+            "device_mac": mac_address,
+            "device_name": device_name,
+            "source": "mqtt"
+        },
+        "fields": {
+            "sha256": digest,
+            "size": len(msg.payload)
+        },
+        "time": datetime.datetime.utcnow().isoformat()
+    }])
+
+    logging.info(f"UniFi Protect: {device_name}/snapshot -> {digest}")
+
+
+def _write_unifi_protect_points(data_points):
+    """Send UniFi Protect data points to the API"""
+    api_payload = {
+        "data_points": data_points,
+        "verbose": False
+    }
+
+    response = requests.post(
+        f'{API_URL}/influx/unifi_protect/write',
+        json=api_payload
+    )
+    response.raise_for_status()
+
+
 def _send_fallback_message(msg, title):
     """Send a fallback message when JSON parsing fails"""
     original_message = f"Received `{msg.payload.decode()}` from `{msg.topic}` topic"
 
-    requests.post('http://api:5000/pushover/sprinkler/message', json=dict(
+    requests.post(f'{API_URL}/pushover/sprinkler/message', json=dict(
         message=original_message,
         title=f"{title} (Raw)"
     ))
@@ -307,4 +383,71 @@ def get_all_topics_and_message_fns():
 
         # UniFi Protect topics - subscribe to all topics under unifi/protect (any depth)
         ("unifi/protect/+/#", on_unifi_protect_message),  # All topics under each device MAC
-    ]
\ No newline at end of file
+    ]
+
+
+# Topics that any replica may handle. Everything else sends Pushover
+# notifications and must stay on a single consumer to avoid duplicate alerts.
+SHARED_TOPICS = [
+    "unifi/protect/+/#",
+]
+
+# UniFi topic types whose handling keeps state between messages, motion
+# start/stop pairs and telemetry windows. Shared subscriptions would split a device's messages
+# across replicas, so with a share group these topics are taken out of the
+# shared traffic and handled by the notifications replica alone, through a
+# non-shared subscription tagged with STATEFUL_SUBSCRIPTION_ID.
+STATEFUL_TOPICS = {
+    "motion": "unifi/protect/+/motion/#",
+    "telemetry": "unifi/protect/+/telemetry/#",
+}
+STATEFUL_SUBSCRIPTION_ID = 1
+
+
+def _is_stateful(topic):
+    topic_parts = topic.split('/')
+    return len(topic_parts) > 3 and topic_parts[3] in STATEFUL_TOPICS
+
+
+def on_unifi_protect_shared_message(client, userdata, msg):
+    """UniFi Protect messages of the shared subscription, except the stateful topics"""
+    if not _is_stateful(msg.topic):
+        on_unifi_protect_message(client, userdata, msg)
+
+
+def on_unifi_protect_stateful_message(client, userdata, msg):
+    """
+    Stateful UniFi Protect messages of the non-shared subscription. The
+    notifications replica is in the share group too, copies that reach it
+    through the shared subscription carry no subscription identifier and are
+    left to on_unifi_protect_shared_message (which skips them).
+    """
+    properties = getattr(msg, 'properties', None)
+    if STATEFUL_SUBSCRIPTION_ID in getattr(properties, 'SubscriptionIdentifier', []):
+        on_unifi_protect_message(client, userdata, msg)
+
+
+def get_subscriptions(share_group=None, notifications=True):
+    """
+    Returns a list of (subscription, topic, message_fn, subscription_id) tuples for this replica.
+
+    `subscription` is what gets passed to `client.subscribe()`: shared topics are
+    prefixed with `$share/<share_group>/` so the broker spreads them across every
+    replica in the group. `topic` is the plain filter used for
+    `client.message_callback_add()`, since shared messages arrive on their
+    original topic. Notification topics are skipped when `notifications` is False.
+    With a share group, the STATEFUL_TOPICS are only subscribed to by the
+    replica with notifications, as MQTT v5 subscriptions with the identifier
+    `subscription_id` (None for every other subscription).
+    """
+    subscriptions = []
+    for topic, message_fn in get_all_topics_and_message_fns():
+        if topic in SHARED_TOPICS and share_group:
+            subscriptions.append((f"$share/{share_group}/{topic}", topic, on_unifi_protect_shared_message, None))
+        elif topic in SHARED_TOPICS or notifications:
+            subscriptions.append((topic, topic, message_fn, None))
+
+    if share_group and notifications:
+        for topic in STATEFUL_TOPICS.values():
+            subscriptions.append((topic, topic, on_unifi_protect_stateful_message, STATEFUL_SUBSCRIPTION_ID))
+    return subscriptions
@@ -0,0 +1,80 @@
+import datetime
+import os
+import threading
+
+# Events still open after this many seconds are closed and flagged as timed out
+MOTION_EVENT_TIMEOUT = int(os.getenv('MOTION_EVENT_TIMEOUT', '600'))
+
+ACTIVE_STRINGS = ('true', 'on', 'yes', '1')
+
+
+def is_active(value):
+    """Interpret a converted motion payload (1/0, 1.0/0.0 or a string) as on/off"""
+    if isinstance(value, str):
+        return value.strip().lower() in ACTIVE_STRINGS
+    return bool(value)
+
+
+class MotionSessionizer:
+    """
+    Pairs motion start/stop transitions into one event record each.
+
+    Events are tracked per (device MAC, event type), where the type is
+    "motion" or the smart detection type (person, vehicle, ...). Each closed
+    event becomes a single `motion_events` point stamped with its start time.
+    Start and stop have to reach the same process, which is why motion topics
+    are kept off shared subscriptions (see messages.STATEFUL_TOPICS).
+    """
+
+    def __init__(self, timeout=MOTION_EVENT_TIMEOUT):
+        self.timeout = datetime.timedelta(seconds=timeout)
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def observe(self, device_mac, device_name, event_type, active, now):
+        """Record a transition, returns the event points it completes"""
+        key = (device_mac, event_type)
+        with self._lock:
+            if active:
+                self._open.setdefault(key, (now, device_name))
+                return []
+
+            started = self._open.pop(key, None)
+
+        if started is None:
+            return []
+        start, device_name = started
+        return [self._create_event_point(key, device_name, start, now, timed_out=False)]
+
+    def expire(self, now):
+        """Close events that have been open longer than the timeout"""
+        with self._lock:
+            expired = [
+                (key, started) for key, started in self._open.items()
+                if now - started[0] > self.timeout
+            ]
+            for key, _ in expired:
+                del self._open[key]
+
+        return [
+            self._create_event_point(key, device_name, start, now, timed_out=True)
+            for key, (start, device_name) in expired
+        ]
+
+    def _create_event_point(self, key, device_name, start, end, timed_out):
+        device_mac, event_type = key
+        return {
+            "measurement": "motion_events",
+            "tags": {
+                "device_mac": device_mac,
+                "device_name": device_name,
+                "event_type": event_type,
+                "source": "mqtt"
+            },
+            "fields": {
+                "duration": (end - start).total_seconds(),
+                "start": start.isoformat(),
+                "timed_out": int(timed_out)
+            },
+            "time": start.isoformat()
+        }
@@ -0,0 +1,86 @@
+from paho.mqtt import client as mqtt_client
+import argparse
+import gzip
+import logging
+import os
+import struct
+import time
+
+from messages import get_all_topics_and_message_fns
+
+# Each record is a fixed header (receive time, topic length, payload length)
+# followed by the raw topic and payload bytes. The file is gzip compressed.
+RECORD_HEADER = struct.Struct('<dHI')
+
+
+def write_record(fp, timestamp, topic, payload):
+    topic_bytes = topic.encode()
+    fp.write(RECORD_HEADER.pack(timestamp, len(topic_bytes), len(payload)))
+    fp.write(topic_bytes)
+    fp.write(payload)
+
+
+def read_records(path):
+    """Yield (timestamp, topic, payload) tuples from a recording"""
+    with gzip.open(path, 'rb') as fp:
+        while True:
+            header = fp.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, topic_length, payload_length = RECORD_HEADER.unpack(header)
+            topic = fp.read(topic_length).decode()
+            payload = fp.read(payload_length)
+            yield timestamp, topic, payload
+
+
+def record(path, duration=None):
+    """Capture all traffic on the handler topics to `path` until interrupted"""
+    broker = os.getenv('MQTT_BROKER')
+    username = os.getenv('MQTT_USERNAME', 'public')
+    password = os.getenv('MQTT_PASSWORD', 'public')
+
+    # Use a separate client id so the live collector's session is left alone
+    client = mqtt_client.Client(
+        client_id=f'recorder-{os.getpid()}',
+        callback_api_version=mqtt_client.CallbackAPIVersion.VERSION2,
+    )
+    client.username_pw_set(username, password)
+
+    with gzip.open(path, 'wb') as fp:
+        count = 0
+
+        def on_message(client, userdata, msg):
+            nonlocal count
+            write_record(fp, time.time(), msg.topic, msg.payload)
+            count += 1
+
+        client.on_message = on_message
+        client.connect(broker, 1883)
+        for topic, _ in get_all_topics_and_message_fns():
+            client.subscribe(topic)
+
+        client.loop_start()
+        try:
+            started = time.time()
+            while duration is None or time.time() - started < duration:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            client.loop_stop()
+            client.disconnect()
+
+    logging.info(f"Recorded {count} messages to {path}")
+    return count
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description='Record live MQTT traffic for replay.py')
+    parser.add_argument('path', help='Output file, e.g. traffic.rec.gz')
+    parser.add_argument('--duration', type=float, default=None,
+                        help='Stop after this many seconds (default: until Ctrl-C)')
+    args = parser.parse_args()
+
+    record(args.path, args.duration)
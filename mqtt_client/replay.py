@@ -0,0 +1,210 @@
+from paho.mqtt import client as mqtt_client
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import functools
+import json
+import logging
+import threading
+import time
+import tracemalloc
+
+import messages
+from recorder import read_records
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    """Accepts every write/pushover request the handlers make and answers like the real API"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.request_count += 1
+
+        body = json.dumps(dict(success=True)).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeAPI:
+    """Local stand-in for the api service, run on a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = ThreadingHTTPServer((host, port), FakeAPIHandler)
+        self.server.request_count = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        return self.server.request_count
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def deliveries(subscriptions, topic):
+    """
+    The subscription identifiers of each copy of a `topic` message the broker
+    sends this replica: one copy per matching shared subscription, one for
+    all matching non-shared subscriptions together.
+    """
+    copies = []
+    plain = None
+    for subscription, topic_filter, _, subscription_id in subscriptions:
+        if not mqtt_client.topic_matches_sub(topic_filter, topic):
+            continue
+        ids = [] if subscription_id is None else [subscription_id]
+        if subscription.startswith('$share/'):
+            copies.append(ids)
+        elif plain is None:
+            plain = ids
+            copies.append(plain)
+        else:
+            plain.extend(ids)
+    return copies
+
+
+def replay(records, speed=0, track_allocations=False, share_group=None, notifications=True):
+    """
+    Feed recorded (timestamp, topic, payload) records through the handlers.
+
+    Messages take the same route as live traffic: the subscriptions of
+    get_subscriptions() for `share_group` and `notifications` decide which
+    copies the broker would send, with their subscription identifiers, and
+    a paho client with the callbacks main.py registers dispatches them.
+    `speed` scales the recorded inter-arrival gaps (1 = real time, 10 = ten
+    times faster); 0 replays as fast as possible.
+    """
+    subscriptions = messages.get_subscriptions(share_group=share_group, notifications=notifications)
+    latencies = defaultdict(list)
+    allocations = defaultdict(int)
+    count = 0
+
+    def measured(message_fn):
+        @functools.wraps(message_fn)
+        def _measured(client, userdata, msg):
+            if track_allocations:
+                tracemalloc.reset_peak()
+                before, _ = tracemalloc.get_traced_memory()
+
+            call_started = time.perf_counter()
+            message_fn(client, userdata, msg)
+            latencies[message_fn.__name__].append(time.perf_counter() - call_started)
+
+            if track_allocations:
+                _, peak = tracemalloc.get_traced_memory()
+                allocations[message_fn.__name__] += peak - before
+        return _measured
+
+    client = mqtt_client.Client(
+        callback_api_version=mqtt_client.CallbackAPIVersion.VERSION2,
+        protocol=mqtt_client.MQTTv5 if share_group else mqtt_client.MQTTv311,
+    )
+    for _, topic_filter, message_fn, _ in subscriptions:
+        client.message_callback_add(topic_filter, measured(message_fn))
+
+    if track_allocations:
+        tracemalloc.start()
+
+    started = time.perf_counter()
+    first_timestamp = None
+    for timestamp, topic, payload in records:
+        if first_timestamp is None:
+            first_timestamp = timestamp
+        if speed:
+            delay = (timestamp - first_timestamp) / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+        for subscription_ids in deliveries(subscriptions, topic):
+            msg = mqtt_client.MQTTMessage(topic=topic.encode())
+            msg.payload = payload
+            if subscription_ids:
+                msg.properties = Properties(PacketTypes.PUBLISH)
+                for subscription_id in subscription_ids:
+                    msg.properties.SubscriptionIdentifier = subscription_id
+            client._handle_on_message(msg)
+        count += 1
+
+    elapsed = time.perf_counter() - started
+    if track_allocations:
+        tracemalloc.stop()
+
+    handlers = {}
+    for name, values in latencies.items():
+        values.sort()
+        handlers[name] = dict(
+            calls=len(values),
+            p50_ms=percentile(values, 50) * 1000,
+            p90_ms=percentile(values, 90) * 1000,
+            p99_ms=percentile(values, 99) * 1000,
+            max_ms=values[-1] * 1000,
+        )
+        if track_allocations:
+            handlers[name]['peak_kib_per_call'] = allocations[name] / len(values) / 1024
+
+    return dict(
+        messages=count,
+        seconds=elapsed,
+        msgs_per_sec=count / elapsed if elapsed else 0.0,
+        handlers=handlers,
+    )
+
+
+def print_report(report):
+    print(f"{report['messages']} messages in {report['seconds']:.2f}s "
+          f"({report['msgs_per_sec']:.1f} msgs/sec)")
+    for name, stats in sorted(report['handlers'].items()):
+        line = (f"  {name}: {stats['calls']} calls, p50 {stats['p50_ms']:.2f}ms, "
+                f"p90 {stats['p90_ms']:.2f}ms, p99 {stats['p99_ms']:.2f}ms, max {stats['max_ms']:.2f}ms")
+        if 'peak_kib_per_call' in stats:
+            line += f", {stats['peak_kib_per_call']:.1f} KiB/call"
+        print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay recorded MQTT traffic through the handlers')
+    parser.add_argument('path', help='Recording made with recorder.py')
+    parser.add_argument('--speed', type=float, default=0,
+                        help='Replay speed multiplier, e.g. 1 or 10 (default: 0, as fast as possible)')
+    parser.add_argument('--allocations', action='store_true',
+                        help='Track per-handler allocations with tracemalloc (slower)')
+    parser.add_argument('--share-group', help='Replay as a replica of this MQTT_SHARE_GROUP')
+    parser.add_argument('--no-notifications', action='store_true',
+                        help='Replay as a replica with MQTT_NOTIFICATIONS disabled')
+    args = parser.parse_args()
+
+    # Handlers log every message; keep that out of the measurement
+    logging.basicConfig(level=logging.WARNING)
+
+    with FakeAPI() as api:
+        messages.API_URL = api.url
+        report = replay(read_records(args.path), speed=args.speed, track_allocations=args.allocations,
+                        share_group=args.share_group, notifications=not args.no_notifications)
+
+    print_report(report)
+    print(f"Fake API received {api.request_count} requests")
@@ -0,0 +1,104 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+# Snapshots are only kept when SNAPSHOT_DIR is set, otherwise they are ignored
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR')
+SNAPSHOT_MAX_BYTES = int(os.getenv('SNAPSHOT_MAX_BYTES', str(2 * 1024 ** 3)))
+SNAPSHOT_MAX_AGE = int(os.getenv('SNAPSHOT_MAX_AGE', str(7 * 24 * 3600)))
+
+
+class SnapshotStore:
+    """
+    Content-addressed blob store for UniFi Protect snapshots.
+
+    Blobs are stored as `<root>/<first two hex chars>/<sha256>`, which is the
+    layout the API's /unifi/snapshots/<sha256> endpoint serves from. Identical
+    payloads are stored once. The oldest blobs are evicted when the store
+    grows past `max_bytes` or when they are older than `max_age` seconds.
+
+    Every replica writes to the same directory, so nothing is tracked in
+    memory: deduplication checks the file itself, and eviction works from a
+    scan of the directory (at most every `scan_interval` seconds) ordered by
+    mtime, which a deduplicated put refreshes.
+    """
+
+    def __init__(self, root, max_bytes=SNAPSHOT_MAX_BYTES, max_age=SNAPSHOT_MAX_AGE, scan_interval=60):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.scan_interval = scan_interval
+        self.total_bytes = 0
+        self._last_scan = None
+        self._lock = threading.Lock()
+
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, payload, now=None):
+        """Store a payload (bytes) and return its sha256 hex digest"""
+        now = time.time() if now is None else now
+        digest = hashlib.sha256(payload).hexdigest()
+        path = self.path_for(digest)
+
+        try:
+            # Already stored, just refresh it so eviction sees it as recent
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            self._write(path, payload, now)
+
+        with self._lock:
+            if self._last_scan is None or now - self._last_scan >= self.scan_interval:
+                self._last_scan = now
+                self._evict(now)
+
+        return digest
+
+    def _write(self, path, payload, now):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                fp.write(memoryview(payload))
+            os.utime(tmp_path, (now, now))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _scan(self):
+        """(mtime, path, size) of every blob, oldest first"""
+        blobs = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if len(entry.name) != 64:
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                blobs.append((stat.st_mtime, entry.path, stat.st_size))
+        return sorted(blobs)
+
+    def _evict(self, now):
+        blobs = self._scan()
+        self.total_bytes = sum(size for _, _, size in blobs)
+        for mtime, path, size in blobs:
+            if self.total_bytes <= self.max_bytes and now - mtime <= self.max_age:
+                return
+
+            try:
+                # Another replica may have just deduplicated into this blob
+                if os.stat(path).st_mtime == mtime:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+            logging.debug(f"Evicted snapshot {os.path.basename(path)}")
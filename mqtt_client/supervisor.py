@@ -0,0 +1,117 @@
+import logging
+import random
+import threading
+import time
+
+
+class ReconnectSupervisor:
+    """
+    Keeps an MQTT client connected without blocking paho's network thread.
+
+    The client must be created with `reconnect_on_failure=False`, so paho's
+    network thread simply exits when the link drops. The supervisor notices
+    through `on_disconnect`, and reconnects from the calling thread with
+    jittered exponential backoff before starting a fresh network thread.
+    `on_connected` is called on every successful (re)connect, which is where
+    subscriptions are set up again.
+    """
+
+    def __init__(self, client, on_connected, first_delay=1, rate=2, max_delay=60,
+                 max_attempts=12, connack_timeout=10, sleep=time.sleep):
+        self.client = client
+        self.on_connected = on_connected
+        self.first_delay = first_delay
+        self.rate = rate
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.connack_timeout = connack_timeout
+        self.sleep = sleep
+
+        self.last_recovery_seconds = None
+        self._down_since = None
+        self._connected = threading.Event()
+        self._link_down = threading.Event()
+        self._stopping = threading.Event()
+
+        client.on_connect = self._on_connect
+        client.on_disconnect = self._on_disconnect
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties=None):
+        if reason_code != 0:
+            logging.error("Failed to connect, return code %s", reason_code)
+            return
+
+        self.on_connected(client)
+        self._connected.set()
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties=None):
+        logging.info("Disconnected with result code: %s", reason_code)
+        self._connected.clear()
+        if self._down_since is None:
+            self._down_since = time.monotonic()
+        self._link_down.set()
+
+    def backoff_delay(self, attempt):
+        """Delay before retry `attempt` (0-based), between half and all of the exponential step"""
+        delay = min(self.max_delay, self.first_delay * self.rate ** attempt)
+        return random.uniform(delay / 2, delay)
+
+    def connect(self):
+        """Connect or reconnect with backoff, returns False once `max_attempts` is exhausted"""
+        if self._down_since is None:
+            self._down_since = time.monotonic()
+
+        for attempt in range(self.max_attempts):
+            if self._stopping.is_set():
+                return False
+
+            if attempt:
+                delay = self.backoff_delay(attempt - 1)
+                logging.info("Reconnecting in %.1f seconds...", delay)
+                self.sleep(delay)
+
+            self._link_down.clear()
+            try:
+                self.client.reconnect()
+            except Exception as err:
+                logging.error("%s. Reconnect failed. Retrying...", err)
+                continue
+
+            self.client.loop_start()
+            if self._connected.wait(self.connack_timeout):
+                self.last_recovery_seconds = time.monotonic() - self._down_since
+                self._down_since = None
+                logging.info("Connected after %.1f seconds (%d attempts)",
+                             self.last_recovery_seconds, attempt + 1)
+                return True
+
+            logging.error("No CONNACK within %s seconds. Retrying...", self.connack_timeout)
+            self.client.loop_stop()
+
+        logging.error("Reconnect failed after %s attempts", self.max_attempts)
+        return False
+
+    def run_forever(self):
+        """Block until stopped, reconnecting whenever the link drops"""
+        if not self.connect():
+            return False
+
+        while True:
+            self._link_down.wait()
+            if self._stopping.is_set():
+                return True
+
+            # paho's network thread exits on its own once the link is gone
+            self.client.loop_stop()
+            if not self.connect():
+                return False
+
+    def stop(self):
+        self._stopping.set()
+        self._link_down.set()
+        self.client.disconnect()
+        self.client.loop_stop()
@@ -0,0 +1,105 @@
+import datetime
+import os
+import threading
+
+# Length of each aggregation window in seconds
+TELEMETRY_WINDOW = int(os.getenv('TELEMETRY_WINDOW', '300'))
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def flatten_numeric(payload, prefix=''):
+    """Yield (metric, value) for every numeric leaf of a telemetry payload"""
+    if isinstance(payload, dict):
+        for key, value in payload.items():
+            yield from flatten_numeric(value, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(payload, bool):
+        yield prefix or 'value', float(payload)
+    elif isinstance(payload, (int, float)):
+        yield prefix or 'value', float(payload)
+
+
+class _Window:
+    __slots__ = ('start', 'device_name', 'count', 'min', 'max', 'total', 'last')
+
+    def __init__(self, start, device_name, value):
+        self.start = start
+        self.device_name = device_name
+        self.count = 1
+        self.min = self.max = self.total = self.last = value
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+
+class TelemetryAggregator:
+    """
+    Folds telemetry values into fixed windows per (device MAC, metric).
+
+    Only the running count/min/max/sum/last of the current window is kept per
+    series, and a window becomes a single `telemetry` point once it has ended.
+    A window has to see every value of its series, or the point written last
+    for it wins in Influx, so telemetry topics are kept off shared
+    subscriptions (see messages.STATEFUL_TOPICS).
+    """
+
+    def __init__(self, window=TELEMETRY_WINDOW):
+        self.window = window
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _window_start(self, now):
+        seconds = int((now - EPOCH).total_seconds())
+        return EPOCH + datetime.timedelta(seconds=seconds - seconds % self.window)
+
+    def add(self, device_mac, device_name, metric, value, now):
+        """Fold a value into its series, returns the point for a window it closes"""
+        key = (device_mac, metric)
+        start = self._window_start(now)
+        with self._lock:
+            current = self._series.get(key)
+            if current is not None and current.start == start:
+                current.add(value)
+                return []
+
+            self._series[key] = _Window(start, device_name, value)
+
+        if current is None:
+            return []
+        return [self._create_window_point(key, current)]
+
+    def flush(self, now):
+        """Emit every window that ended before the window containing `now`"""
+        start = self._window_start(now)
+        with self._lock:
+            closed = [(key, w) for key, w in self._series.items() if w.start < start]
+            for key, _ in closed:
+                del self._series[key]
+
+        return [self._create_window_point(key, w) for key, w in closed]
+
+    def _create_window_point(self, key, window):
+        device_mac, metric = key
+        return {
+            "measurement": "telemetry",
+            "tags": {
+                "device_mac": device_mac,
+                "device_name": window.device_name,
+                "metric": metric,
+                "source": "mqtt"
+            },
+            "fields": {
+                "count": window.count,
+                "min": window.min,
+                "max": window.max,
+                "mean": window.total / window.count,
+                "last": window.last
+            },
+            "time": window.start.isoformat()
+        }
@@ -0,0 +1,98 @@
+import unittest
+from unittest.mock import Mock, patch
+import datetime
+
+import messages
+from motion import MotionSessionizer, is_active
+from tests.test_mqtt_handlers import MockMQTTMessage
+
+START = datetime.datetime(2024, 6, 1, 12, 0, 0)
+
+
+class TestMotionSessionizer(unittest.TestCase):
+
+    def setUp(self):
+        self.sessionizer = MotionSessionizer(timeout=60)
+
+    def test_start_and_stop_make_one_event(self):
+        """Test that a start/stop pair becomes a single event with its duration"""
+        started = self.sessionizer.observe("AA", "Deck", "person", True, START)
+        stopped = self.sessionizer.observe("AA", "Deck", "person", False, START + datetime.timedelta(seconds=12))
+
+        self.assertEqual(started, [])
+        self.assertEqual(len(stopped), 1)
+        event = stopped[0]
+        self.assertEqual(event["measurement"], "motion_events")
+        self.assertEqual(event["tags"]["event_type"], "person")
+        self.assertEqual(event["tags"]["device_name"], "Deck")
+        self.assertEqual(event["fields"]["duration"], 12.0)
+        self.assertEqual(event["fields"]["timed_out"], 0)
+        self.assertEqual(event["time"], START.isoformat())
+
+    def test_repeated_start_keeps_first_start(self):
+        """Test that a second start while open doesn't reset the event"""
+        self.sessionizer.observe("AA", "Deck", "motion", True, START)
+        self.sessionizer.observe("AA", "Deck", "motion", True, START + datetime.timedelta(seconds=5))
+        events = self.sessionizer.observe("AA", "Deck", "motion", False, START + datetime.timedelta(seconds=10))
+
+        self.assertEqual(events[0]["fields"]["duration"], 10.0)
+
+    def test_types_are_tracked_separately(self):
+        """Test that smart types and plain motion don't close each other"""
+        self.sessionizer.observe("AA", "Deck", "motion", True, START)
+        self.sessionizer.observe("AA", "Deck", "vehicle", True, START)
+
+        events = self.sessionizer.observe("AA", "Deck", "vehicle", False, START + datetime.timedelta(seconds=3))
+        self.assertEqual([e["tags"]["event_type"] for e in events], ["vehicle"])
+
+    def test_stop_without_start_is_ignored(self):
+        """Test that an unmatched stop produces nothing"""
+        self.assertEqual(self.sessionizer.observe("AA", "Deck", "motion", False, START), [])
+
+    def test_dangling_event_times_out(self):
+        """Test that events left open past the timeout are closed and flagged"""
+        self.sessionizer.observe("AA", "Deck", "motion", True, START)
+
+        self.assertEqual(self.sessionizer.expire(START + datetime.timedelta(seconds=30)), [])
+        events = self.sessionizer.expire(START + datetime.timedelta(seconds=90))
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["fields"]["timed_out"], 1)
+
+        # The late stop no longer has anything to close
+        self.assertEqual(self.sessionizer.observe("AA", "Deck", "motion", False, START), [])
+
+    def test_is_active(self):
+        """Test payload interpretation for converted motion values"""
+        self.assertTrue(is_active(1))
+        self.assertTrue(is_active(1.0))
+        self.assertTrue(is_active("ON"))
+        self.assertFalse(is_active(0.0))
+        self.assertFalse(is_active("false"))
+
+
+class TestUnifiProtectMotionEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Mock()
+        self.original_sessionizer = messages.motion_sessionizer
+        messages.motion_sessionizer = MotionSessionizer(timeout=60)
+
+    def tearDown(self):
+        messages.motion_sessionizer = self.original_sessionizer
+
+    @patch('requests.post')
+    def test_smart_motion_event_written_on_stop(self, mock_requests):
+        """Test that the stop message carries the completed event point"""
+        messages.on_unifi_protect_message(self.client, None, MockMQTTMessage("unifi/protect/8C3066FE8882/motion/smart/person", "true"))
+        first_points = mock_requests.call_args[1]['json']['data_points']
+        self.assertEqual([p["measurement"] for p in first_points], ["motion"])
+
+        messages.on_unifi_protect_message(self.client, None, MockMQTTMessage("unifi/protect/8C3066FE8882/motion/smart/person", "false"))
+        second_points = mock_requests.call_args[1]['json']['data_points']
+        self.assertEqual([p["measurement"] for p in second_points], ["motion", "motion_events"])
+        self.assertEqual(second_points[1]["tags"]["event_type"], "person")
+        self.assertEqual(second_points[1]["tags"]["device_name"], "Deck")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
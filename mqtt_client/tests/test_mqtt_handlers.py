@@ -3,9 +3,12 @@ from unittest.mock import Mock, patch, MagicMock
 import json
 import logging
 
+import messages
 from messages import (
     on_station_message, on_system_message, on_raindelay_message,
-    on_weather_message, on_flow_alert_message, get_all_topics_and_message_fns
+    on_weather_message, on_flow_alert_message, on_unifi_protect_message,
+    get_all_topics_and_message_fns, get_subscriptions,
+    on_unifi_protect_shared_message, on_unifi_protect_stateful_message
 )
 
 # For testing purposes, we'll include the functions here
@@ -277,6 +280,71 @@ class TestTopicConfiguration(unittest.TestCase):
         for topic, handler in topics_and_handlers:
             self.assertTrue(callable(handler))
 
+    def test_subscriptions_without_share_group(self):
+        """Test that the default single consumer subscribes to plain topics"""
+        subscriptions = get_subscriptions()
+
+        self.assertEqual(len(subscriptions), len(get_all_topics_and_message_fns()))
+        for subscription, topic, handler, subscription_id in subscriptions:
+            self.assertEqual(subscription, topic)
+            self.assertIsNone(subscription_id)
+
+    def test_subscriptions_with_share_group(self):
+        """Test that UniFi topics are shared and notification topics are not"""
+        subscriptions = get_subscriptions(share_group="workers")
+        by_topic = {topic: subscription for subscription, topic, handler, _ in subscriptions}
+
+        self.assertEqual(by_topic["unifi/protect/+/#"], "$share/workers/unifi/protect/+/#")
+        self.assertEqual(by_topic["opensprinkler/system"], "opensprinkler/system")
+        self.assertEqual(by_topic["unifi/protect/+/motion/#"], "unifi/protect/+/motion/#")
+        self.assertEqual(by_topic["unifi/protect/+/telemetry/#"], "unifi/protect/+/telemetry/#")
+
+    def test_subscriptions_without_notifications(self):
+        """Test that worker replicas skip the OpenSprinkler notification topics"""
+        subscriptions = get_subscriptions(share_group="workers", notifications=False)
+
+        self.assertEqual(
+            subscriptions,
+            [("$share/workers/unifi/protect/+/#", "unifi/protect/+/#", on_unifi_protect_shared_message, None)]
+        )
+
+    @patch('messages.on_unifi_protect_message')
+    def test_stateful_topics_reach_one_handler(self, mock_handler):
+        """Test that motion and telemetry are only handled from the non-shared subscription"""
+        msg = MockMQTTMessage("unifi/protect/AABBCC/motion", "true")
+
+        # A shared copy, on a worker or on the notifications replica
+        on_unifi_protect_shared_message(None, None, msg)
+        on_unifi_protect_stateful_message(None, None, msg)
+        mock_handler.assert_not_called()
+
+        msg.properties = Mock(SubscriptionIdentifier=[messages.STATEFUL_SUBSCRIPTION_ID])
+        on_unifi_protect_shared_message(None, None, msg)
+        on_unifi_protect_stateful_message(None, None, msg)
+        mock_handler.assert_called_once_with(None, None, msg)
+
+        mock_handler.reset_mock()
+        on_unifi_protect_shared_message(None, None, MockMQTTMessage("unifi/protect/AABBCC/telemetry/uptime", "5"))
+        mock_handler.assert_not_called()
+        on_unifi_protect_shared_message(None, None, MockMQTTMessage("unifi/protect/AABBCC/light", "1"))
+        mock_handler.assert_called_once()
+
+    @patch('messages.requests.post')
+    def test_unifi_protect_message_written(self, mock_post):
+        """Test that the handler behind both subscriptions writes a point per message, skipping snapshots"""
+        on_unifi_protect_message(None, None, MockMQTTMessage("unifi/protect/847848260182/light/brightness", "42"))
+
+        point, = mock_post.call_args[1]['json']['data_points']
+        self.assertEqual(point["measurement"], "light")
+        self.assertEqual(point["tags"]["device_name"], "Back door")
+        self.assertEqual(point["tags"]["sub_type"], "brightness")
+        self.assertEqual(point["fields"]["value"], 42.0)
+
+        mock_post.reset_mock()
+        with patch('messages.snapshot_store', None):
+            on_unifi_protect_message(None, None, MockMQTTMessage("unifi/protect/847848260182/snapshot", b"\xff\xd8"))
+        mock_post.assert_not_called()
+
 
 if __name__ == '__main__':
     # Configure logging for tests
@@ -0,0 +1,101 @@
+import unittest
+import gzip
+import json
+import logging
+import os
+import tempfile
+
+import messages
+from recorder import write_record, read_records
+from replay import FakeAPI, replay
+
+
+class TestRecordings(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.rec.gz')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_round_trip(self):
+        """Test that records come back exactly as written, including binary payloads"""
+        records = [
+            (1700000000.5, "opensprinkler/system", json.dumps({"state": "started"}).encode()),
+            (1700000001.25, "unifi/protect/847848260182/snapshot", b"\xff\xd8\x00binary"),
+        ]
+        with gzip.open(self.path, 'wb') as fp:
+            for record in records:
+                write_record(fp, *record)
+
+        self.assertEqual(list(read_records(self.path)), records)
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.original_api_url = messages.API_URL
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self):
+        messages.API_URL = self.original_api_url
+        logging.disable(logging.NOTSET)
+
+    def test_replay_against_fake_api(self):
+        """Test that replayed messages reach the handlers and the fake API"""
+        records = [
+            (0.0, "opensprinkler/station/1", json.dumps({"state": 1, "duration": 60}).encode()),
+            (0.1, "unifi/protect/847848260182/motion", b"true"),
+            (0.2, "unifi/protect/847848260182/motion", b"false"),
+        ]
+
+        with FakeAPI() as api:
+            messages.API_URL = api.url
+            report = replay(records, speed=0)
+
+        self.assertEqual(report['messages'], 3)
+        self.assertEqual(report['handlers']['on_station_message']['calls'], 1)
+        self.assertEqual(report['handlers']['on_unifi_protect_message']['calls'], 2)
+        self.assertEqual(api.request_count, 3)
+
+    def test_replay_as_share_group_replicas(self):
+        """Test that a replay follows the shared/stateful subscriptions of a replica, like live traffic"""
+        records = [
+            (0.0, "opensprinkler/station/1", json.dumps({"state": 1, "duration": 60}).encode()),
+            (0.1, "unifi/protect/847848260182/motion", b"true"),
+            (0.2, "unifi/protect/847848260182/motion", b"false"),
+        ]
+
+        with FakeAPI() as api:
+            messages.API_URL = api.url
+            report = replay(records, share_group='collectors')
+        # Both copies of a motion message reach both callbacks, only the stateful one handles it
+        self.assertEqual(report['handlers']['on_unifi_protect_stateful_message']['calls'], 4)
+        self.assertEqual(report['handlers']['on_unifi_protect_shared_message']['calls'], 4)
+        self.assertEqual(api.request_count, 3)
+
+        with FakeAPI() as api:
+            messages.API_URL = api.url
+            report = replay(records, share_group='collectors', notifications=False)
+        # Another replica skips the notifications and leaves the motion sessions to the first one
+        self.assertNotIn('on_station_message', report['handlers'])
+        self.assertEqual(api.request_count, 0)
+
+    def test_replay_speed(self):
+        """Test that recorded gaps are scaled by the speed multiplier"""
+        records = [
+            (0.0, "unifi/protect/847848260182/motion", b"true"),
+            (1.0, "unifi/protect/847848260182/motion", b"false"),
+        ]
+
+        with FakeAPI() as api:
+            messages.API_URL = api.url
+            report = replay(records, speed=10, track_allocations=True)
+
+        self.assertGreaterEqual(report['seconds'], 0.1)
+        self.assertIn('peak_kib_per_call', report['handlers']['on_unifi_protect_message'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
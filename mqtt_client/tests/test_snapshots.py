@@ -0,0 +1,114 @@
+import unittest
+from unittest.mock import Mock, patch
+import hashlib
+import os
+import tempfile
+
+import messages
+from snapshots import SnapshotStore
+from tests.test_mqtt_handlers import MockMQTTMessage
+
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 100
+
+
+class TestSnapshotStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_put_is_content_addressed(self):
+        """Test that blobs are stored under their sha256 and deduplicated"""
+        store = SnapshotStore(self.root, max_bytes=10_000, max_age=3600, scan_interval=0)
+
+        digest = store.put(JPEG, now=1000)
+        self.assertEqual(digest, hashlib.sha256(JPEG).hexdigest())
+        with open(store.path_for(digest), 'rb') as fp:
+            self.assertEqual(fp.read(), JPEG)
+
+        self.assertEqual(store.put(JPEG, now=1001), digest)
+        self.assertEqual(store.total_bytes, len(JPEG))
+
+    def test_evicts_oldest_by_size(self):
+        """Test that the oldest blobs go first once the size limit is hit"""
+        store = SnapshotStore(self.root, max_bytes=250, max_age=3600, scan_interval=0)
+        first = store.put(b"a" * 100, now=1000)
+        second = store.put(b"b" * 100, now=1001)
+        third = store.put(b"c" * 100, now=1002)
+
+        self.assertFalse(os.path.exists(store.path_for(first)))
+        self.assertTrue(os.path.exists(store.path_for(second)))
+        self.assertTrue(os.path.exists(store.path_for(third)))
+        self.assertEqual(store.total_bytes, 200)
+
+    def test_evicts_by_age(self):
+        """Test that blobs older than max_age are removed on the next write"""
+        store = SnapshotStore(self.root, max_bytes=10_000, max_age=60, scan_interval=0)
+        old = store.put(b"old", now=1000)
+        new = store.put(b"new", now=1100)
+
+        self.assertFalse(os.path.exists(store.path_for(old)))
+        self.assertTrue(os.path.exists(store.path_for(new)))
+
+    def test_missing_blob_is_rewritten(self):
+        """Test that a blob removed behind the store's back is written again"""
+        store = SnapshotStore(self.root, max_bytes=10_000, max_age=3600, scan_interval=0)
+        digest = store.put(JPEG, now=1000)
+        os.remove(store.path_for(digest))
+
+        self.assertEqual(store.put(JPEG, now=1001), digest)
+        with open(store.path_for(digest), 'rb') as fp:
+            self.assertEqual(fp.read(), JPEG)
+
+    def test_replicas_share_one_budget(self):
+        """Test that stores on the same directory evict by the total size, oldest first"""
+        first = SnapshotStore(self.root, max_bytes=250, max_age=3600, scan_interval=0)
+        second = SnapshotStore(self.root, max_bytes=250, max_age=3600, scan_interval=0)
+
+        a = first.put(b"a" * 100, now=1000)
+        b = second.put(b"b" * 100, now=1001)
+        # Deduplicating into the oldest blob keeps it
+        self.assertEqual(second.put(b"a" * 100, now=1002), a)
+        c = first.put(b"c" * 100, now=1003)
+
+        self.assertTrue(os.path.exists(first.path_for(a)))
+        self.assertFalse(os.path.exists(first.path_for(b)))
+        self.assertTrue(os.path.exists(first.path_for(c)))
+        self.assertEqual(first.total_bytes, 200)
+
+
+class TestUnifiProtectSnapshots(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.original_store = messages.snapshot_store
+
+    def tearDown(self):
+        messages.snapshot_store = self.original_store
+        self.tmp.cleanup()
+
+    @patch('requests.post')
+    def test_snapshot_ignored_without_store(self, mock_requests):
+        """Test that snapshots are still dropped when no store is configured"""
+        messages.snapshot_store = None
+        messages.on_unifi_protect_message(Mock(), None, MockMQTTMessage("unifi/protect/8C3066FE8882/snapshot", JPEG))
+
+        mock_requests.assert_not_called()
+
+    @patch('requests.post')
+    def test_snapshot_written_as_reference(self, mock_requests):
+        """Test that only the digest and size of a snapshot reach the API"""
+        messages.snapshot_store = SnapshotStore(self.tmp.name)
+        messages.on_unifi_protect_message(Mock(), None, MockMQTTMessage("unifi/protect/8C3066FE8882/snapshot", JPEG))
+
+        points = mock_requests.call_args[1]['json']['data_points']
+        self.assertEqual(len(points), 1)
+        self.assertEqual(points[0]["measurement"], "snapshot")
+        self.assertEqual(points[0]["fields"], {"sha256": hashlib.sha256(JPEG).hexdigest(), "size": len(JPEG)})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,105 @@
+import unittest
+from unittest.mock import Mock
+import logging
+
+from supervisor import ReconnectSupervisor
+
+
+class FakeClient:
+    """Stands in for a paho client; CONNACK arrives as soon as the network thread starts"""
+
+    def __init__(self, failures=0, connack=0):
+        self.failures = failures
+        self.connack = connack
+        self.reconnect_calls = 0
+        self.on_connect = None
+        self.on_disconnect = None
+
+    def reconnect(self):
+        self.reconnect_calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionRefusedError("Connection refused")
+
+    def loop_start(self):
+        self.on_connect(self, None, {}, self.connack, None)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        self.on_disconnect(self, None, {}, 0, None)
+
+    def drop(self):
+        self.on_disconnect(self, None, {}, 7, None)
+
+
+class TestReconnectSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.delays = []
+        self.on_connected = Mock()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def make_supervisor(self, client, **kwargs):
+        return ReconnectSupervisor(client, self.on_connected, sleep=self.delays.append,
+                                   connack_timeout=0, **kwargs)
+
+    def test_connect_first_try(self):
+        """Test that a healthy broker connects without any backoff"""
+        client = FakeClient()
+        supervisor = self.make_supervisor(client)
+
+        self.assertTrue(supervisor.connect())
+        self.assertEqual(self.delays, [])
+        self.on_connected.assert_called_once_with(client)
+        self.assertIsNotNone(supervisor.last_recovery_seconds)
+
+    def test_backoff_is_jittered_and_capped(self):
+        """Test that retries back off exponentially with jitter up to max_delay"""
+        client = FakeClient(failures=5)
+        supervisor = self.make_supervisor(client, first_delay=1, rate=2, max_delay=5)
+
+        self.assertTrue(supervisor.connect())
+        self.assertEqual(client.reconnect_calls, 6)
+
+        caps = [1, 2, 4, 5, 5]
+        self.assertEqual(len(self.delays), len(caps))
+        for delay, cap in zip(self.delays, caps):
+            self.assertGreaterEqual(delay, cap / 2)
+            self.assertLessEqual(delay, cap)
+
+    def test_gives_up_after_max_attempts(self):
+        """Test that connect() reports failure once every attempt is used"""
+        client = FakeClient(failures=10)
+        supervisor = self.make_supervisor(client, max_attempts=3)
+
+        self.assertFalse(supervisor.connect())
+        self.assertEqual(client.reconnect_calls, 3)
+        self.on_connected.assert_not_called()
+
+    def test_refused_connack_is_retried(self):
+        """Test that a refused CONNACK counts as a failed attempt"""
+        client = FakeClient(connack=5)
+        supervisor = self.make_supervisor(client, max_attempts=2)
+
+        self.assertFalse(supervisor.connect())
+        self.on_connected.assert_not_called()
+
+    def test_resubscribes_after_drop(self):
+        """Test that subscriptions are set up again after the link drops"""
+        client = FakeClient()
+        supervisor = self.make_supervisor(client)
+        supervisor.connect()
+
+        client.drop()
+        self.assertFalse(supervisor.connected)
+        self.assertTrue(supervisor.connect())
+        self.assertEqual(self.on_connected.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
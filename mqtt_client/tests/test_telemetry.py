@@ -0,0 +1,86 @@
+import unittest
+from unittest.mock import Mock, patch
+import datetime
+import json
+
+import messages
+from telemetry import TelemetryAggregator, flatten_numeric
+from tests.test_mqtt_handlers import MockMQTTMessage
+
+START = datetime.datetime(2024, 6, 1, 12, 0, 0)
+
+
+def at(seconds):
+    return START + datetime.timedelta(seconds=seconds)
+
+
+class TestTelemetryAggregator(unittest.TestCase):
+
+    def setUp(self):
+        self.aggregator = TelemetryAggregator(window=60)
+
+    def test_window_statistics(self):
+        """Test that a closed window reports count/min/max/mean/last"""
+        for offset, value in [(0, 4.0), (10, 1.0), (20, 7.0), (30, 4.0)]:
+            self.assertEqual(self.aggregator.add("AA", "Deck", "temperature", value, at(offset)), [])
+
+        points = self.aggregator.add("AA", "Deck", "temperature", 9.0, at(65))
+        self.assertEqual(len(points), 1)
+        point = points[0]
+        self.assertEqual(point["measurement"], "telemetry")
+        self.assertEqual(point["tags"]["metric"], "temperature")
+        self.assertEqual(point["fields"], {"count": 4, "min": 1.0, "max": 7.0, "mean": 4.0, "last": 4.0})
+        self.assertEqual(point["time"], START.isoformat())
+
+    def test_flush_closes_idle_series(self):
+        """Test that series which stop reporting still get their window written"""
+        self.aggregator.add("AA", "Deck", "temperature", 20.0, at(5))
+        self.aggregator.add("BB", "Garage", "temperature", 18.0, at(70))
+
+        self.assertEqual(self.aggregator.flush(at(50)), [])
+        points = self.aggregator.flush(at(70))
+        self.assertEqual([p["tags"]["device_mac"] for p in points], ["AA"])
+        self.assertEqual(self.aggregator.flush(at(70)), [])
+
+    def test_flatten_numeric(self):
+        """Test that nested payloads become dotted metric names and strings are skipped"""
+        payload = {"temperature": 41.5, "wifi": {"signal": -60, "channel": "auto"}, "online": True}
+
+        self.assertEqual(
+            list(flatten_numeric(payload)),
+            [("temperature", 41.5), ("wifi.signal", -60.0), ("online", 1.0)]
+        )
+        self.assertEqual(list(flatten_numeric(12)), [("value", 12.0)])
+
+
+class TestUnifiProtectTelemetry(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Mock()
+        self.original_aggregator = messages.telemetry_aggregator
+        messages.telemetry_aggregator = TelemetryAggregator(window=60)
+
+    def tearDown(self):
+        messages.telemetry_aggregator = self.original_aggregator
+
+    @patch('messages.datetime')
+    @patch('requests.post')
+    def test_telemetry_written_once_per_window(self, mock_requests, mock_datetime):
+        """Test that raw telemetry isn't written and the window is written when it closes"""
+        mock_datetime.datetime.utcnow.return_value = at(0)
+        payload = json.dumps({"temperature": 40.0})
+        messages.on_unifi_protect_message(self.client, None, MockMQTTMessage("unifi/protect/8C3066FE8882/telemetry", payload))
+        mock_requests.assert_not_called()
+
+        mock_datetime.datetime.utcnow.return_value = at(61)
+        messages.on_unifi_protect_message(self.client, None, MockMQTTMessage("unifi/protect/8C3066FE8882/telemetry", payload))
+        mock_requests.assert_called_once()
+
+        points = mock_requests.call_args[1]['json']['data_points']
+        self.assertEqual(len(points), 1)
+        self.assertEqual(points[0]["tags"]["device_name"], "Deck")
+        self.assertEqual(points[0]["fields"]["count"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
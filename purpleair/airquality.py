@@ -1,14 +1,25 @@
 #!/usr/bin/env python3
 
-import urllib.request
+import argparse
 import json
 import os
 import sys
+import time
 import datetime
+import traceback
 import requests
 
+from aqi import AqiEngine, epa_correct
+from polling import PollSchedule
+
 API_KEY_PATH = "/var/lib/purpleair/apiKey"
-URL_TEMPLATE = "https://api.purpleair.com/v1/sensors/{sensor_id}?api_key={api_key}&fields=name%2Cpm1.0_atm%2Cpm2.5_atm%2Cpm10.0_atm"
+API_URL = "https://api.purpleair.com/v1"
+# Every requested field costs API points, only ask for what gets written.
+# sensor_index is always included in the response.
+# pm2.5_cf_1 and humidity feed the EPA correction and AQI.
+FIELDS = ["name", "last_seen", "pm1.0_atm", "pm2.5_atm", "pm10.0_atm", "pm2.5_cf_1", "humidity"]
+# PurpleAir field -> field written to InfluxDB
+PM_FIELDS = {"pm1.0_atm": "pm10", "pm2.5_atm": "pm25", "pm10.0_atm": "pm100"}
 TEST_JSON = None
 
 def average_round_pm(sensors, value_name):
@@ -16,42 +27,61 @@ def average_round_pm(sensors, value_name):
     count = sum(1 for sensor in sensors if sensor and sensor.get(value_name) is not None)
     return round(total / count, 2) if count > 0 else 0
 
-def create_api_data_points(results):
-    time = datetime.datetime.fromtimestamp(results['data_time_stamp'], tz=datetime.timezone.utc)
-    sensor = results['sensor']
+def create_api_data_points(results, seen=None, engines=None):
+    """
+    The multi-sensor endpoints return a `fields` header and one `data` row per
+    sensor, the columns are looked up once and each row is read by index.
 
-    tags = {
-        "location": "Outside",
-        "host": sensor['name'],
-        "sensor": "PurpleAir",
-    }
+    Sensors whose `last_seen` isn't newer than in `seen` (sensor_index ->
+    last_seen) are skipped. `engines` (sensor_index -> AqiEngine) keeps the
+    rolling NowCast and 24 hour state between calls.
+    """
+    columns = {field: index for index, field in enumerate(results['fields'])}
+    index_column = columns['sensor_index']
+    name_column = columns['name']
+    time_column = columns['last_seen']
+    pm_columns = [(columns[field], name) for field, name in PM_FIELDS.items()]
+    cf1_column = columns.get('pm2.5_cf_1')
+    humidity_column = columns.get('humidity')
+    seen = seen or {}
+    engines = {} if engines is None else engines
 
-    # Create separate data points for each PM measurement
+    # Create separate data points for each PM measurement of each sensor
     data_points = []
+    for row in results['data']:
+        if row[time_column] <= seen.get(row[index_column], 0):
+            continue
+        time = datetime.datetime.fromtimestamp(row[time_column], tz=datetime.timezone.utc).isoformat()
+        tags = {
+            "location": "Outside",
+            "host": row[name_column],
+            "sensor": "PurpleAir",
+        }
 
-    # PM 1.0
-    data_points.append({
-        "measurement": "airquality",
-        "tags": tags,
-        "fields": {"pm10": float(sensor['pm1.0_atm'])},
-        "time": time.isoformat()
-    })
-
-    # PM 2.5
-    data_points.append({
-        "measurement": "airquality",
-        "tags": tags,
-        "fields": {"pm25": float(sensor['pm2.5_atm'])},
-        "time": time.isoformat()
-    })
-
-    # PM 10.0
-    data_points.append({
-        "measurement": "airquality",
-        "tags": tags,
-        "fields": {"pm100": float(sensor['pm10.0_atm'])},
-        "time": time.isoformat()
-    })
+        for column, name in pm_columns:
+            if row[column] is None:
+                continue
+            data_points.append({
+                "measurement": "airquality",
+                "tags": tags,
+                "fields": {name: float(row[column])},
+                "time": time
+            })
+
+        if cf1_column is None or humidity_column is None:
+            continue
+        if row[cf1_column] is None or row[humidity_column] is None:
+            continue
+        pm25_epa = epa_correct(float(row[cf1_column]), float(row[humidity_column]))
+        engine = engines.setdefault(row[index_column], AqiEngine())
+        fields = {"pm25_epa": round(pm25_epa, 2)}
+        fields.update(engine.add(row[time_column], pm25_epa))
+        data_points.append({
+            "measurement": "airquality",
+            "tags": tags,
+            "fields": fields,
+            "time": time
+        })
 
     return data_points
 
@@ -70,46 +100,183 @@ def get_api_key(path):
         print(f"ERROR: API key does not exist at {path}. Exiting")
         sys.exit(1)
 
-def fetch_data(url):
-    with urllib.request.urlopen(url) as req:
-        return json.loads(req.read().decode())
-
-def main():
-    sensor_id = get_env_variable('SENSOR_ID')
-    api_key = get_api_key(API_KEY_PATH)
-    full_url = URL_TEMPLATE.format(sensor_id=sensor_id, api_key=api_key)
-
-    data = fetch_data(full_url) if TEST_JSON is None else json.loads(TEST_JSON)
+def get_sensor_ids():
+    # SENSOR_IDS is a comma separated list, SENSOR_ID a single sensor
+    value = os.environ.get('SENSOR_IDS') or os.environ.get('SENSOR_ID') or ''
+    return [sensor_id.strip() for sensor_id in value.split(',') if sensor_id.strip()]
 
-    if not data or 'sensor' not in data:
-        print(f"No valid data returned: {data}")
-        sys.exit(0)
+def sensors_request(sensor_ids, group_id=None):
+    """URL and query parameters fetching every sensor in one request"""
+    params = {"fields": ",".join(FIELDS)}
+    if group_id:
+        return f"{API_URL}/groups/{group_id}/members", params
+    params["show_only"] = ",".join(sensor_ids)
+    return f"{API_URL}/sensors", params
 
-    # Get database name for API endpoint
-    influx_db = get_env_variable("INFLUX_DB")
+def fetch_data(session, url, params, modified_since=None):
+    if modified_since is not None:
+        # Only sensors with new readings since the previous response are returned
+        params = dict(params, modified_since=modified_since)
+    response = session.get(url, params=params)
+    response.raise_for_status()
+    return response.json()
 
-    # Create data points for API
-    data_points = create_api_data_points(data)
+def newest_last_seen(results):
+    """sensor_index -> last_seen of every sensor in the response"""
+    columns = {field: index for index, field in enumerate(results['fields'])}
+    index_column = columns['sensor_index']
+    time_column = columns['last_seen']
+    return {row[index_column]: row[time_column] for row in results['data']}
 
-    print(f"Fetched sensor values from PurpleAir: \n{data}")
-    print(f"API data points: \n{data_points}")
+def purpleair_session():
+    """Session for the PurpleAir API only, it carries the API key"""
+    session = requests.Session()
+    session.headers["X-API-Key"] = get_api_key(API_KEY_PATH)
+    return session
 
+def write_data_points(session, influx_db, data_points):
     # Send to your API
     api_payload = {
         "data_points": data_points,
         "verbose": False
     }
+    response = session.post(
+        f'http://api:5000/influx/{influx_db}/write',
+        json=api_payload
+    )
+    response.raise_for_status()
+    return response.json()
 
-    try:
-        response = requests.post(
-            f'http://api:5000/influx/{influx_db}/write',
-            json=api_payload
-        )
-        response.raise_for_status()
-        print(f"Successfully wrote data to API: {response.json()}")
-    except requests.exceptions.RequestException as e:
-        print(f"Error writing to API: {e}")
+def poll(session, api_session, url, params, influx_db, state):
+    """
+    Fetch once with `session` and write the sensors with new readings
+    through `api_session`. `state` carries the
+    previous response's time_stamp and each sensor's last_seen between polls
+    and is only advanced once the points are written.
+    Returns the newest last_seen written, or None when nothing changed.
+    """
+    data = fetch_data(session, url, params, state.get('time_stamp')) if TEST_JSON is None else json.loads(TEST_JSON)
+
+    if not data or 'data' not in data:
+        print(f"No valid data returned: {data}")
+        return None
+
+    data_points = create_api_data_points(data, state['seen'], state['aqi'])
+    if data_points:
+        result = write_data_points(api_session, influx_db, data_points)
+        print(f"Wrote {len(data_points)} data points to API: {result}")
+    else:
+        print(f"No new readings since {state.get('data_time_stamp')}")
+
+    last_seen = newest_last_seen(data)
+    changed = [ts for index, ts in last_seen.items() if ts > state['seen'].get(index, 0)]
+    state['seen'].update(last_seen)
+    state['time_stamp'] = data.get('time_stamp')
+    state['data_time_stamp'] = data.get('data_time_stamp')
+    return max(changed) if changed else None
+
+def run_polling(session, api_session, url, params, influx_db, once=False, clock=time.time, sleep=time.sleep,
+                max_polls=None):
+    """
+    Poll on the adaptive schedule until stopped. A failed cycle, whether the
+    network or a malformed payload, is logged and the next poll goes ahead;
+    with `once` it's an error exit instead.
+    """
+    schedule = PollSchedule()
+    state = {'seen': {}, 'aqi': {}}
+    polls = 0
+    while max_polls is None or polls < max_polls:
+        polls += 1
+        try:
+            schedule.observe(poll(session, api_session, url, params, influx_db, state))
+        except requests.exceptions.RequestException as e:
+            print(f"Error polling PurpleAir: {e}")
+            if once:
+                sys.exit(1)
+        except Exception:
+            print("Error handling the PurpleAir response:")
+            traceback.print_exc()
+            if once:
+                sys.exit(1)
+
+        if once or TEST_JSON is not None:
+            break
+        delay = schedule.next_delay(clock())
+        print(f"Next poll in {delay:.0f}s (sensor cadence {schedule.cadence or 'unknown'}s)")
+        sleep(delay)
+
+def parse_date(value):
+    return int(datetime.datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc).timestamp())
+
+def run_backfill(args):
+    # Imported here, backfill imports helpers from this module
+    from backfill import BackfillWatermarks, backfill_sensor
+
+    sensor_ids = get_sensor_ids()
+    if not sensor_ids or not args.begin:
+        print("ERROR: A backfill needs SENSOR_IDS or SENSOR_ID and --begin. Exiting")
+        sys.exit(1)
+    influx_db = get_env_variable("INFLUX_DB")
+    begin = parse_date(args.begin)
+    end = parse_date(args.end) if args.end else int(time.time())
+
+    session = purpleair_session()
+    api_session = requests.Session()
+    # The history endpoint has no name, get every sensor's in one request
+    url, params = sensors_request(sensor_ids)
+    sensors = fetch_data(session, url, dict(params, fields="name"))
+    columns = {field: index for index, field in enumerate(sensors['fields'])}
+    names = {str(row[columns['sensor_index']]): row[columns['name']] for row in sensors['data']}
+
+    watermarks = BackfillWatermarks()
+    for sensor_id in sensor_ids:
+        written = backfill_sensor(session, api_session, influx_db, sensor_id, names.get(sensor_id, sensor_id),
+                                  begin, end, args.average, watermarks)
+        print(f"Sensor {sensor_id}: backfilled {written} points")
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll PurpleAir sensors and write their readings to the API")
+    parser.add_argument("--once", action="store_true", help="Poll once and exit")
+    parser.add_argument("--local", metavar="HOST", default=os.environ.get("LOCAL_SENSOR"),
+                        help="Poll the sensor's /json on the LAN instead of the PurpleAir API")
+    parser.add_argument("--backfill", action="store_true",
+                        help="Import the history of SENSOR_IDS from --begin to --end, resuming where the "
+                             "previous backfill stopped")
+    parser.add_argument("--begin", help="Backfill start date, YYYY-MM-DD (UTC)")
+    parser.add_argument("--end", help="Backfill end date, YYYY-MM-DD (UTC). Defaults to now")
+    parser.add_argument("--average", type=int, default=10, choices=[0, 10, 30, 60, 360, 1440],
+                        help="Backfill averaging period in minutes")
+    args = parser.parse_args()
+
+    if args.backfill:
+        run_backfill(args)
+        return
+
+    if args.local:
+        # Imported here, local imports helpers from this module
+        from local import local_url, run_local
+        influx_db = get_env_variable("INFLUX_DB")
+        session = requests.Session()
+        print(f"Polling local sensor at {local_url(args.local)}")
+        run_local(session, local_url(args.local),
+                  lambda data_points: write_data_points(session, influx_db, data_points),
+                  name=os.environ.get("LOCAL_SENSOR_NAME"))
+        return
+
+    sensor_ids = get_sensor_ids()
+    group_id = os.environ.get('GROUP_ID')
+    if not sensor_ids and not group_id:
+        print("ERROR: Set SENSOR_IDS, SENSOR_ID or GROUP_ID. Exiting")
         sys.exit(1)
+    # Get database name for API endpoint
+    influx_db = get_env_variable("INFLUX_DB")
+    url, params = sensors_request(sensor_ids, group_id)
+
+    # Keep-alive sessions for the PurpleAir API and our API, only the first one carries the key
+    session = purpleair_session()
+    api_session = requests.Session()
+
+    run_polling(session, api_session, url, params, influx_db, once=args.once)
 
 if __name__ == "__main__":
     main()
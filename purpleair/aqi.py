@@ -0,0 +1,193 @@
+import math
+import numpy as np
+
+# US EPA PM2.5 breakpoints (2024 revision): concentration low/high -> AQI low/high
+PM25_BREAKPOINTS = [
+    (0.0, 9.0, 0, 50),
+    (9.1, 35.4, 51, 100),
+    (35.5, 55.4, 101, 150),
+    (55.5, 125.4, 151, 200),
+    (125.5, 225.4, 201, 300),
+    (225.5, 325.4, 301, 500),
+]
+AQI_MAX = 500
+
+NOWCAST_HOURS = 12
+DAY_HOURS = 24
+# A 24 hour average needs 75% of the hours
+DAY_MIN_HOURS = 18
+
+def epa_correct(pm25_cf1, humidity):
+    """
+    US EPA correction of PurpleAir PM2.5 (the 2021 nationwide fit) from the
+    A/B averaged pm2.5_cf_1 and the sensor's relative humidity.
+    """
+    x, rh = pm25_cf1, humidity
+    if x < 30:
+        value = 0.524 * x - 0.0862 * rh + 5.75
+    elif x < 50:
+        f = x / 20 - 3 / 2
+        value = (0.786 * f + 0.524 * (1 - f)) * x - 0.0862 * rh + 5.75
+    elif x < 210:
+        value = 0.786 * x - 0.0862 * rh + 5.75
+    elif x < 260:
+        f = x / 50 - 21 / 5
+        value = ((0.69 * f + 0.786 * (1 - f)) * x - 0.0862 * rh * (1 - f)
+                 + 2.966 * f + 5.75 * (1 - f) + 8.84e-4 * x ** 2 * f)
+    else:
+        value = 2.966 + 0.69 * x + 8.84e-4 * x ** 2
+    return max(0.0, value)
+
+def aqi(concentration):
+    """US AQI of a PM2.5 concentration in ug/m3"""
+    c = math.floor(concentration * 10) / 10
+    for c_low, c_high, i_low, i_high in PM25_BREAKPOINTS:
+        if c <= c_high:
+            return round((i_high - i_low) / (c_high - c_low) * (max(c, c_low) - c_low) + i_low)
+    return AQI_MAX
+
+def nowcast(hourly):
+    """
+    EPA NowCast of hourly averages, most recent hour first, None for hours
+    without data. Needs two of the three most recent hours.
+    """
+    hourly = hourly[:NOWCAST_HOURS]
+    if sum(value is not None for value in hourly[:3]) < 2:
+        return None
+    values = [value for value in hourly if value is not None]
+    low, high = min(values), max(values)
+    weight = max(0.5, low / high) if high > 0 else 1.0
+
+    total = weights = 0.0
+    for age, value in enumerate(hourly):
+        if value is not None:
+            total += weight ** age * value
+            weights += weight ** age
+    return total / weights
+
+class AqiEngine:
+    """
+    Incremental NowCast and 24 hour AQI of one sensor. Keeps a running
+    sum/count per clock hour for the last 24 hours, each new reading costs a
+    dict update and a walk over at most 24 hours.
+    """
+
+    def __init__(self):
+        self.hours = {}
+        self.last_timestamp = None
+
+    def add(self, timestamp, pm25):
+        """
+        Add an EPA corrected reading and return the AQI fields as of its hour.
+        A reading that isn't newer than the last one is not counted again.
+        """
+        hour = int(timestamp // 3600) * 3600
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return self.fields(hour)
+        self.last_timestamp = timestamp
+        bucket = self.hours.get(hour)
+        if bucket is None:
+            bucket = self.hours[hour] = [0.0, 0]
+            for old in [h for h in self.hours if h <= hour - DAY_HOURS * 3600]:
+                del self.hours[old]
+        bucket[0] += pm25
+        bucket[1] += 1
+        return self.fields(hour)
+
+    def hourly(self, hour):
+        """Hourly averages of the last 24 hours up to `hour`, most recent first"""
+        averages = []
+        for age in range(DAY_HOURS):
+            bucket = self.hours.get(hour - age * 3600)
+            averages.append(bucket[0] / bucket[1] if bucket else None)
+        return averages
+
+    def fields(self, hour):
+        hourly = self.hourly(hour)
+        fields = {}
+
+        current = nowcast(hourly)
+        if current is not None:
+            fields["pm25_nowcast"] = round(current, 2)
+            fields["aqi_nowcast"] = aqi(current)
+
+        day = [value for value in hourly if value is not None]
+        if len(day) >= DAY_MIN_HOURS:
+            average = sum(day) / len(day)
+            fields["pm25_24h"] = round(average, 2)
+            fields["aqi_24h"] = aqi(average)
+        return fields
+
+# Vectorized versions of the above for backfill batches
+
+def epa_correct_array(pm25_cf1, humidity):
+    x = np.asarray(pm25_cf1, dtype=float)
+    rh = np.asarray(humidity, dtype=float)
+    f_low = x / 20 - 3 / 2
+    f_high = x / 50 - 21 / 5
+    value = np.select(
+        [x < 30, x < 50, x < 210, x < 260],
+        [
+            0.524 * x - 0.0862 * rh + 5.75,
+            (0.786 * f_low + 0.524 * (1 - f_low)) * x - 0.0862 * rh + 5.75,
+            0.786 * x - 0.0862 * rh + 5.75,
+            ((0.69 * f_high + 0.786 * (1 - f_high)) * x - 0.0862 * rh * (1 - f_high)
+             + 2.966 * f_high + 5.75 * (1 - f_high) + 8.84e-4 * x ** 2 * f_high),
+        ],
+        2.966 + 0.69 * x + 8.84e-4 * x ** 2,
+    )
+    return np.maximum(value, 0.0)
+
+def aqi_array(concentrations):
+    """aqi() of every concentration, NaN stays NaN"""
+    c = np.floor(np.asarray(concentrations, dtype=float) * 10) / 10
+    table = np.array(PM25_BREAKPOINTS, dtype=float)
+    row = np.clip(np.searchsorted(table[:, 1], c), 0, len(table) - 1)
+    c_low, c_high, i_low, i_high = table[row].T
+    values = np.round((i_high - i_low) / (c_high - c_low) * (np.maximum(c, c_low) - c_low) + i_low)
+    return np.where(c > table[-1, 1], AQI_MAX, values)
+
+def hourly_means(timestamps, values):
+    """
+    Average `values` per clock hour. Returns the hour epochs, contiguous from
+    the first to the last hour, and their averages with NaN for empty hours.
+    """
+    hours = (np.asarray(timestamps, dtype=np.int64) // 3600) * 3600
+    values = np.asarray(values, dtype=float)
+    if not len(hours):
+        return hours, values
+    index = (hours - hours.min()) // 3600
+    size = int(index.max()) + 1
+    sums = np.bincount(index, weights=values, minlength=size)
+    counts = np.bincount(index, minlength=size)
+    with np.errstate(invalid='ignore'):
+        means = sums / counts
+    return hours.min() + np.arange(size, dtype=np.int64) * 3600, means
+
+def _windows(hourly, size):
+    """(hours, size) view of each hour and the `size - 1` before it, most recent first"""
+    padded = np.concatenate([np.full(size - 1, np.nan), hourly])
+    return np.lib.stride_tricks.sliding_window_view(padded, size)[:, ::-1]
+
+def nowcast_array(hourly):
+    """nowcast() for every hour of a contiguous series of hourly averages"""
+    windows = _windows(np.asarray(hourly, dtype=float), NOWCAST_HOURS)
+    present = ~np.isnan(windows)
+    enough = present[:, :3].sum(axis=1) >= 2
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        low = np.where(present, windows, np.inf).min(axis=1)
+        high = np.where(present, windows, -np.inf).max(axis=1)
+        weight = np.where(high > 0, np.maximum(0.5, low / high), 1.0)
+        powers = weight[:, None] ** np.arange(NOWCAST_HOURS)[None, :]
+        powers = np.where(present, powers, 0.0)
+        values = (powers * np.nan_to_num(windows)).sum(axis=1) / powers.sum(axis=1)
+    return np.where(enough, values, np.nan)
+
+def day_average_array(hourly):
+    """24 hour average ending at every hour, NaN with fewer than DAY_MIN_HOURS hours"""
+    windows = _windows(np.asarray(hourly, dtype=float), DAY_HOURS)
+    counts = (~np.isnan(windows)).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.nansum(windows, axis=1) / counts
+    return np.where(counts >= DAY_MIN_HOURS, averages, np.nan)
@@ -0,0 +1,177 @@
+import datetime
+import json
+import os
+import numpy as np
+
+from airquality import API_URL, PM_FIELDS, write_data_points
+from aqi import (DAY_HOURS, aqi_array, day_average_array, epa_correct_array, hourly_means,
+                 nowcast_array)
+
+BACKFILL_STATE_PATH = "/var/lib/purpleair/backfill.json"
+# Maximum number of points per request to the API's influx write endpoint
+BACKFILL_BATCH_SIZE = int(os.environ.get("BACKFILL_BATCH_SIZE", "5000"))
+# Averaging period in minutes -> the longest range the history API returns for it, in days
+HISTORY_MAX_DAYS = {0: 2, 10: 3, 30: 7, 60: 14, 360: 90, 1440: 365}
+HISTORY_FIELDS = ["pm1.0_atm", "pm2.5_atm", "pm10.0_atm", "pm2.5_cf_1", "humidity"]
+
+class BackfillWatermarks:
+    """Newest backfilled time_stamp per sensor, persisted as JSON"""
+
+    def __init__(self, path=BACKFILL_STATE_PATH):
+        self.path = path
+        self.marks = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.marks = json.load(f)
+
+    def get(self, sensor_id):
+        return self.marks.get(str(sensor_id))
+
+    def update(self, sensor_id, timestamp):
+        key = str(sensor_id)
+        self.marks[key] = max(timestamp, self.marks.get(key, timestamp))
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.marks, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+def chunk_ranges(begin, end, max_days):
+    """(chunk_begin, chunk_end) epoch pairs covering begin..end"""
+    step = max_days * 24 * 3600
+    return [(start, min(start + step, end)) for start in range(begin, end, step)]
+
+def fetch_history(session, sensor_id, begin, end, average):
+    params = {
+        "start_timestamp": begin,
+        "end_timestamp": end,
+        "average": average,
+        "fields": ",".join(HISTORY_FIELDS),
+    }
+    response = session.get(f"{API_URL}/sensors/{sensor_id}/history", params=params)
+    response.raise_for_status()
+    return response.json()
+
+def history_columns(results):
+    """
+    The history response as one float array per field, sorted by time, with
+    NaN for missing values. The API doesn't return rows in time order.
+    """
+    if not results.get("data"):
+        return None
+    table = np.array(results["data"], dtype=float)
+    columns = {field: table[:, index] for index, field in enumerate(results["fields"])}
+    order = np.argsort(columns["time_stamp"], kind="stable")
+    return {field: column[order] for field, column in columns.items()}
+
+def aqi_columns(timestamps, pm25_epa, context):
+    """
+    NowCast and 24 hour values for every reading, as of the reading's hour.
+    `context` holds the previous chunk's last day of (timestamps, pm25_epa)
+    so windows spanning chunk boundaries are complete; it's updated in place.
+    """
+    all_timestamps = np.concatenate([context["timestamps"], timestamps])
+    all_values = np.concatenate([context["values"], pm25_epa])
+    present = ~np.isnan(all_values)
+
+    # One slot per hour from the first to the last reading, including readings
+    # without a value, so every reading has an hour to look up
+    first_hour = int(all_timestamps.min()) // 3600 * 3600
+    hours, means = hourly_means(all_timestamps[present], all_values[present])
+    hourly = np.full((int(all_timestamps.max()) // 3600 * 3600 - first_hour) // 3600 + 1, np.nan)
+    hourly[(hours - first_hour) // 3600] = means
+
+    index = (timestamps.astype(np.int64) // 3600 * 3600 - first_hour) // 3600
+    current = nowcast_array(hourly)[index]
+    day = day_average_array(hourly)[index]
+    columns = {
+        "pm25_nowcast": np.round(current, 2),
+        "aqi_nowcast": aqi_array(current),
+        "pm25_24h": np.round(day, 2),
+        "aqi_24h": aqi_array(day),
+    }
+
+    keep = all_timestamps > all_timestamps.max() - DAY_HOURS * 3600
+    context["timestamps"], context["values"] = all_timestamps[keep], all_values[keep]
+    return columns
+
+def pm25_epa_column(columns):
+    return epa_correct_array(columns["pm2.5_cf_1"], columns["humidity"])
+
+def history_points(columns, tags, context):
+    """Build one point per reading from the column arrays, leaving out NaN fields"""
+    timestamps = columns["time_stamp"]
+    fields = {name: columns[field] for field, name in PM_FIELDS.items()}
+
+    pm25_epa = pm25_epa_column(columns)
+    fields["pm25_epa"] = np.round(pm25_epa, 2)
+    fields.update(aqi_columns(timestamps, pm25_epa, context))
+
+    names = list(fields)
+    integers = {"aqi_nowcast", "aqi_24h"}
+    rows = zip(timestamps.astype(np.int64).tolist(), *(fields[name].tolist() for name in names))
+    data_points = []
+    for timestamp, *values in rows:
+        point_fields = {
+            name: int(value) if name in integers else value
+            for name, value in zip(names, values) if value == value
+        }
+        if not point_fields:
+            continue
+        data_points.append({
+            "measurement": "airquality",
+            "tags": tags,
+            "fields": point_fields,
+            "time": datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc).isoformat()
+        })
+    return data_points
+
+def seed_context(session, sensor_id, begin, average, context):
+    """
+    Fill `context` with the day before `begin`, already written by a previous
+    run or outside the backfill, so the first chunk's NowCast and 24 hour
+    values are as complete as the rest.
+    """
+    columns = history_columns(fetch_history(session, sensor_id, begin - DAY_HOURS * 3600, begin, average))
+    if columns is None:
+        return
+    before = columns["time_stamp"] < begin
+    if before.any():
+        aqi_columns(columns["time_stamp"][before], pm25_epa_column(columns)[before], context)
+
+def backfill_sensor(session, api_session, influx_db, sensor_id, name, begin, end, average, watermarks):
+    """
+    Import one sensor's history from `begin` to `end` (epoch seconds), chunk
+    by chunk, resuming after the watermark. History comes from `session`,
+    points are written through `api_session`. Returns the number of points
+    written.
+    """
+    mark = watermarks.get(sensor_id)
+    if mark is not None and mark >= begin:
+        begin = mark + 1
+    if begin >= end:
+        print(f"Sensor {sensor_id} is already backfilled up to {end}")
+        return 0
+
+    tags = {
+        "location": "Outside",
+        "host": name,
+        "sensor": "PurpleAir",
+    }
+    context = {"timestamps": np.array([]), "values": np.array([])}
+    seed_context(session, sensor_id, begin, average, context)
+    written = 0
+    for chunk_begin, chunk_end in chunk_ranges(begin, end, HISTORY_MAX_DAYS[average]):
+        columns = history_columns(fetch_history(session, sensor_id, chunk_begin, chunk_end, average))
+        if columns is None:
+            print(f"Sensor {sensor_id}: no data from {chunk_begin} to {chunk_end}")
+            continue
+
+        data_points = history_points(columns, tags, context)
+        for start in range(0, len(data_points), BACKFILL_BATCH_SIZE):
+            write_data_points(api_session, influx_db, data_points[start:start + BACKFILL_BATCH_SIZE])
+        written += len(data_points)
+
+        watermarks.update(sensor_id, int(columns["time_stamp"][-1]))
+        print(f"Sensor {sensor_id}: wrote {len(data_points)} points from {chunk_begin} to {chunk_end}")
+    return written
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeSensorHandler(BaseHTTPRequestHandler):
+    """Serves /json like a PurpleAir sensor on the LAN"""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/json":
+            self.send_error(404)
+            return
+        self.server.request_count += 1
+
+        body = json.dumps(self.server.reading()).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class FakeSensor:
+    """
+    Local stand-in for a PurpleAir sensor, run on a background thread. Each
+    request returns the next of `readings`, repeating the last one, or a
+    random walk around 10 ug/m3 without them.
+    """
+
+    def __init__(self, readings=None, host="127.0.0.1", port=0, name="PurpleAir-fake"):
+        self.readings = list(readings or [])
+        self.name = name
+        self.pm = 10.0
+        self.server = ThreadingHTTPServer((host, port), FakeSensorHandler)
+        self.server.request_count = 0
+        self.server.reading = self.reading
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def reading(self):
+        if self.readings:
+            reading = self.readings.pop(0) if len(self.readings) > 1 else self.readings[0]
+        else:
+            self.pm = max(0.0, self.pm + random.uniform(-1, 1))
+            reading = {
+                "pm1_0_atm": round(self.pm * 0.7, 2), "pm1_0_atm_b": round(self.pm * 0.72, 2),
+                "pm2_5_atm": round(self.pm, 2), "pm2_5_atm_b": round(self.pm * 1.03, 2),
+                "pm10_0_atm": round(self.pm * 1.2, 2), "pm10_0_atm_b": round(self.pm * 1.25, 2),
+            }
+        return dict(reading, SensorId="00:00:00:00:00:00", Geo=self.name,
+                    DateTime=time.strftime("%Y/%m/%dT%H:%M:%Sz", time.gmtime()))
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        return self.server.request_count
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake PurpleAir /json for LOCAL_SENSOR")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    with FakeSensor(host="0.0.0.0", port=args.port) as sensor:
+        print(f"Serving {sensor.url}/json")
+        sensor.thread.join()
+
+if __name__ == "__main__":
+    main()
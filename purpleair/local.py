@@ -0,0 +1,129 @@
+import datetime
+import os
+import time
+from collections import deque
+import requests
+
+from airquality import average_round_pm
+
+# Poll the sensor's /json this often, in seconds
+LOCAL_POLL_INTERVAL = float(os.environ.get("LOCAL_POLL_INTERVAL", "5"))
+# Smoothing windows in seconds -> suffix of the written fields
+WINDOWS = {60: "", 600: "_10m"}
+# How often the smoothed values are written, in seconds
+LOCAL_WRITE_INTERVAL = 60
+# Local /json field of channel A -> field written to InfluxDB. Channel B has a "_b" suffix.
+LOCAL_PM_FIELDS = {"pm1_0_atm": "pm10", "pm2_5_atm": "pm25", "pm10_0_atm": "pm100"}
+CHANNELS = {"a": "", "b": "_b"}
+
+class TimeWindow:
+    """The values of the last `seconds` with a running sum, however often they arrive"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.values = deque()  # (time, value), oldest first
+        self.total = 0.0
+
+    def append(self, time, value):
+        self.values.append((time, value))
+        self.total += value
+
+    def mean(self, now):
+        """Mean of the values newer than `now` minus the window"""
+        while self.values and self.values[0][0] <= now - self.seconds:
+            self.total -= self.values.popleft()[1]
+        if not self.values:
+            self.total = 0.0
+            return None
+        return self.total / len(self.values)
+
+class LocalSmoother:
+    """
+    Rolling windows of a local sensor's A and B channels. Readings are kept
+    by their time, so a window covers the same span whatever the poll interval.
+    """
+
+    def __init__(self, windows=WINDOWS):
+        self.windows = {
+            suffix: {
+                (channel, field): TimeWindow(seconds)
+                for channel in CHANNELS for field in LOCAL_PM_FIELDS
+            }
+            for seconds, suffix in windows.items()
+        }
+
+    def add(self, reading, time):
+        for buffers in self.windows.values():
+            for (channel, field), buffer in buffers.items():
+                value = reading.get(field + CHANNELS[channel])
+                if value is not None:
+                    buffer.append(time, float(value))
+
+    def fields(self, now):
+        """Smoothed A/B averages per window at `now`, e.g. pm25 (1 minute) and pm25_10m"""
+        fields = {}
+        for suffix, buffers in self.windows.items():
+            # One {field: mean} dict per channel, as average_round_pm expects
+            channels = [
+                {field: buffers[(channel, field)].mean(now) for field in LOCAL_PM_FIELDS}
+                for channel in CHANNELS
+            ]
+            for field, name in LOCAL_PM_FIELDS.items():
+                if any(channel[field] is not None for channel in channels):
+                    fields[name + suffix] = average_round_pm(channels, field)
+        return fields
+
+def create_local_data_point(name, fields, time):
+    return {
+        "measurement": "airquality",
+        "tags": {
+            "location": "Outside",
+            "host": name,
+            "sensor": "PurpleAir",
+        },
+        "fields": fields,
+        "time": datetime.datetime.fromtimestamp(time, tz=datetime.timezone.utc).isoformat()
+    }
+
+def fetch_local(session, url):
+    response = session.get(url, timeout=LOCAL_POLL_INTERVAL)
+    response.raise_for_status()
+    return response.json()
+
+def local_url(host):
+    # live=true returns the latest 2 second readings instead of the 2 minute averages
+    base = host if host.startswith("http") else f"http://{host}"
+    return f"{base.rstrip('/')}/json?live=true"
+
+def run_local(session, url, write, name=None, poll_interval=LOCAL_POLL_INTERVAL, write_interval=LOCAL_WRITE_INTERVAL,
+              clock=time.time, sleep=time.sleep, max_polls=None):
+    """
+    Poll the sensor every `poll_interval` seconds and `write(data_points)` the
+    smoothed values every `write_interval` seconds. The host tag is `name`, or
+    the sensor's own Geo name.
+    """
+    smoother = LocalSmoother()
+    next_write = clock() + write_interval
+    polls = 0
+    while max_polls is None or polls < max_polls:
+        polls += 1
+        started = clock()
+        try:
+            reading = fetch_local(session, url)
+            name = name or reading.get("Geo")
+            smoother.add(reading, started)
+        except Exception as e:
+            # Network errors and malformed readings alike, the next poll goes ahead
+            print(f"Error polling local sensor: {e!r}")
+
+        if started >= next_write and name is not None:
+            fields = smoother.fields(started)
+            if fields:
+                try:
+                    write([create_local_data_point(name, fields, started)])
+                except requests.exceptions.RequestException as e:
+                    print(f"Error writing to API: {e}")
+            while next_write <= started:
+                next_write += write_interval
+
+        sleep(max(0.0, poll_interval - (clock() - started)))
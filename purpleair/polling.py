@@ -0,0 +1,43 @@
+import os
+
+# Poll at most this often, and at least this often, in seconds
+POLL_MIN_INTERVAL = float(os.environ.get("POLL_MIN_INTERVAL", "120"))
+POLL_MAX_INTERVAL = float(os.environ.get("POLL_MAX_INTERVAL", "1800"))
+# Give the API this long after the expected update before polling
+POLL_SLACK = 15
+
+class PollSchedule:
+    """
+    Learns how often the sensors report from the changes in their `last_seen`
+    timestamps and schedules the next poll just after the next expected
+    update, within [min_interval, max_interval].
+    """
+
+    def __init__(self, min_interval=POLL_MIN_INTERVAL, max_interval=POLL_MAX_INTERVAL, smoothing=0.3):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.smoothing = smoothing
+        self.cadence = None
+        self.last_seen = None
+
+    def observe(self, last_seen):
+        """Record the newest `last_seen` of a poll, None when nothing changed"""
+        if last_seen is None or (self.last_seen is not None and last_seen <= self.last_seen):
+            return
+        if self.last_seen is not None:
+            gap = last_seen - self.last_seen
+            if self.cadence is None:
+                self.cadence = gap
+            else:
+                self.cadence += self.smoothing * (gap - self.cadence)
+        self.last_seen = last_seen
+
+    def next_delay(self, now):
+        """Seconds to wait before the next poll"""
+        if self.cadence is None:
+            return self.min_interval
+        delay = self.last_seen + self.cadence + POLL_SLACK - now
+        if delay < self.min_interval:
+            # Already overdue: the sensor is late or the estimate is too short
+            delay = self.min_interval
+        return min(delay, self.max_interval)
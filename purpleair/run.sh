@@ -1,10 +1,6 @@
 #!/bin/bash
 
-DELAY=1800 # 30 minutes
-
-while (true); do
-    echo "$(date) Fetching Purple Air data"
-    python3 airquality.py
-    echo "$(date) sleeping $DELAY seconds"
-    sleep $DELAY
-done
+# airquality.py polls in a loop, adapting its interval to how often the
+# sensors report between POLL_MIN_INTERVAL and POLL_MAX_INTERVAL seconds
+echo "$(date) Polling Purple Air data"
+exec python3 airquality.py
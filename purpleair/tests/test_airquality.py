@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import Mock, patch
+import requests
+
+from airquality import FIELDS, purpleair_session, run_polling
+
+LAST_SEEN = 1_700_000_000
+
+
+def response(payload):
+    resp = Mock()
+    resp.json.return_value = payload
+    return resp
+
+
+def sensors(last_seen):
+    return {"time_stamp": last_seen + 5, "fields": ["sensor_index"] + FIELDS,
+            "data": [[1, "Backyard", last_seen, 1.0, 5.0, 9.0, 6.0, 40.0]]}
+
+
+class TestRunPolling(unittest.TestCase):
+
+    def setUp(self):
+        self.session = Mock()
+        self.api_session = Mock()
+        self.api_session.post.return_value = response({"success": True})
+        self.sleeps = []
+
+    def run_polls(self, payloads, **kwargs):
+        self.session.get.side_effect = payloads
+        with patch('builtins.print'), patch('traceback.print_exc'):
+            run_polling(self.session, self.api_session, "https://purpleair/sensors", {}, "purpleair",
+                        clock=lambda: LAST_SEEN, sleep=self.sleeps.append, max_polls=len(payloads), **kwargs)
+
+    def test_malformed_payload_doesnt_stop_polling(self):
+        """Test that a response missing its columns is logged and the next poll still writes"""
+        self.run_polls([response({"data": [[1]]}),
+                        requests.exceptions.ConnectionError("down"),
+                        response(sensors(LAST_SEEN))])
+
+        self.assertEqual(self.session.get.call_count, 3)
+        self.assertEqual(len(self.sleeps), 3)
+        points = self.api_session.post.call_args[1]['json']['data_points']
+        self.assertLessEqual({"pm25", "pm25_epa"}, {field for point in points for field in point["fields"]})
+        # The PurpleAir session carries the API key, it never goes to our API
+        self.session.post.assert_not_called()
+
+    def test_once_exits_on_error(self):
+        """Test that --once still reports a failed poll through its exit status"""
+        with self.assertRaises(SystemExit):
+            self.run_polls([response({"fields": [], "data": [[1]]})], once=True)
+
+
+class TestPurpleAirSession(unittest.TestCase):
+
+    def test_only_purpleair_session_has_key(self):
+        """Test that the API key is only set on the session for PurpleAir requests"""
+        with patch('airquality.get_api_key', return_value="KEY"):
+            session = purpleair_session()
+        self.assertEqual(session.headers["X-API-Key"], "KEY")
+        self.assertNotIn("X-API-Key", requests.Session().headers)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+
+from aqi import (AqiEngine, aqi, aqi_array, day_average_array, epa_correct, epa_correct_array,
+                 hourly_means, nowcast, nowcast_array)
+
+START = 1_700_000_000 // 3600 * 3600
+
+
+class TestAqi(unittest.TestCase):
+
+    def test_breakpoints(self):
+        """Test AQI at the 2024 PM2.5 breakpoints and the cap"""
+        self.assertEqual([aqi(c) for c in [0.0, 9.0, 9.1, 35.4, 35.5, 325.4, 600.0]],
+                         [0, 50, 51, 100, 101, 500, 500])
+        self.assertEqual(aqi(9.09), 50)
+
+    def test_epa_correction(self):
+        """Test the EPA correction in its low range and that it never goes negative"""
+        self.assertAlmostEqual(epa_correct(20.0, 40.0), 0.524 * 20 - 0.0862 * 40 + 5.75)
+        self.assertEqual(epa_correct(0.0, 100.0), 0.0)
+
+    def test_nowcast(self):
+        """Test NowCast weighting and the two-of-three-hours rule"""
+        self.assertEqual(nowcast([10.0, 10.0, None]), 10.0)
+        self.assertIsNone(nowcast([10.0, None, None, 10.0]))
+        # min/max = 0.5, so the previous hour weighs half as much
+        self.assertAlmostEqual(nowcast([20.0, 10.0]), (20.0 + 0.5 * 10.0) / 1.5)
+
+    def test_vectorized_matches_scalar(self):
+        """Test that the NumPy batch functions agree with the per-reading ones"""
+        rng = np.random.default_rng(1)
+        pm, rh = rng.uniform(0, 400, 500), rng.uniform(0, 100, 500)
+        np.testing.assert_allclose(epa_correct_array(pm, rh), [epa_correct(a, b) for a, b in zip(pm, rh)])
+
+        concentrations = rng.uniform(0, 600, 500)
+        self.assertEqual(list(aqi_array(concentrations)), [aqi(c) for c in concentrations])
+
+    def test_engine_matches_batch(self):
+        """Test that the incremental engine and the batch path give the same hourly results"""
+        rng = np.random.default_rng(2)
+        timestamps = START + np.cumsum(rng.choice([120, 120, 120, 5400], 2000))
+        values = rng.uniform(0, 80, 2000)
+
+        engine = AqiEngine()
+        by_hour = {}
+        for timestamp, value in zip(timestamps, values):
+            by_hour[int(timestamp) // 3600 * 3600] = engine.add(int(timestamp), value)
+
+        hours, means = hourly_means(timestamps, values)
+        for hour, current, day in zip(hours, nowcast_array(means), day_average_array(means)):
+            fields = by_hour.get(int(hour))
+            if fields is None:
+                continue
+            self.assertEqual("pm25_nowcast" in fields, not np.isnan(current))
+            self.assertEqual("pm25_24h" in fields, not np.isnan(day))
+            if "pm25_nowcast" in fields:
+                self.assertAlmostEqual(fields["pm25_nowcast"], current, places=2)
+            if "pm25_24h" in fields:
+                self.assertAlmostEqual(fields["pm25_24h"], day, places=2)
+
+    def test_engine_ignores_repeated_reading(self):
+        """Test that a reading seen again after a failed write isn't counted twice"""
+        engine = AqiEngine()
+        engine.add(START, 10.0)
+        engine.add(START + 60, 20.0)
+        engine.add(START + 60, 20.0)
+        self.assertEqual(engine.hours[START], [30.0, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from unittest.mock import Mock, patch
+import datetime
+import os
+import tempfile
+import numpy as np
+
+from backfill import (BackfillWatermarks, HISTORY_FIELDS, backfill_sensor, chunk_ranges, history_columns,
+                      history_points)
+
+START = 1_700_000_000 // 3600 * 3600
+
+
+def history(rows):
+    return {"fields": ["time_stamp"] + HISTORY_FIELDS, "data": rows}
+
+
+def new_context():
+    return {"timestamps": np.array([]), "values": np.array([])}
+
+
+class TestHistory(unittest.TestCase):
+
+    def test_columns_sorted_with_nan(self):
+        """Test that rows come back as time-sorted float columns with NaN for nulls"""
+        columns = history_columns(history([
+            [START + 600, 1.0, 2.0, 3.0, 4.0, None],
+            [START, 1.5, 2.5, 3.5, 4.5, 40.0],
+        ]))
+        self.assertEqual(columns["time_stamp"].tolist(), [START, START + 600])
+        self.assertEqual(columns["pm2.5_atm"].tolist(), [2.5, 2.0])
+        self.assertTrue(np.isnan(columns["humidity"][1]))
+        self.assertIsNone(history_columns(history([])))
+
+    def test_points_skip_missing_fields(self):
+        """Test that a reading without humidity gets no EPA or AQI fields"""
+        columns = history_columns(history([[START, 1.0, 2.0, 3.0, 4.0, None]]))
+        points = history_points(columns, {"host": "Backyard"}, new_context())
+
+        self.assertEqual(points[0]["fields"], {"pm10": 1.0, "pm25": 2.0, "pm100": 3.0})
+
+    def test_aqi_spans_chunks(self):
+        """Test that the 24 hour AQI carries over the previous chunk's readings"""
+        context = new_context()
+        rows = [[START + i * 600, 1.0, 2.0, 3.0, 20.0, 40.0] for i in range(24 * 6)]
+        first = history_points(history_columns(history(rows[:12 * 6])), {}, context)
+        second = history_points(history_columns(history(rows[12 * 6:])), {}, context)
+
+        self.assertNotIn("aqi_24h", first[-1]["fields"])
+        self.assertEqual(second[-1]["fields"]["aqi_24h"], 58)
+        self.assertIsInstance(second[-1]["fields"]["aqi_24h"], int)
+
+    def test_readings_without_value_at_the_edges(self):
+        """Test that readings without humidity before or after the others don't borrow other hours' AQI"""
+        rows = [[START - 3600, 1.0, 2.0, 3.0, 4.0, None]]
+        rows += [[START + i * 600, 1.0, 2.0, 3.0, 20.0 + i, 40.0] for i in range(3 * 6)]
+        rows += [[START + 5 * 3600, 1.0, 2.0, 3.0, None, 40.0]]
+        points = history_points(history_columns(history(rows)), {}, new_context())
+
+        self.assertEqual(len(points), len(rows))
+        self.assertNotIn("pm25_nowcast", points[0]["fields"])
+        self.assertNotIn("pm25_epa", points[-1]["fields"])
+        # Two hours without readings, the NowCast needs 2 of the last 3
+        self.assertNotIn("pm25_nowcast", points[-1]["fields"])
+        self.assertIn("pm25_nowcast", points[-2]["fields"])
+
+    def test_resume_seeds_previous_day(self):
+        """Test that a resumed backfill has the 24 hour AQI from its first reading"""
+        rows = [[START + i * 600, 1.0, 2.0, 3.0, 20.0, 40.0] for i in range(36 * 6)]
+        resume_at = START + 24 * 3600
+
+        def get(url, params):
+            response = Mock()
+            response.json.return_value = history([row for row in rows
+                                                  if params["start_timestamp"] <= row[0] <= params["end_timestamp"]])
+            return response
+
+        session = Mock()
+        session.get.side_effect = get
+        with tempfile.TemporaryDirectory() as directory, \
+                patch("backfill.write_data_points") as write, patch("builtins.print"):
+            watermarks = BackfillWatermarks(os.path.join(directory, "backfill.json"))
+            watermarks.update("187589", resume_at - 1)
+            api_session = Mock()
+            backfill_sensor(session, api_session, "purpleair", "187589", "Backyard", START, rows[-1][0] + 1, 10,
+                            watermarks)
+
+        self.assertIs(write.call_args_list[0][0][0], api_session)
+        points = write.call_args_list[0][0][2]
+        self.assertEqual(points[0]["time"], datetime.datetime.fromtimestamp(
+            resume_at, tz=datetime.timezone.utc).isoformat())
+        self.assertEqual(points[0]["fields"]["aqi_24h"], 58)
+
+    def test_chunk_ranges(self):
+        """Test that ranges are split at the history API's maximum length"""
+        day = 24 * 3600
+        self.assertEqual(chunk_ranges(0, 7 * day, 3), [(0, 3 * day), (3 * day, 6 * day), (6 * day, 7 * day)])
+
+
+class TestBackfillWatermarks(unittest.TestCase):
+
+    def test_persisted_and_only_moves_forward(self):
+        """Test that the watermark survives a restart and never goes back"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "backfill.json")
+            watermarks = BackfillWatermarks(path)
+            watermarks.update("187589", 200)
+            watermarks.update("187589", 100)
+
+            self.assertEqual(BackfillWatermarks(path).get(187589), 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import requests
+
+from fake_sensor import FakeSensor
+from local import LocalSmoother, TimeWindow, local_url, run_local
+
+
+def reading(pm25_a, pm25_b):
+    return {"pm1_0_atm": 1.0, "pm1_0_atm_b": 1.0, "pm2_5_atm": pm25_a, "pm2_5_atm_b": pm25_b,
+            "pm10_0_atm": 3.0, "pm10_0_atm_b": 3.0}
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestTimeWindow(unittest.TestCase):
+
+    def test_mean_of_window(self):
+        """Test that values drop out once they are older than the window"""
+        window = TimeWindow(60)
+        self.assertIsNone(window.mean(1000))
+        for time, value in [(1000, 1.0), (1030, 2.0), (1060, 3.0)]:
+            window.append(time, value)
+        self.assertEqual(window.mean(1060), 2.5)
+
+        window.append(1065, 10.0)
+        self.assertEqual(window.mean(1065), 5.0)
+        self.assertIsNone(window.mean(1200))
+
+
+class TestLocalSmoother(unittest.TestCase):
+
+    def test_windows_average_both_channels(self):
+        """Test that each window averages A and B and the 10 minute window keeps older readings"""
+        smoother = LocalSmoother()
+        smoother.add(reading(20.0, 22.0), 1000)
+        smoother.add(reading(4.0, 6.0), 1030)
+        smoother.add(reading(4.0, 6.0), 1060)
+
+        fields = smoother.fields(1060)
+        self.assertEqual(fields["pm25"], 5.0)
+        self.assertEqual(fields["pm25_10m"], 10.33)
+        self.assertEqual(fields["pm10"], 1.0)
+
+    def test_window_is_independent_of_poll_interval(self):
+        """Test that a minute is a minute whether readings arrive every 5 or 30 seconds"""
+        fast, slow = LocalSmoother(), LocalSmoother()
+        for time in range(1000, 1300, 5):
+            fast.add(reading(float(time), float(time)), time)
+        for time in range(1000, 1300, 30):
+            slow.add(reading(float(time), float(time)), time)
+
+        self.assertEqual(fast.fields(1295)["pm25"], 1267.5)
+        self.assertEqual(slow.fields(1270)["pm25"], 1255.0)
+
+    def test_missing_channel(self):
+        """Test that a sensor without a B channel uses channel A alone"""
+        smoother = LocalSmoother()
+        smoother.add({"pm2_5_atm": 8.0}, 1000)
+
+        self.assertEqual(smoother.fields(1000), {"pm25": 8.0, "pm25_10m": 8.0})
+
+
+class TestRunLocal(unittest.TestCase):
+
+    def test_polls_fake_sensor_and_writes_each_minute(self):
+        """Test that the local loop writes one smoothed point per write interval"""
+        clock = FakeClock()
+        written = []
+        readings = [reading(10.0, 12.0)] * 13 + [reading(30.0, 32.0)] * 12
+
+        with FakeSensor(readings) as sensor, requests.Session() as session:
+            run_local(session, local_url(sensor.url), written.extend, poll_interval=5, write_interval=60,
+                      clock=clock, sleep=clock.sleep, max_polls=25)
+            self.assertEqual(sensor.request_count, 25)
+
+        self.assertEqual(len(written), 2)
+        self.assertEqual(written[0]["tags"]["host"], "PurpleAir-fake")
+        self.assertEqual(written[0]["fields"]["pm25"], 11.0)
+        self.assertEqual(written[1]["fields"]["pm25"], 31.0)
+        self.assertEqual(written[1]["fields"]["pm25_10m"], 20.6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+import math
+import time
+from datetime import datetime
+
+import statefile
+
+CHECKPOINT_FMT = '%Y-%m-%d %H:%M:%S'
+
+
+def job_key(job):
+    site, detail_key, begin, end = job
+    return '%s|%s|%s|%s' % (site.site_id, detail_key, begin.strftime(CHECKPOINT_FMT), end.strftime(CHECKPOINT_FMT))
+
+
+class BackfillCheckpoint:
+    """
+    The planned range of a backfill and the chunks already written, persisted
+    so an interrupted or quota-limited backfill picks up where it stopped.
+    A `read_only` checkpoint (dry runs) is loaded but never saved.
+    """
+
+    def __init__(self, path, read_only=False):
+        self.path = path
+        self.read_only = read_only
+        self.begin = self.end = self.granularity = None
+        self._completed = set()
+
+        state = statefile.load(path)
+        if state:
+            self.begin = datetime.strptime(state['begin'], CHECKPOINT_FMT)
+            self.end = datetime.strptime(state['end'], CHECKPOINT_FMT)
+            self.granularity = state['granularity']
+            self._completed = set(state['completed'])
+
+    def plan(self, begin, end, granularity):
+        """Start a new plan unless it's the one already checkpointed"""
+        if (begin, granularity) != (self.begin, self.granularity) or (end is not None and end != self.end):
+            self.begin, self.end, self.granularity = begin, end or datetime.now(), granularity
+            self._completed = set()
+            self.save()
+
+    def assign_legacy_chunks(self, site_id):
+        """Chunks checkpointed before job keys carried a site id belong to `site_id`"""
+        self._completed = {key if key.count('|') == 3 else '%s|%s' % (site_id, key) for key in self._completed}
+
+    def is_done(self, job):
+        return job_key(job) in self._completed
+
+    def mark_done(self, job):
+        self._completed.add(job_key(job))
+        self.save()
+
+    def save(self):
+        if self.read_only:
+            return
+        statefile.save(self.path, dict(
+            begin=self.begin.strftime(CHECKPOINT_FMT),
+            end=self.end.strftime(CHECKPOINT_FMT),
+            granularity=self.granularity,
+            completed=sorted(self._completed),
+        ), indent=2)
+
+
+class BackfillProgress:
+    """Prints progress and an ETA that accounts for the daily quota"""
+
+    def __init__(self, total, done, quota, clock=time.monotonic):
+        self.total = total
+        self.done = done
+        self.quota = quota
+        self._clock = clock
+        self._started = clock()
+        self._done_at_start = done
+
+    def chunk_done(self):
+        self.done += 1
+        print(self.status())
+
+    def status(self):
+        remaining = self.total - self.done
+        status = '[backfill] %d/%d chunks (%.1f%%)' % (self.done, self.total, 100.0 * self.done / self.total)
+
+        elapsed = self._clock() - self._started
+        finished_now = self.done - self._done_at_start
+        if remaining and finished_now and elapsed > 0:
+            rate = finished_now / elapsed
+            if remaining <= self.quota.remaining:
+                status += ' | ETA %s' % format_duration(remaining / rate)
+            else:
+                # Each chunk costs one request; the rest has to wait for later days' quota
+                days = math.ceil((remaining - self.quota.remaining) / self.quota.limit)
+                status += ' | ETA %d more day(s), quota-bound' % days
+
+        return status + ' | %d requests left today' % self.quota.remaining
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return '%dh%02dm' % (hours, minutes)
+    if minutes:
+        return '%dm%02ds' % (minutes, seconds)
+    return '%ds' % seconds
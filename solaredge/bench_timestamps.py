@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the per-value timestamp path against LocalTimeParser on a year of
+quarter-hour values for five meters:
+
+    python bench_timestamps.py [--year 2023] [--repeat 3]
+"""
+
+import argparse
+import calendar
+import time
+from datetime import datetime, timedelta
+
+from main import SE_TIMEZONE, _parse_solaredge_timestamp, date_in_local_timezone
+from timestamps import LocalTimeParser
+
+METERS = 5
+
+
+def generate_values(year):
+    values = []
+    current = datetime(year, 1, 1)
+    while current.year == year:
+        values.append({'date': current.strftime('%Y-%m-%d %H:%M:%S'), 'value': 100.0})
+        current += timedelta(minutes=15)
+    return values
+
+
+def per_value_path(values):
+    """What the collector did before: strptime/localize/astimezone per value"""
+    epochs, year_months = [], []
+    for entry in values:
+        timestamp = _parse_solaredge_timestamp(entry['date'])
+        local_dt = date_in_local_timezone(timestamp)
+        epochs.append(calendar.timegm(timestamp.utctimetuple()))
+        year_months.append((local_dt.year, local_dt.month))
+    return epochs, year_months
+
+
+def batch_path(values):
+    parsed = LocalTimeParser(SE_TIMEZONE).parse_values(values)
+    return parsed.epochs, parsed.year_months
+
+
+def best_of(fn, meters, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for values in meters:
+            result = fn(values)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SolarEdge timestamp parsing')
+    parser.add_argument('--year', type=int, default=2023)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    meters = [generate_values(args.year) for _ in range(METERS)]
+    count = sum(len(values) for values in meters)
+
+    old_time, old_result = best_of(per_value_path, meters, args.repeat)
+    new_time, new_result = best_of(batch_path, meters, args.repeat)
+
+    if old_result != new_result:
+        raise SystemExit('Results differ between the per-value and batch paths')
+
+    print('%d values (%d meters x %d)' % (count, METERS, count // METERS))
+    print('per-value: %.3fs (%.0f values/s)' % (old_time, count / old_time))
+    print('batch:     %.3fs (%.0f values/s)' % (new_time, count / new_time))
+    print('speedup:   %.1fx' % (old_time / new_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import requests
+from requests.adapters import HTTPAdapter
+
+BASE_URL = 'https://monitoringapi.solaredge.com'
+
+
+def create_session(pool_size):
+    """One keep-alive connection pool shared by the SolarEdge client and the API writer"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class SolarEdgeClient:
+    """
+    The subset of the SolarEdge monitoring API the collector uses, with the
+    same method signatures as the `solaredge` package but sending every
+    request over `session` instead of opening a new connection each time.
+
+    The token is per account, so one client serves every site of the account.
+    """
+
+    def __init__(self, token, session):
+        self.token = token
+        self.session = session
+
+    def _get(self, site_id, endpoint, **params):
+        params['api_key'] = self.token
+        resp = self.session.get('%s/site/%s/%s' % (BASE_URL, site_id, endpoint), params=params)
+        resp.raise_for_status()
+        return resp.json()
+
+    def get_inventory(self, site_id):
+        return self._get(site_id, 'inventory')
+
+    def iter_equipment_data(self, site_id, serial, start_time, end_time, chunk_size=64 * 1024):
+        """
+        The raw body of an inverter's technical data as a stream of byte chunks,
+        for equipment.iter_array_items(). The range can be at most one week.
+        """
+        params = dict(startTime=start_time, endTime=end_time, api_key=self.token)
+        url = '%s/equipment/%s/%s/data' % (BASE_URL, site_id, serial)
+        with self.session.get(url, params=params, stream=True) as resp:
+            resp.raise_for_status()
+            yield from resp.iter_content(chunk_size)
+
+    def get_energy(self, site_id, start_date, end_date, time_unit='DAY'):
+        return self._get(site_id, 'energy', startDate=start_date, endDate=end_date, timeUnit=time_unit)
+
+    def get_power(self, site_id, start_time, end_time):
+        return self._get(site_id, 'power', startTime=start_time, endTime=end_time)
+
+    def get_energy_details(self, site_id, start_time, end_time, meters=None, time_unit='DAY'):
+        params = dict(startTime=start_time, endTime=end_time, timeUnit=time_unit)
+        if meters:
+            params['meters'] = meters
+        return self._get(site_id, 'energyDetails', **params)
+
+    def get_power_details(self, site_id, start_time, end_time, meters=None):
+        params = dict(startTime=start_time, endTime=end_time)
+        if meters:
+            params['meters'] = meters
+        return self._get(site_id, 'powerDetails', **params)
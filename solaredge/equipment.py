@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+import codecs
+import json
+
+# The equipment data API returns at most one week per request
+EQUIPMENT_MAX_DAYS_PER_REQUEST = 7
+
+INVERTER_MEASUREMENT = 'solaredge_inverter'
+
+# SolarEdge telemetry key -> field name. Anything not listed here is dropped.
+INVERTER_FIELDS = dict(
+    totalActivePower='power',
+    dcVoltage='dc_voltage',
+    groundFaultResistance='ground_fault_resistance',
+    powerLimit='power_limit',
+    totalEnergy='energy',
+    temperature='temperature',
+    inverterMode='mode',
+    operationMode='operation_mode',
+    vL1To2='v_l1_l2',
+    vL2To3='v_l2_l3',
+    vL3To1='v_l3_l1',
+)
+
+# Keys of the per-phase L1Data/L2Data/L3Data objects, prefixed with the phase
+PHASE_FIELDS = dict(
+    acCurrent='ac_current',
+    acVoltage='ac_voltage',
+    acFrequency='ac_frequency',
+    apparentPower='apparent_power',
+    activePower='active_power',
+    reactivePower='reactive_power',
+    cosPhi='cos_phi',
+)
+PHASES = dict(L1Data='l1_', L2Data='l2_', L3Data='l3_')
+
+_SEPARATORS = ' \t\r\n,'
+
+
+def iter_array_items(chunks, key):
+    """
+    Yield the items of the JSON array named `key` from an iterable of byte
+    chunks, e.g. `response.iter_content()`.
+
+    Items are decoded one at a time as soon as they're complete, so only the
+    current item and the unparsed tail of the last chunk are held in memory,
+    however long the array is. Items are expected to be objects or arrays.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    marker = '"%s"' % key
+    buffer = ''
+    pos = 0
+    in_array = False
+
+    for chunk in chunks:
+        buffer = buffer[pos:] + text.decode(chunk)
+        pos = 0
+
+        if not in_array:
+            start = buffer.find(marker)
+            if start == -1:
+                # The marker may be split across chunks
+                pos = max(0, len(buffer) - len(marker))
+                continue
+            bracket = buffer.find('[', start + len(marker))
+            if bracket == -1:
+                pos = start
+                continue
+            pos = bracket + 1
+            in_array = True
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+                pos += 1
+            if pos == len(buffer):
+                break
+            if buffer[pos] == ']':
+                return
+            try:
+                item, pos_after = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The item continues in the next chunk
+                break
+            yield item
+            pos = pos_after
+
+    if in_array:
+        raise ValueError('Response ended inside the "%s" array' % key)
+
+
+def compact_fields(telemetry):
+    """Flatten one telemetry sample into the fields of INVERTER_FIELDS and PHASE_FIELDS"""
+    fields = {}
+    for key, field in INVERTER_FIELDS.items():
+        value = telemetry.get(key)
+        if value is not None:
+            fields[field] = value
+
+    for phase, prefix in PHASES.items():
+        phase_data = telemetry.get(phase)
+        if not phase_data:
+            continue
+        for key, field in PHASE_FIELDS.items():
+            value = phase_data.get(key)
+            if value is not None:
+                fields[prefix + field] = value
+    return fields
+
+
+def telemetry_points(telemetries, tags, timestamps):
+    """
+    Yield (epoch, point) for every telemetry sample with at least one field.
+    `timestamps` is the site's LocalTimeParser.
+    """
+    for telemetry in telemetries:
+        fields = compact_fields(telemetry)
+        if not fields:
+            continue
+        epoch = timestamps.epoch(telemetry['date'])
+        yield epoch, {
+            "measurement": INVERTER_MEASUREMENT,
+            "tags": tags,
+            "time": epoch * 1000000000,
+            "fields": fields,
+        }
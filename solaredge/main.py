@@ -1,29 +1,45 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-import example_data
-import requests
+import json
+import os
 import secrets
+import sys
+import time
 import pytz
-from collections import defaultdict
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
 
 from datetime import datetime, timedelta
-from solaredge import Solaredge
-
-# update this to your local timezone
-# solaredge timestamps are in the time zone of the site
-SE_TIMEZONE = pytz.timezone("America/Denver")
+from time import sleep
+from backfill import BackfillCheckpoint, BackfillProgress
+from client import SolarEdgeClient, create_session
+from equipment import EQUIPMENT_MAX_DAYS_PER_REQUEST, iter_array_items, telemetry_points
+from ratelimit import DailyQuota, QuotaExceeded, RateLimiter
+from recording import RecordingClient, ReplayClient
+from sites import Site, load_sites
+from timestamps import LocalTimeParser
+from watermarks import Watermarks
+from writer import BatchWriter
+
+# timezone of sites configured without one, see secrets.SITES
+SE_TIMEZONE = pytz.timezone(secrets.DEFAULT_TIMEZONE)
 
 SE_FMT_DATE = '%Y-%m-%d'
 SE_FMT_DATETIME = '%Y-%m-%d %H:%M:%S'
 
 IDB_DATABASE = "solar_edge"
+IDB_WRITE_URL = 'http://api:5000/influx/%s/write' % IDB_DATABASE
 
 # this is the timezone used to store the data in InfluxDB. UTC is usually a good choice.
 IDB_TIMEZONE = pytz.utc
 IDB_FMT = '%Y-%m-%dT%H:%M:%SZ'
 
+DEFAULT_BEGIN_DAYS = 14
+
+# The inverters of a site rarely change, don't spend quota on them every run
+INVENTORY_MAX_AGE = timedelta(days=1)
+
 
 class InfluxKeys:
     def __init__(self, measurement, field='value'):
@@ -51,6 +67,11 @@ energy_measurements_to_keys = dict(
     Purchased=InfluxKeys('energy_import'),  # Import energy from GRID meter
 )
 
+details_measurements_to_keys = dict(
+    energyDetails=energy_measurements_to_keys,
+    powerDetails=power_measurements_to_keys,
+)
+
 def chunked_date_ranges(start: datetime, end: datetime, max_days: int = secrets.MAX_DAYS_PER_REQUEST):
     """
     Split the range from start to end into chunks of `max_days`.
@@ -85,47 +106,84 @@ def _format_timestamp(dt: datetime, fmt: str) -> str:
     return dt.strftime(fmt)
 
 
-def pull_current_power_data(client: Solaredge, begin: datetime, end: datetime):
-    return client.get_power(secrets.solaredge_site_id,
+def watermark_begin(watermarks: Watermarks, site: Site, detail_key: str, default: datetime,
+                    meter_type: str = '') -> datetime:
+    """
+    Where to resume fetching `detail_key` data of `site`: the oldest meter
+    watermark, or the one of `meter_type`, minus the overlap, as a naive
+    site-local datetime. Falls back to `default` when nothing has been written yet.
+    A meter more than WATERMARK_MAX_LAG_DAYS behind the newest one, removed or
+    offline, doesn't pull the range back any further, that gap is left to --backfill.
+    """
+    marks = watermarks.with_prefix(site.watermark_key(detail_key, meter_type))
+    if not marks:
+        return default
+    oldest = max(min(marks), max(marks) - timedelta(days=secrets.WATERMARK_MAX_LAG_DAYS))
+    if oldest > min(marks):
+        print("A %s meter of site %s is more than %d days behind, not refetching before %s"
+              % (detail_key, site.site_id, secrets.WATERMARK_MAX_LAG_DAYS, oldest))
+    begin = oldest.astimezone(site.tz).replace(tzinfo=None)
+    return begin - timedelta(minutes=secrets.WATERMARK_OVERLAP_MINUTES)
+
+
+def legacy_site(sites):
+    """The site that state from before SOLAREDGE_SITES belongs to: SOLAREDGE_SITE_ID, or the first site"""
+    return next((site for site in sites if site.site_id == secrets.solaredge_site_id), sites[0])
+
+
+def migrate_legacy_watermarks(watermarks: Watermarks, site: Site):
+    """
+    Move watermarks keyed "detail_key:meter_type", from before they carried a
+    site id, to `site`, so its sync carries on where it stopped. Points
+    written back then have no site_id tag, refetching any of them would add
+    a second, tagged series counted twice by sum() queries. That includes
+    the overlap, so the moved watermarks are advanced by it once.
+    """
+    overlap = timedelta(minutes=secrets.WATERMARK_OVERLAP_MINUTES)
+    legacy_keys = [key for key in watermarks.keys() if key.count(':') == 1]
+    for key in legacy_keys:
+        detail_key, meter_type = key.split(':')
+        watermarks.update(site.watermark_key(detail_key, meter_type), watermarks.pop(key) + overlap)
+    if legacy_keys:
+        watermarks.save()
+
+
+def pull_current_power_data(client: SolarEdgeClient, site_id: str, begin: datetime, end: datetime):
+    return client.get_power(site_id,
                             _format_timestamp(begin, SE_FMT_DATETIME),
                             _format_timestamp(end, SE_FMT_DATETIME))
 
 
-def pull_power_details_data(client: Solaredge, begin: datetime, end: datetime):
-    return client.get_power_details(secrets.solaredge_site_id,
+def pull_power_details_data(client: SolarEdgeClient, site_id: str, begin: datetime, end: datetime):
+    return client.get_power_details(site_id,
                                     _format_timestamp(begin, SE_FMT_DATETIME),
                                     _format_timestamp(end, SE_FMT_DATETIME))
 
 
-def pull_energy_data(client: Solaredge, begin: datetime, end: datetime, timeunit: str):
-    return client.get_energy(secrets.solaredge_site_id,
+def pull_energy_data(client: SolarEdgeClient, site_id: str, begin: datetime, end: datetime, timeunit: str):
+    return client.get_energy(site_id,
                              _format_timestamp(begin, SE_FMT_DATE),
                              _format_timestamp(end, SE_FMT_DATE),
                              time_unit=timeunit)
 
 
-def pull_energy_details_data(client: Solaredge, begin: datetime, end: datetime, timeunit: str):
-    return client.get_energy_details(secrets.solaredge_site_id,
+def pull_energy_details_data(client: SolarEdgeClient, site_id: str, begin: datetime, end: datetime,
+                             timeunit: str):
+    return client.get_energy_details(site_id,
                                      _format_timestamp(begin, SE_FMT_DATETIME),
                                      _format_timestamp(end, SE_FMT_DATETIME),
                                      None,
                                      time_unit=timeunit)
 
 
-def parse_details_data(details, detail_key):
-    data_points = defaultdict(list)
+def parse_details_data(details, detail_key, timestamps: LocalTimeParser):
+    """Returns the ParsedValues of every meter that has at least one value"""
+    data_points = {}
 
     for meter in details[detail_key]['meters']:
-        meter_type = meter['type']
-
-        for value in meter['values']:
-            if value.get('value') is None:
-                continue
-
-            data_points[meter_type].append({
-                'timestamp': _parse_solaredge_timestamp(value['date']),
-                'value': value['value']
-            })
+        parsed = timestamps.parse_values(meter['values'])
+        if parsed.epochs:
+            data_points[meter['type']] = parsed
     return data_points
 
 
@@ -157,96 +215,339 @@ def parse_current_power_data(power_data):
     return data_points
 
 
-def write_data(data, measurement, tags, field_name, verbose):
-    data_points = []
-    for d in data:
-        local_dt = date_in_local_timezone(d['timestamp'])
-        month, year = local_dt.month, local_dt.year
+def interleave(*job_lists):
+    jobs = []
+    for group in zip_longest(*job_lists):
+        jobs.extend(job for job in group if job is not None)
+    return jobs
+
+
+def schedule_detail_jobs(site: Site, energy_begin: datetime, power_begin: datetime, end: datetime):
+    """
+    Returns (site, detail_key, chunk_begin, chunk_end) jobs with energy and
+    power chunks interleaved, so both data types progress at the same time.
+    """
+    energy_jobs = [(site, 'energyDetails', b, e) for b, e in chunked_date_ranges(energy_begin, end)]
+    power_jobs = [(site, 'powerDetails', b, e) for b, e in chunked_date_ranges(power_begin, end)]
+    return interleave(energy_jobs, power_jobs)
+
+
+def fetch_details(client: SolarEdgeClient, limiter: RateLimiter, site: Site, detail_key: str,
+                  begin: datetime, end: datetime, granularity: str):
+    with limiter:
+        if detail_key == 'energyDetails':
+            return pull_energy_details_data(client, site.site_id, begin, end, granularity)
+        return pull_power_details_data(client, site.site_id, begin, end)
 
-        measurement_tags = tags.copy()
 
-        measurement_tags['year'] = year
-        measurement_tags['month'] = month
+def sync_details(client: SolarEdgeClient, limiter: RateLimiter, jobs, watermarks: Watermarks,
+                 writer: BatchWriter, granularity: str, verbose: bool, on_chunk_written=None):
+    """
+    Fetch all jobs, of every site, concurrently under the account's `limiter`,
+    parsing each response and
+    handing its points to `writer` while the following requests are still
+    in flight.
+
+    Responses are handled in job order and watermarks are only advanced once
+    the writer has sent a chunk's points, so a watermark never moves past a
+    chunk that failed to download or write. `on_chunk_written(job)` is
+    called at the same point.
+
+    Requests don't reach the limiter in job order, so when the quota runs
+    out the chunks that did get fetched are still written, except those that
+    follow a refused chunk of the same site and data type. QuotaExceeded is re-raised
+    once that's done.
+    """
+    with ThreadPoolExecutor(max_workers=secrets.MAX_CONCURRENT_REQUESTS) as pool:
+        futures = [
+            (job, pool.submit(fetch_details, client, limiter, *job, granularity))
+            for job in jobs
+        ]
+        quota_error = None
+        refused = set()
+        try:
+            for job, future in futures:
+                site, detail_key = job[:2]
+                if (site.site_id, detail_key) in refused:
+                    continue
+                try:
+                    response = future.result()
+                except QuotaExceeded as e:
+                    quota_error = quota_error or e
+                    refused.add((site.site_id, detail_key))
+                    continue
+
+                details = parse_details_data(response, detail_key, site.timestamps)
+
+                data_points = []
+                chunk_marks = {}
+                for meter_type, data in details.items():
+                    influx_data = details_measurements_to_keys[detail_key][meter_type]
+                    data_points.extend(create_data_points(
+                        data,
+                        influx_data.measurement,
+                        dict(influx_data.tags, **site.tags),
+                        influx_data.field,
+                        verbose
+                    ))
+                    last_written = datetime.fromtimestamp(max(data.epochs), tz=IDB_TIMEZONE)
+                    chunk_marks[site.watermark_key(detail_key, meter_type)] = last_written
+
+                def chunk_written(job=job, marks=chunk_marks):
+                    advance_watermarks(watermarks, marks)
+                    if on_chunk_written is not None:
+                        on_chunk_written(job)
+
+                writer.add(data_points, on_written=chunk_written)
+        finally:
+            for _, future in futures:
+                future.cancel()
+
+    if quota_error is not None:
+        raise quota_error
+
+
+def advance_watermarks(watermarks: Watermarks, marks: dict):
+    for key, timestamp in marks.items():
+        watermarks.update(key, timestamp)
+    watermarks.save()
+
+
+def site_inverters(client: SolarEdgeClient, limiter: RateLimiter, site: Site):
+    """Serial numbers of the site's inverters, from an inventory cached in STATE_DIR"""
+    path = os.path.join(secrets.STATE_DIR, 'inventory_%s.json' % site.site_id)
+    if os.path.exists(path) and datetime.now() - datetime.fromtimestamp(os.path.getmtime(path)) < INVENTORY_MAX_AGE:
+        with open(path) as f:
+            inventory = json.load(f)
+    else:
+        with limiter:
+            inventory = client.get_inventory(site.site_id)
+        os.makedirs(secrets.STATE_DIR, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(inventory, f)
+    return [inverter['SN'] for inverter in inventory['Inventory']['inverters']]
+
+
+def sync_equipment(client: SolarEdgeClient, limiter: RateLimiter, sites, watermarks: Watermarks,
+                   writer: BatchWriter, begin, end, verbose: bool):
+    """
+    Stream per-inverter technical data into `writer` one week at a time.
+
+    Responses are parsed a telemetry sample at a time straight off the socket
+    and every point goes to the writer as soon as it's built, so memory is
+    bounded by the write batch size rather than by the length of the range.
+    An inverter's watermark is advanced once a week's points have been written.
+    """
+    for site in sites:
+        for serial in site_inverters(client, limiter, site):
+            tags = dict(site.tags, serial=serial)
+            site_end = end or datetime.now(site.tz).replace(tzinfo=None)
+            site_begin = begin or watermark_begin(
+                watermarks, site, 'equipment', site_end - timedelta(days=DEFAULT_BEGIN_DAYS), serial)
+
+            for chunk_begin, chunk_end in chunked_date_ranges(site_begin, site_end, EQUIPMENT_MAX_DAYS_PER_REQUEST):
+                last_epoch = None
+                with limiter:
+                    chunks = client.iter_equipment_data(site.site_id, serial,
+                                                        _format_timestamp(chunk_begin, SE_FMT_DATETIME),
+                                                        _format_timestamp(chunk_end, SE_FMT_DATETIME))
+                    telemetries = iter_array_items(chunks, 'telemetries')
+                    for epoch, point in telemetry_points(telemetries, tags, site.timestamps):
+                        if verbose:
+                            print(point)
+                        writer.add((point,))
+                        last_epoch = epoch if last_epoch is None else max(last_epoch, epoch)
+
+                if last_epoch is not None:
+                    marks = {site.watermark_key('equipment', serial):
+                             datetime.fromtimestamp(last_epoch, tz=IDB_TIMEZONE)}
+                    writer.add((), on_written=lambda marks=marks: advance_watermarks(watermarks, marks))
+
+
+def create_data_points(data, measurement, tags, field_name, verbose):
+    """
+    Build API points from a meter's ParsedValues. Times are sent as epoch
+    nanoseconds, the API's default write precision.
+    """
+    data_points = []
+    # Points of the same month share one tags dict instead of a copy each
+    tags_by_month = {}
+    for epoch, year_month, value in zip(data.epochs, data.year_months, data.values):
+        measurement_tags = tags_by_month.get(year_month)
+        if measurement_tags is None:
+            measurement_tags = dict(tags, year=year_month[0], month=year_month[1])
+            tags_by_month[year_month] = measurement_tags
 
         dp = {
             "measurement": measurement,
             "tags": measurement_tags,
-            "time": _format_timestamp(d['timestamp'], IDB_FMT),
+            "time": epoch * 1000000000,
             "fields": {
-                field_name: d['value']
+                field_name: value
             }
         }
         if verbose:
             print(dp)
 
         data_points.append(dp)
-        
-    requests.post('http://api:5000/influx/solar_edge/write', json=dict(data_points=data_points, verbose=False))
 
+    return data_points
+
+
+def run_backfill(client: SolarEdgeClient, limiter: RateLimiter, watermarks: Watermarks, sites,
+                 begin, end, granularity: str, wait_for_quota: bool, verbose: bool, dry_run: bool,
+                 session=None):
+    """
+    Import a long range of every site chunk by chunk, checkpointing finished chunks so the
+    backfill can be stopped, or run out of daily quota, and resume later.
+    """
+    checkpoint = BackfillCheckpoint(os.path.join(secrets.STATE_DIR, 'backfill.json'), read_only=dry_run)
+    checkpoint.assign_legacy_chunks(legacy_site(sites).site_id)
+    if begin is None and checkpoint.begin is None:
+        print("Nothing to resume, start a backfill with --begin")
+        return
+    checkpoint.plan(begin or checkpoint.begin, end, granularity)
+
+    jobs = interleave(*(
+        schedule_detail_jobs(site, checkpoint.begin, checkpoint.begin, checkpoint.end) for site in sites
+    ))
+    remaining = [job for job in jobs if not checkpoint.is_done(job)]
+    progress = BackfillProgress(len(jobs), len(jobs) - len(remaining), limiter.quota)
+    print("Backfilling %s to %s: %d chunks, %d already done" % (
+        checkpoint.begin, checkpoint.end, len(jobs), len(jobs) - len(remaining)))
+
+    def chunk_written(job):
+        checkpoint.mark_done(job)
+        progress.chunk_done()
+
+    while remaining:
+        with BatchWriter(IDB_WRITE_URL, secrets.WRITE_BATCH_SIZE, session=session, verbose=verbose,
+                         dry_run=dry_run) as writer:
+            try:
+                sync_details(client, limiter, remaining, watermarks, writer, granularity, verbose,
+                             on_chunk_written=chunk_written)
+            except QuotaExceeded as e:
+                print("Stopping for today: %s" % e)
+
+        remaining = [job for job in remaining if not checkpoint.is_done(job)]
+        if not remaining or not wait_for_quota or limiter.quota.remaining:
+            break
+
+        tomorrow = (datetime.now() + timedelta(days=1)).replace(hour=0, minute=1, second=0, microsecond=0)
+        print("Waiting until %s for the quota to reset" % tomorrow)
+        sleep((tomorrow - datetime.now()).total_seconds())
+
+    if remaining:
+        print("Backfill paused with %d chunks left, run it again to resume" % len(remaining))
+    else:
+        print("Backfill complete")
 
-def main():
-    default_begin = (datetime.now() - timedelta(days=14)).strftime('%Y-%m-%d')
 
+def main():
     parser = argparse.ArgumentParser(
         description='Pull data from the SolarEdge API and store it into an InfluxDB database.')
-    parser.add_argument("--begin", type=str, default=default_begin,
-                        help="Begin timestamp in the format YYYY-MM-DD[ hh:mm:ss]")
+    parser.add_argument("--begin", type=str, default=None,
+                        help="Begin timestamp in the format YYYY-MM-DD[ hh:mm:ss]. Defaults to the last "
+                             "written timestamp, or %d days ago on the first run" % DEFAULT_BEGIN_DAYS)
     parser.add_argument("--end", type=str, default=None,
                         help="End timestamp in the format YYYY-MM-DD[ hh:mm:ss]")
     parser.add_argument("-p", "--power", action='store_true',
                         help="Include current power data")
     parser.add_argument("-e", "--energy", action='store_true',
                         help="Include energy data")
+    parser.add_argument("-i", "--inverters", action='store_true',
+                        help="Include per-inverter technical data, one request per inverter and week")
     parser.add_argument("-g", "--granularity", default='QUARTER_OF_AN_HOUR', help="Granularity for energy data",
                         choices=['QUARTER_OF_AN_HOUR', 'HOUR', 'DAY', 'WEEK'])
     parser.add_argument("-v", "--verbose",
                         action='store_true', help="Verbose output")
-    parser.add_argument("-d", "--dry-run", action='store_true', help="Don't pull any actual data from the solaredge api,"
-                                                                     " use example data instead")
+    parser.add_argument("--backfill", action='store_true',
+                        help="Import the whole --begin/--end range in checkpointed chunks, resuming a "
+                             "previous backfill when --begin is omitted")
+    parser.add_argument("--wait-for-quota", action='store_true',
+                        help="With --backfill, wait for the next day's quota instead of stopping")
+    parser.add_argument("-d", "--dry-run", action='store_true',
+                        help="Parse and encode everything but don't write to the API or update the sync state")
+    recording = parser.add_mutually_exclusive_group()
+    recording.add_argument("--record", metavar="DIR",
+                           help="Save every raw API response, gzip compressed, under DIR")
+    recording.add_argument("--replay", metavar="DIR",
+                           help="Serve API responses from a --record directory instead of the SolarEdge API. "
+                                "Without --begin every recorded range is replayed")
     args = parser.parse_args()
 
-    begin = _parse_input_timestamp(args.begin)
-    end = _parse_input_timestamp(args.end) if args.end else datetime.now()
-
-    solaredge_client = Solaredge(secrets.solaredge_token)
+    sites = load_sites(secrets.SITES, secrets.DEFAULT_TIMEZONE)
+    if not sites:
+        parser.error("No sites configured, set SOLAREDGE_SITES or SOLAREDGE_SITE_ID")
+
+    # The quota and concurrency limits are per account, so every site shares one
+    # limiter, and one connection pool serves both the SolarEdge and the write API
+    session = create_session(secrets.MAX_CONCURRENT_REQUESTS)
+    if args.replay:
+        # Recorded responses cost no quota, replay them as fast as possible
+        solaredge_client = ReplayClient(args.replay)
+        limiter = RateLimiter(rate=sys.maxsize, burst=sys.maxsize,
+                              max_concurrent=secrets.MAX_CONCURRENT_REQUESTS, quota=DailyQuota(sys.maxsize))
+    else:
+        solaredge_client = SolarEdgeClient(secrets.solaredge_token, session)
+        if args.record:
+            solaredge_client = RecordingClient(solaredge_client, args.record)
+        limiter = RateLimiter(
+            rate=secrets.REQUESTS_PER_SECOND,
+            burst=secrets.MAX_CONCURRENT_REQUESTS,
+            max_concurrent=secrets.MAX_CONCURRENT_REQUESTS,
+            quota=DailyQuota(secrets.DAILY_QUOTA, os.path.join(secrets.STATE_DIR, 'quota.json')),
+        )
 
+    if args.dry_run:
+        watermarks = Watermarks()
+    else:
+        watermarks = Watermarks(os.path.join(secrets.STATE_DIR, 'watermarks.json'))
+    migrate_legacy_watermarks(watermarks, legacy_site(sites))
+
+    if args.backfill:
+        run_backfill(
+            solaredge_client, limiter, watermarks, sites,
+            _parse_input_timestamp(args.begin) if args.begin else None,
+            _parse_input_timestamp(args.end) if args.end else None,
+            args.granularity, args.wait_for_quota, args.verbose, args.dry_run, session
+        )
+        return
 
-    DEFAULT_SLEEPTIME = 2.0
+    site_jobs = []
+    for site in sites:
+        if args.replay and not args.begin:
+            site_jobs.append([(site,) + job for job in solaredge_client.recorded_jobs(site.site_id)])
+            continue
 
-    # For energy details
-    for chunk_begin, chunk_end in chunked_date_ranges(begin, end):
-        energy_details_data = pull_energy_details_data(
-            solaredge_client, chunk_begin, chunk_end, args.granularity
-        )
-        energy_details = parse_details_data(energy_details_data, 'energyDetails')
-        sleep(DEFAULT_SLEEPTIME)
-        
-        for meter_type, data in energy_details.items():
-            influx_data = energy_measurements_to_keys[meter_type]
-            write_data(
-                data,
-                influx_data.measurement,
-                influx_data.tags,
-                influx_data.field,
-                args.verbose
-            )
-
-    # For power details
-    for chunk_begin, chunk_end in chunked_date_ranges(begin, end):
-        power_details_data = pull_power_details_data(solaredge_client, chunk_begin, chunk_end)
-        sleep(DEFAULT_SLEEPTIME)
-
-        power_details = parse_details_data(power_details_data, 'powerDetails')
-        
-        for meter_type, data in power_details.items():
-            influx_data = power_measurements_to_keys[meter_type]
-            write_data(
-                data,
-                influx_data.measurement,
-                influx_data.tags,
-                influx_data.field,
-                args.verbose
-            )
+        # "now" and the default range are in the site's local time, like the API's timestamps
+        end = _parse_input_timestamp(args.end) if args.end else datetime.now(site.tz).replace(tzinfo=None)
+        if args.begin:
+            energy_begin = power_begin = _parse_input_timestamp(args.begin)
+        else:
+            default_begin = end - timedelta(days=DEFAULT_BEGIN_DAYS)
+            energy_begin = watermark_begin(watermarks, site, 'energyDetails', default_begin)
+            power_begin = watermark_begin(watermarks, site, 'powerDetails', default_begin)
+        site_jobs.append(schedule_detail_jobs(site, energy_begin, power_begin, end))
+    jobs = interleave(*site_jobs)
+
+    started = time.perf_counter()
+    with BatchWriter(IDB_WRITE_URL, secrets.WRITE_BATCH_SIZE, session=session, verbose=args.verbose,
+                     dry_run=args.dry_run) as writer:
+        try:
+            sync_details(solaredge_client, limiter, jobs, watermarks, writer, args.granularity, args.verbose)
+            if args.inverters:
+                sync_equipment(solaredge_client, limiter, sites, watermarks, writer,
+                               _parse_input_timestamp(args.begin) if args.begin else None,
+                               _parse_input_timestamp(args.end) if args.end else None,
+                               args.verbose)
+        except QuotaExceeded as e:
+            print("Stopping early: %s" % e)
+    elapsed = time.perf_counter() - started
+    print("Wrote %d points in %d requests, %d chunks of %d site(s) in %.2fs (%.0f points/s)" % (
+        writer.points_written, writer.requests, len(jobs), len(sites), elapsed,
+        writer.points_written / elapsed if elapsed else 0))
+    session.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from datetime import date
+
+import statefile
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class DailyQuota:
+    """
+    Counts API requests per calendar day, persisted so that every run of the
+    collector shares the same budget. The count is re-read under a file lock
+    before each request, so processes running at the same time (the periodic
+    sync and a backfill) add up rather than overwrite each other's count.
+    """
+
+    def __init__(self, limit, path=None):
+        self.limit = limit
+        self.path = path
+        self.day = date.today().isoformat()
+        self.used = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    @property
+    def remaining(self):
+        with self._lock:
+            self._load()
+            return max(0, self.limit - self.used)
+
+    def _load(self):
+        """Roll over to today and take in requests counted by other processes"""
+        today = date.today().isoformat()
+        if today != self.day:
+            self.day, self.used = today, 0
+
+        state = statefile.load(self.path)
+        if state and state.get('date') == self.day:
+            self.used = max(self.used, state.get('used', 0))
+
+    def consume(self):
+        with self._lock, statefile.locked(self.path):
+            self._load()
+            if self.used >= self.limit:
+                raise QuotaExceeded('Daily quota of %d requests used up for %s' % (self.limit, self.day))
+            self.used += 1
+            if self.path:
+                statefile.save(self.path, dict(date=self.day, used=self.used))
+
+
+class RateLimiter:
+    """
+    Shared limiter for SolarEdge API calls: a token bucket for the request
+    rate, a cap on requests in flight, and the daily quota.
+
+    Use it as a context manager around each request.
+    """
+
+    def __init__(self, rate, burst, max_concurrent, quota: DailyQuota,
+                 clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.quota = quota
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self._in_flight = threading.BoundedSemaphore(max_concurrent)
+
+    def _take_token(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+    def __enter__(self):
+        self._in_flight.acquire()
+        try:
+            self._take_token()
+            self.quota.consume()
+        except BaseException:
+            self._in_flight.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self._in_flight.release()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import os
+from datetime import datetime
+
+
+def _file_name(site_id, start_time, end_time, suffix=None):
+    parts = [str(site_id), start_time, end_time] + ([suffix] if suffix else [])
+    return '_'.join(part.replace(' ', 'T').replace(':', '') for part in parts) + '.json.gz'
+
+
+class RecordingClient:
+    """
+    Wraps a Solaredge client and saves every raw response it returns as
+    gzip compressed JSON, keyed by endpoint and requested range:
+    <directory>/<endpoint>/<site>_<start>_<end>[_<time unit>].json.gz
+
+    Streamed equipment data is saved chunk by chunk as it's consumed, under
+    <directory>/equipment/<site>_<start>_<end>_<serial>.json.gz
+    """
+
+    def __init__(self, client, directory):
+        self.client = client
+        self.directory = directory
+
+    def _save(self, endpoint, file_name, response):
+        path = os.path.join(self.directory, endpoint, file_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, 'wt') as f:
+            json.dump(response, f)
+        return response
+
+    def get_energy_details(self, site_id, start_time, end_time, meters=None, time_unit='DAY'):
+        response = self.client.get_energy_details(site_id, start_time, end_time, meters, time_unit=time_unit)
+        return self._save('energyDetails', _file_name(site_id, start_time, end_time, time_unit), response)
+
+    def get_power_details(self, site_id, start_time, end_time, meters=None):
+        response = self.client.get_power_details(site_id, start_time, end_time, meters)
+        return self._save('powerDetails', _file_name(site_id, start_time, end_time), response)
+
+    def get_inventory(self, site_id):
+        return self._save('inventory', '%s.json.gz' % site_id, self.client.get_inventory(site_id))
+
+    def iter_equipment_data(self, site_id, serial, start_time, end_time):
+        path = os.path.join(self.directory, 'equipment', _file_name(site_id, start_time, end_time, serial))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, 'wb') as f:
+            for chunk in self.client.iter_equipment_data(site_id, serial, start_time, end_time):
+                f.write(chunk)
+                yield chunk
+
+
+class ReplayClient:
+    """
+    Serves responses saved by RecordingClient instead of calling the API, so
+    parsing and writing can be benchmarked offline without using any quota.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _path(self, endpoint, file_name):
+        path = os.path.join(self.directory, endpoint, file_name)
+        if not os.path.exists(path):
+            raise KeyError('No recording for %s %s' % (endpoint, file_name))
+        return path
+
+    def _load(self, endpoint, file_name):
+        with gzip.open(self._path(endpoint, file_name), 'rt') as f:
+            return json.load(f)
+
+    def get_energy_details(self, site_id, start_time, end_time, meters=None, time_unit='DAY'):
+        return self._load('energyDetails', _file_name(site_id, start_time, end_time, time_unit))
+
+    def get_power_details(self, site_id, start_time, end_time, meters=None):
+        return self._load('powerDetails', _file_name(site_id, start_time, end_time))
+
+    def get_inventory(self, site_id):
+        return self._load('inventory', '%s.json.gz' % site_id)
+
+    def iter_equipment_data(self, site_id, serial, start_time, end_time, chunk_size=64 * 1024):
+        with gzip.open(self._path('equipment', _file_name(site_id, start_time, end_time, serial)), 'rb') as f:
+            yield from iter(lambda: f.read(chunk_size), b'')
+
+    def recorded_jobs(self, site_id):
+        """(detail_key, begin, end) for every recording of `site_id`, oldest first"""
+        jobs = []
+        for detail_key in ('energyDetails', 'powerDetails'):
+            endpoint_dir = os.path.join(self.directory, detail_key)
+            if not os.path.isdir(endpoint_dir):
+                continue
+            for file_name in os.listdir(endpoint_dir):
+                parts = file_name[:-len('.json.gz')].split('_')
+                if parts[0] != str(site_id):
+                    continue
+                begin, end = (datetime.strptime(part, '%Y-%m-%dT%H%M%S') for part in parts[1:3])
+                jobs.append((detail_key, begin, end))
+        return sorted(jobs, key=lambda job: (job[1], job[0]))
@@ -3,4 +3,25 @@ from os import environ
 solaredge_token = environ.get('SOLAREDGE_TOKEN')
 solaredge_site_id = environ.get('SOLAREDGE_SITE_ID')
 
+# All sites of the account as "site_id[:timezone]" separated by commas, e.g.
+# "1234:America/Denver,5678:Europe/Berlin". Falls back to SOLAREDGE_SITE_ID.
+# SolarEdge timestamps are in the time zone of the site
+DEFAULT_TIMEZONE = environ.get("SOLAREDGE_TIMEZONE", "America/Denver")
+SITES = environ.get("SOLAREDGE_SITES") or solaredge_site_id or ""
+
 MAX_DAYS_PER_REQUEST = int(environ.get("SOLAREDGE_MAX_DAYS_PER_REQUEST", "28"))
+
+# Sync state (watermarks) lives here, it's mounted as a volume in compose.yml
+STATE_DIR = environ.get("SOLAREDGE_STATE_DIR", "/var/lib/solaredge_collector")
+# Re-fetch this much before the watermark, SolarEdge revises the most recent values
+WATERMARK_OVERLAP_MINUTES = int(environ.get("SOLAREDGE_WATERMARK_OVERLAP_MINUTES", "60"))
+# A meter that stopped reporting doesn't hold the sync back further than this behind the newest one
+WATERMARK_MAX_LAG_DAYS = int(environ.get("SOLAREDGE_WATERMARK_MAX_LAG_DAYS", str(MAX_DAYS_PER_REQUEST)))
+
+# SolarEdge allows 300 requests per day and 3 concurrent requests per source IP
+DAILY_QUOTA = int(environ.get("SOLAREDGE_DAILY_QUOTA", "300"))
+MAX_CONCURRENT_REQUESTS = int(environ.get("SOLAREDGE_MAX_CONCURRENT_REQUESTS", "3"))
+REQUESTS_PER_SECOND = float(environ.get("SOLAREDGE_REQUESTS_PER_SECOND", "1"))
+
+# Maximum number of points per request to the API's influx write endpoint
+WRITE_BATCH_SIZE = int(environ.get("SOLAREDGE_WRITE_BATCH_SIZE", "5000"))
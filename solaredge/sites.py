@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+
+import pytz
+
+from timestamps import LocalTimeParser
+
+
+class Site:
+    """
+    A SolarEdge site. Its timestamps are in the site's own timezone, and every
+    point and watermark of the site carries its id.
+    """
+
+    def __init__(self, site_id, timezone):
+        self.site_id = str(site_id)
+        self.tz = pytz.timezone(timezone)
+        self.timestamps = LocalTimeParser(self.tz)
+        self.tags = {'site_id': self.site_id}
+
+    def watermark_key(self, detail_key, meter_type=''):
+        return '%s:%s:%s' % (self.site_id, detail_key, meter_type)
+
+    def __repr__(self):
+        return 'Site(%s, %s)' % (self.site_id, self.tz.zone)
+
+
+def load_sites(spec, default_timezone):
+    """
+    Parse a comma separated list of "site_id[:timezone]" entries, e.g.
+    "1234:America/Denver,5678:Europe/Berlin". Sites without a timezone use
+    `default_timezone`.
+    """
+    sites = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        site_id, _, timezone = entry.partition(':')
+        sites.append(Site(site_id.strip(), timezone.strip() or default_timezone))
+    return sites
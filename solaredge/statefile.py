@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def locked(path):
+    """
+    Hold an exclusive lock for the state file at `path`, shared by every
+    process using the same STATE_DIR (e.g. run.sh's sync and a backfill).
+    The lock is taken on a `.lock` file next to it, since saving replaces
+    the state file itself. Without a `path` nothing is locked.
+    """
+    if not path:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.lock', 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def load(path):
+    """The JSON state at `path`, None if there is none yet"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(path, state, **dump_args):
+    """Write the JSON state atomically, hold locked(path) around a read-merge-save"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, **dump_args)
+    os.replace(tmp_path, path)
@@ -0,0 +1,120 @@
+import unittest
+from unittest.mock import Mock, patch
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import main
+from backfill import BackfillCheckpoint
+from ratelimit import DailyQuota, RateLimiter
+from sites import Site
+from watermarks import Watermarks
+
+BEGIN = datetime(2024, 1, 1)
+END = datetime(2024, 3, 1)
+
+
+class FakeClient:
+    """Answers every details request with one value at the start of the range"""
+
+    def __init__(self):
+        self.requested = []
+
+    def _details(self, key, site_id, start_time, end_time):
+        self.requested.append((key, start_time))
+        return {key: {"meters": [{"type": "Production", "values": [{"date": start_time, "value": 1.0}]}]}}
+
+    def get_energy_details(self, site_id, start_time, end_time, meters=None, time_unit='DAY'):
+        return self._details('energyDetails', site_id, start_time, end_time)
+
+    def get_power_details(self, site_id, start_time, end_time, meters=None):
+        return self._details('powerDetails', site_id, start_time, end_time)
+
+
+class TestBackfill(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        patches = [
+            patch.object(main.secrets, 'STATE_DIR', self.tmp.name),
+            patch.object(main.secrets, 'MAX_DAYS_PER_REQUEST', 28),
+            # One request at a time, so the quota runs out at a predictable chunk
+            patch.object(main.secrets, 'MAX_CONCURRENT_REQUESTS', 1),
+            patch('builtins.print'),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        self.sites = [Site('1', 'America/Denver')]
+        self.session = Mock()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_backfill(self, client, quota, begin=BEGIN, dry_run=False):
+        limiter = RateLimiter(rate=sys.maxsize, burst=sys.maxsize, max_concurrent=1, quota=quota)
+        main.run_backfill(client, limiter, Watermarks(), self.sites, begin, END if begin else None,
+                          'QUARTER_OF_AN_HOUR', wait_for_quota=False, verbose=False, dry_run=dry_run,
+                          session=self.session)
+
+    def checkpoint(self):
+        return BackfillCheckpoint(os.path.join(self.tmp.name, 'backfill.json'))
+
+    def test_resumes_after_quota(self):
+        """Test that a backfill stopped by the quota only fetches the missing chunks when resumed"""
+        first = FakeClient()
+        self.run_backfill(first, DailyQuota(4))
+        self.assertEqual(len(first.requested), 4)
+
+        checkpoint = self.checkpoint()
+        jobs = main.interleave(*(main.schedule_detail_jobs(site, BEGIN, BEGIN, END) for site in self.sites))
+        self.assertEqual(len(jobs), 6)
+        self.assertEqual(sum(checkpoint.is_done(job) for job in jobs), 4)
+
+        second = FakeClient()
+        self.run_backfill(second, DailyQuota(300), begin=None)
+        self.assertEqual(len(second.requested), 2)
+        self.assertFalse(set(first.requested) & set(second.requested))
+        self.assertTrue(all(self.checkpoint().is_done(job) for job in jobs))
+
+    def test_new_range_starts_over(self):
+        """Test that a backfill with a different --begin doesn't reuse the old checkpoint"""
+        self.run_backfill(FakeClient(), DailyQuota(300))
+
+        client = FakeClient()
+        self.run_backfill(client, DailyQuota(300), begin=datetime(2024, 2, 1))
+        self.assertEqual(len(client.requested), 4)
+
+    def test_dry_run_leaves_checkpoint(self):
+        """Test that a dry run neither writes nor marks chunks done for a later real backfill"""
+        self.run_backfill(FakeClient(), DailyQuota(4))
+        before = self.checkpoint()
+
+        self.run_backfill(FakeClient(), DailyQuota(300), begin=None, dry_run=True)
+        self.session.post.reset_mock()
+        self.run_backfill(FakeClient(), DailyQuota(300), begin=datetime(2024, 2, 1), dry_run=True)
+        self.session.post.assert_not_called()
+
+        after = self.checkpoint()
+        self.assertEqual((after.begin, after.end), (before.begin, before.end))
+        self.assertEqual(after._completed, before._completed)
+
+        client = FakeClient()
+        self.run_backfill(client, DailyQuota(300), begin=None)
+        self.assertEqual(len(client.requested), 2)
+
+    def test_legacy_checkpoint_is_resumed(self):
+        """Test that chunks checkpointed before keys carried a site id aren't fetched again"""
+        self.run_backfill(FakeClient(), DailyQuota(4))
+        checkpoint = self.checkpoint()
+        checkpoint._completed = {key.split('|', 1)[1] for key in checkpoint._completed}
+        checkpoint.save()
+
+        client = FakeClient()
+        self.run_backfill(client, DailyQuota(300), begin=None)
+        self.assertEqual(len(client.requested), 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,70 @@
+import unittest
+import json
+import random
+
+import pytz
+
+from equipment import compact_fields, iter_array_items, telemetry_points
+from timestamps import LocalTimeParser
+
+TELEMETRIES = [
+    {"date": "2024-06-01 12:00:00", "totalActivePower": 4200.5, "inverterMode": "MPPT",
+     "L1Data": {"acVoltage": 241.2, "acCurrent": 17.4}, "note": "brackets ] and \"quotes\" in a string"},
+    {"date": "2024-06-01 12:05:00", "totalActivePower": 0, "L1Data": None},
+    {"date": "2024-06-01 12:10:00", "name": "Wechselrichter üß ☀"},
+]
+BODY = json.dumps({"data": {"count": 3, "telemetries": TELEMETRIES}}, ensure_ascii=False).encode()
+
+
+def split(body, sizes):
+    chunks, pos = [], 0
+    for size in sizes:
+        chunks.append(body[pos:pos + size])
+        pos += size
+    return chunks + [body[pos:]]
+
+
+class TestIterArrayItems(unittest.TestCase):
+
+    def test_single_chunk(self):
+        """Test that every item is decoded from a complete body"""
+        self.assertEqual(list(iter_array_items([BODY], 'telemetries')), TELEMETRIES)
+
+    def test_every_split_point(self):
+        """Test every place a body can be cut in two, including inside the key and multi-byte characters"""
+        for cut in range(len(BODY) + 1):
+            self.assertEqual(list(iter_array_items(split(BODY, [cut]), 'telemetries')), TELEMETRIES, cut)
+
+    def test_random_chunk_sizes(self):
+        """Test many random splits, down to single bytes"""
+        rng = random.Random(1)
+        for _ in range(200):
+            sizes = [rng.randint(1, 40) for _ in range(len(BODY))]
+            self.assertEqual(list(iter_array_items(split(BODY, sizes), 'telemetries')), TELEMETRIES)
+
+    def test_empty_and_missing_array(self):
+        """Test that an empty or absent array yields nothing"""
+        self.assertEqual(list(iter_array_items([b'{"data": {"telemetries": []}}'], 'telemetries')), [])
+        self.assertEqual(list(iter_array_items([b'{"data": {"count": 0}}'], 'telemetries')), [])
+
+    def test_truncated_body(self):
+        """Test that a response cut off inside the array is an error, not a silent short read"""
+        with self.assertRaises(ValueError):
+            list(iter_array_items([BODY[:len(BODY) // 2]], 'telemetries'))
+
+
+class TestTelemetryPoints(unittest.TestCase):
+
+    def test_points(self):
+        """Test that samples become points with known fields only, and empty samples are skipped"""
+        self.assertEqual(compact_fields(TELEMETRIES[0]), {
+            "power": 4200.5, "mode": "MPPT", "l1_ac_voltage": 241.2, "l1_ac_current": 17.4})
+
+        points = list(telemetry_points(TELEMETRIES, {"serial": "7E1"}, LocalTimeParser(pytz.utc)))
+        self.assertEqual([epoch for epoch, _ in points], [1717243200, 1717243500])
+        self.assertEqual(points[1][1]["fields"], {"power": 0})
+        self.assertEqual(points[1][1]["time"], 1717243500 * 1000000000)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,104 @@
+import unittest
+import json
+import os
+import tempfile
+
+from ratelimit import DailyQuota, QuotaExceeded, RateLimiter
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def make_limiter(self, quota=None, **kwargs):
+        kwargs = dict(dict(rate=2, burst=2, max_concurrent=3), **kwargs)
+        return RateLimiter(quota=quota or DailyQuota(100), clock=self.clock, sleep=self.clock.sleep, **kwargs)
+
+    def test_burst_then_rate(self):
+        """Test that a burst goes through at once and later requests wait for tokens"""
+        limiter = self.make_limiter()
+        for _ in range(4):
+            with limiter:
+                pass
+
+        self.assertEqual(self.clock.sleeps, [0.5, 0.5])
+        self.assertEqual(limiter.quota.used, 4)
+
+    def test_tokens_refill_while_idle(self):
+        """Test that idle time refills the bucket up to the burst size"""
+        limiter = self.make_limiter()
+        for _ in range(2):
+            with limiter:
+                pass
+        self.clock.now += 10
+        for _ in range(2):
+            with limiter:
+                pass
+
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_quota_exceeded_releases_slot(self):
+        """Test that a refused request doesn't keep its concurrency slot"""
+        limiter = self.make_limiter(quota=DailyQuota(1), max_concurrent=1)
+        with limiter:
+            pass
+
+        for _ in range(2):
+            with self.assertRaises(QuotaExceeded):
+                with limiter:
+                    pass
+        self.assertEqual(limiter.quota.remaining, 0)
+
+
+class TestDailyQuota(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'quota.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_processes_share_the_count(self):
+        """Test that two processes on the same file add up their requests"""
+        sync = DailyQuota(5, self.path)
+        backfill = DailyQuota(5, self.path)
+        sync.consume()
+        sync.consume()
+        backfill.consume()
+        sync.consume()
+
+        self.assertEqual(DailyQuota(5, self.path).used, 4)
+        self.assertEqual(backfill.remaining, 1)
+        backfill.consume()
+        with self.assertRaises(QuotaExceeded):
+            sync.consume()
+
+    def test_new_day_resets(self):
+        """Test that a count saved on another day doesn't reduce today's budget"""
+        with open(self.path, 'w') as f:
+            json.dump(dict(date='2000-01-01', used=5), f)
+
+        quota = DailyQuota(5, self.path)
+        self.assertEqual(quota.remaining, 5)
+        quota.consume()
+        self.assertEqual(DailyQuota(5, self.path).used, 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
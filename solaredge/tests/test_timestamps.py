@@ -0,0 +1,64 @@
+import unittest
+import calendar
+from datetime import datetime, timedelta
+
+import pytz
+
+from timestamps import LocalTimeParser
+
+DENVER = pytz.timezone('America/Denver')
+
+
+def quarter_hours(day):
+    start = datetime.strptime(day, '%Y-%m-%d')
+    return [(start + timedelta(minutes=15 * i)).strftime('%Y-%m-%d %H:%M:%S') for i in range(96)]
+
+
+def reference_epoch(timestamp, tz):
+    local = tz.localize(datetime.strptime(timestamp, '%Y-%m-%d %H:%M:%S'))
+    return calendar.timegm(local.utctimetuple())
+
+
+class TestLocalTimeParser(unittest.TestCase):
+
+    def assert_matches_pytz(self, tz, days):
+        parser = LocalTimeParser(tz)
+        for day in days:
+            timestamps = quarter_hours(day)
+            parsed = parser.parse_values([dict(date=t, value=1.0) for t in timestamps])
+            self.assertEqual(parsed.epochs, [reference_epoch(t, tz) for t in timestamps], day)
+            self.assertEqual([parser.epoch(t) for t in timestamps], parsed.epochs, day)
+
+    def test_regular_days(self):
+        """Test that the per-day table gives the same epochs as pytz"""
+        self.assert_matches_pytz(DENVER, ['2024-01-15', '2024-07-04', '2024-12-31'])
+
+    def test_dst_transitions(self):
+        """Test the days clocks go forward and back, in both hemispheres"""
+        self.assert_matches_pytz(DENVER, ['2024-03-10', '2024-11-03'])
+        self.assert_matches_pytz(pytz.timezone('Australia/Sydney'), ['2024-04-07', '2024-10-06'])
+
+    def test_transition_days_are_marked(self):
+        """Test that only days with an offset change fall back to pytz"""
+        parser = LocalTimeParser(DENVER)
+        parser.parse_values([dict(date='2024-03-10 12:00:00', value=1.0),
+                             dict(date='2024-03-11 12:00:00', value=1.0)])
+
+        self.assertIsNone(parser._days['2024-03-10'][0])
+        self.assertIsNotNone(parser._days['2024-03-11'][0])
+
+    def test_skips_missing_values_and_keeps_local_month(self):
+        """Test that null values are dropped and months are those of the local date"""
+        parsed = LocalTimeParser(DENVER).parse_values([
+            dict(date='2024-05-31 23:45:00', value=2.5),
+            dict(date='2024-06-01 00:00:00', value=None),
+            dict(date='2024-06-01 00:15:00', value=3.0),
+        ])
+
+        self.assertEqual(parsed.values, [2.5, 3.0])
+        self.assertEqual(parsed.year_months, [(2024, 5), (2024, 6)])
+        self.assertEqual(parsed.epochs[0], calendar.timegm((2024, 6, 1, 5, 45, 0)))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
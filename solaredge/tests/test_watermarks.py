@@ -0,0 +1,102 @@
+import unittest
+import os
+import tempfile
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytz
+
+import main
+from sites import Site
+from watermarks import Watermarks
+
+UTC = pytz.utc
+
+
+class TestWatermarks(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'watermarks.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_only_moves_forward(self):
+        """Test that an older timestamp never replaces a newer watermark"""
+        watermarks = Watermarks()
+        watermarks.update('energyDetails:Production', datetime(2024, 5, 2, tzinfo=UTC))
+        watermarks.update('energyDetails:Production', datetime(2024, 5, 1, tzinfo=UTC))
+
+        self.assertEqual(watermarks.get('energyDetails:Production'), datetime(2024, 5, 2, tzinfo=UTC))
+
+    def test_persisted(self):
+        """Test that saved watermarks are loaded again, timezone aware"""
+        watermarks = Watermarks(self.path)
+        watermarks.update('1:powerDetails:Consumption', datetime(2024, 5, 2, 12, tzinfo=UTC))
+        watermarks.save()
+
+        reloaded = Watermarks(self.path)
+        self.assertEqual(reloaded.get('1:powerDetails:Consumption'), datetime(2024, 5, 2, 12, tzinfo=UTC))
+        self.assertEqual(reloaded.with_prefix('1:powerDetails:'), [datetime(2024, 5, 2, 12, tzinfo=UTC)])
+
+    def test_concurrent_saves_merge(self):
+        """Test that a save keeps the newer watermarks another process saved meanwhile"""
+        sync = Watermarks(self.path)
+        backfill = Watermarks(self.path)
+
+        sync.update('1:energyDetails:Production', datetime(2024, 5, 2, tzinfo=UTC))
+        sync.save()
+        backfill.update('1:energyDetails:Production', datetime(2024, 1, 1, tzinfo=UTC))
+        backfill.update('1:powerDetails:Production', datetime(2024, 1, 1, tzinfo=UTC))
+        backfill.save()
+
+        reloaded = Watermarks(self.path)
+        self.assertEqual(reloaded.get('1:energyDetails:Production'), datetime(2024, 5, 2, tzinfo=UTC))
+        self.assertEqual(reloaded.get('1:powerDetails:Production'), datetime(2024, 1, 1, tzinfo=UTC))
+
+    def test_resume_from_oldest_meter(self):
+        """Test that a sync resumes from the oldest meter's watermark minus the overlap, in site time"""
+        site = Site('1', 'America/Denver')
+        watermarks = Watermarks()
+        watermarks.update(site.watermark_key('energyDetails', 'Production'), datetime(2024, 5, 2, 18, tzinfo=UTC))
+        watermarks.update(site.watermark_key('energyDetails', 'FeedIn'), datetime(2024, 5, 2, 12, tzinfo=UTC))
+        default = datetime(2024, 4, 1)
+
+        begin = main.watermark_begin(watermarks, site, 'energyDetails', default)
+        self.assertEqual(begin, datetime(2024, 5, 2, 6) - timedelta(minutes=main.secrets.WATERMARK_OVERLAP_MINUTES))
+        self.assertEqual(main.watermark_begin(watermarks, site, 'powerDetails', default), default)
+
+    def test_stale_meter_doesnt_hold_back_sync(self):
+        """Test that a meter which stopped reporting limits the lookback to WATERMARK_MAX_LAG_DAYS"""
+        site = Site('1', 'UTC')
+        watermarks = Watermarks()
+        newest = datetime(2024, 5, 2, tzinfo=UTC)
+        watermarks.update(site.watermark_key('energyDetails', 'Production'), newest)
+        watermarks.update(site.watermark_key('energyDetails', 'FeedIn'), datetime(2023, 1, 1, tzinfo=UTC))
+
+        with patch('builtins.print'):
+            begin = main.watermark_begin(watermarks, site, 'energyDetails', datetime(2024, 4, 1))
+        overlap = timedelta(minutes=main.secrets.WATERMARK_OVERLAP_MINUTES)
+        self.assertEqual(begin, datetime(2024, 5, 2) - timedelta(days=main.secrets.WATERMARK_MAX_LAG_DAYS) - overlap)
+
+    def test_legacy_keys_move_to_site(self):
+        """Test that single-site watermarks are picked up by the site without refetching"""
+        legacy = Watermarks(self.path)
+        legacy.update('energyDetails:Production', datetime(2024, 5, 2, 12, tzinfo=UTC))
+        legacy.update('powerDetails:Production', datetime(2024, 5, 2, 13, tzinfo=UTC))
+        legacy.save()
+        site = Site('1', 'America/Denver')
+
+        watermarks = Watermarks(self.path)
+        main.migrate_legacy_watermarks(watermarks, site)
+
+        reloaded = Watermarks(self.path)
+        self.assertEqual(sorted(reloaded.keys()), ['1:energyDetails:Production', '1:powerDetails:Production'])
+        # Resumes right at the old watermark, not an overlap before it
+        self.assertEqual(main.watermark_begin(reloaded, site, 'energyDetails', datetime(2024, 4, 1)),
+                         datetime(2024, 5, 2, 6))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,74 @@
+import unittest
+from unittest.mock import Mock, patch
+import json
+
+from writer import BatchWriter
+
+
+def points(count, start=0):
+    return [{"measurement": "m", "tags": {}, "time": i, "fields": {"value": i}} for i in range(start, start + count)]
+
+
+class TestBatchWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.session = Mock()
+        self.written = []
+        self.session.post.side_effect = self.post
+
+    def post(self, url, data, headers):
+        self.written.append([p["time"] for p in json.loads(data)["data_points"]])
+        return Mock()
+
+    def test_batches_and_flush(self):
+        """Test that points go out in full batches and the rest on flush"""
+        with BatchWriter("http://api/write", 3, session=self.session) as writer:
+            writer.add(points(2))
+            writer.add(points(5, start=2))
+            self.assertEqual(self.written, [[0, 1, 2], [3, 4, 5]])
+
+        self.assertEqual(self.written, [[0, 1, 2], [3, 4, 5], [6]])
+        self.assertEqual((writer.requests, writer.points_written), (3, 7))
+        self.session.close.assert_not_called()
+
+    def test_callbacks_run_in_order_once_written(self):
+        """Test that a callback runs only after every point added up to it has been written"""
+        calls = []
+        writer = BatchWriter("http://api/write", 3, session=self.session)
+        writer.add(points(2), on_written=lambda: calls.append("first"))
+        writer.add(points(2, start=2), on_written=lambda: calls.append("second"))
+        self.assertEqual(calls, ["first"])
+
+        writer.add((), on_written=lambda: calls.append("empty"))
+        self.assertEqual(calls, ["first"])
+
+        writer.flush()
+        self.assertEqual(calls, ["first", "second", "empty"])
+
+    def test_failed_write_skips_callbacks(self):
+        """Test that nothing is flushed or acknowledged when a write fails"""
+        self.session.post.side_effect = None
+        self.session.post.return_value.raise_for_status.side_effect = RuntimeError("500")
+        calls = []
+
+        with self.assertRaises(RuntimeError):
+            with BatchWriter("http://api/write", 2, session=self.session) as writer:
+                writer.add(points(1), on_written=lambda: calls.append("written"))
+                writer.add(points(1, start=1))
+
+        self.assertEqual(calls, [])
+        self.assertEqual(self.session.post.call_count, 1)
+
+    @patch('builtins.print')
+    def test_dry_run_and_verbose(self, mock_print):
+        """Test that a dry run sends nothing but still counts and reports batches"""
+        with BatchWriter("http://api/write", 2, session=self.session, verbose=True, dry_run=True) as writer:
+            writer.add(points(3))
+
+        self.session.post.assert_not_called()
+        self.assertEqual(writer.points_written, 3)
+        mock_print.assert_called_with("Wrote 1 points (2 requests so far)")
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import calendar
+from collections import namedtuple
+from datetime import datetime, time
+
+SE_FMT_DATETIME = '%Y-%m-%d %H:%M:%S'
+
+# Parallel lists for one meter: UTC epoch seconds, local (year, month), value
+ParsedValues = namedtuple('ParsedValues', ['epochs', 'year_months', 'values'])
+
+
+class LocalTimeParser:
+    """
+    Converts SolarEdge site-local "YYYY-MM-DD hh:mm:ss" timestamps to UTC epoch
+    seconds a whole `values` array at a time.
+
+    Instead of strptime + localize + astimezone for every value, each calendar
+    day is looked up once in a table holding the epoch of its local midnight.
+    Days on which the UTC offset changes (DST transitions) are marked in the
+    table and fall back to pytz for each of their values.
+    """
+
+    def __init__(self, tz):
+        self.tz = tz
+        self._days = {}
+
+    def _day(self, day):
+        entry = self._days.get(day)
+        if entry is None:
+            date = datetime.strptime(day, '%Y-%m-%d')
+            start_offset = self.tz.localize(date).utcoffset()
+            end_offset = self.tz.localize(datetime.combine(date, time(23, 59, 59))).utcoffset()
+
+            if start_offset == end_offset:
+                midnight = calendar.timegm(date.timetuple()) - int(start_offset.total_seconds())
+            else:
+                midnight = None
+            entry = self._days[day] = (midnight, (date.year, date.month))
+        return entry
+
+    def epoch(self, timestamp):
+        """UTC epoch seconds for a single site-local timestamp"""
+        midnight, _ = self._day(timestamp[:10])
+        if midnight is None:
+            local = self.tz.localize(datetime.strptime(timestamp, SE_FMT_DATETIME))
+            return calendar.timegm(local.utctimetuple())
+        return midnight + int(timestamp[11:13]) * 3600 + int(timestamp[14:16]) * 60 + int(timestamp[17:19])
+
+    def parse_values(self, values):
+        """Parse a SolarEdge `values` array, skipping entries without a value"""
+        epochs, year_months, parsed = [], [], []
+        days = self._days
+        for entry in values:
+            value = entry.get('value')
+            if value is None:
+                continue
+
+            timestamp = entry['date']
+            day = days.get(timestamp[:10]) or self._day(timestamp[:10])
+            midnight, year_month = day
+            if midnight is None:
+                epochs.append(self.epoch(timestamp))
+            else:
+                epochs.append(midnight + int(timestamp[11:13]) * 3600
+                              + int(timestamp[14:16]) * 60 + int(timestamp[17:19]))
+            year_months.append(year_month)
+            parsed.append(value)
+        return ParsedValues(epochs, year_months, parsed)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime
+
+import statefile
+
+
+class Watermarks:
+    """
+    Last successfully written timestamp per key, persisted as a JSON file.
+
+    Keys look like "1234:energyDetails:Production". Timestamps are timezone aware
+    and stored in ISO format; a watermark only ever moves forward. Without a
+    `path` the watermarks are kept in memory only.
+
+    Saving merges with the file under a lock, keeping the newest watermark of
+    each key, so processes syncing at the same time never roll back each
+    other's progress.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._marks = self._load()
+        self._removed = set()
+
+    def _load(self):
+        state = statefile.load(self.path) or {}
+        return {key: datetime.fromisoformat(value) for key, value in state.items()}
+
+    def get(self, key):
+        return self._marks.get(key)
+
+    def keys(self):
+        return list(self._marks)
+
+    def with_prefix(self, prefix):
+        """All watermarks whose key starts with `prefix`"""
+        return [mark for key, mark in self._marks.items() if key.startswith(prefix)]
+
+    def update(self, key, timestamp):
+        current = self._marks.get(key)
+        if current is None or timestamp > current:
+            self._marks[key] = timestamp
+
+    def pop(self, key):
+        """Remove a watermark, from the file too on the next save"""
+        self._removed.add(key)
+        return self._marks.pop(key, None)
+
+    def save(self):
+        if not self.path:
+            return
+        with statefile.locked(self.path):
+            for key, mark in self._load().items():
+                if key not in self._removed:
+                    self.update(key, mark)
+            statefile.save(self.path, {key: mark.isoformat() for key, mark in self._marks.items()},
+                           indent=2, sort_keys=True)
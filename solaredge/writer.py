@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+import json
+import requests
+
+
+class BatchWriter:
+    """
+    Streams data points to the API's influx write endpoint in batches of at
+    most `batch_size` points over a single pooled HTTP session. A `session`
+    passed in is shared with other clients and left open.
+
+    Points from every meter and chunk of a sync share the same buffer. A
+    callback passed to `add()` runs once all points added up to and including
+    that call have been written, which is how watermarks are advanced.
+
+    With `dry_run` batches are still encoded but never sent.
+    """
+
+    def __init__(self, url, batch_size, session=None, verbose=False, dry_run=False):
+        self.url = url
+        self.batch_size = batch_size
+        self._owns_session = session is None
+        self.session = session or requests.Session()
+        self.verbose = verbose
+        self.dry_run = dry_run
+        self.requests = 0
+        self.points_written = 0
+        self._points = []
+        self._added = 0
+        self._callbacks = []
+
+    def add(self, points, on_written=None):
+        self._points.extend(points)
+        self._added += len(points)
+        if on_written is not None:
+            self._callbacks.append((self._added, on_written))
+
+        while len(self._points) >= self.batch_size:
+            self._write_batch()
+
+    def flush(self):
+        while self._points:
+            self._write_batch()
+        self._run_callbacks()
+
+    def _write_batch(self):
+        batch = self._points[:self.batch_size]
+        # Encode once and send the bytes as-is rather than letting requests re-encode
+        body = json.dumps(dict(data_points=batch, verbose=False))
+        if not self.dry_run:
+            resp = self.session.post(self.url, data=body, headers={'Content-Type': 'application/json'})
+            resp.raise_for_status()
+
+        del self._points[:self.batch_size]
+        self.requests += 1
+        self.points_written += len(batch)
+        if self.verbose:
+            print("Wrote %d points (%d requests so far)" % (len(batch), self.requests))
+        self._run_callbacks()
+
+    def _run_callbacks(self):
+        while self._callbacks and self._callbacks[0][0] <= self.points_written:
+            _, callback = self._callbacks.pop(0)
+            callback()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        if self._owns_session:
+            self.session.close()